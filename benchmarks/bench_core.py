@@ -0,0 +1,528 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – benchmarki rdzenia (core) na danych syntetycznych
+#
+#  Dane generowane są deterministycznie w katalogu tymczasowym, a archiwa
+#  czytane przez file:// (klient HTTP, wyścig luster, pobieranie segmentami i sprawdzanie
+#  strumieni - z lokalnych serwerów na 127.0.0.1), więc wyniki są powtarzalne na zwykłym Linuksie,
+#  bez sieci i bez enigma2. Ścieżki wtyczki (MYUPDATER_*) kierowane są
+#  do tego samego katalogu tymczasowego.
+#
+#  Użycie: python benchmarks/bench_core.py [--quick] [--only m3u,lamedb,...] [--keep]
+#
+from __future__ import print_function, absolute_import
+
+import os, sys, json, time, random, shutil, hashlib, zipfile, argparse, tempfile, threading
+
+try:
+    from BaseHTTPServer import HTTPServer
+    from SimpleHTTPServer import SimpleHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import HTTPServer, SimpleHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXTENSIONS_DIR = os.path.join(ROOT, "usr", "lib", "enigma2", "python", "Plugins", "Extensions")
+
+def file_url(path):
+    return "file://" + os.path.abspath(path)
+
+# --- generatory danych ---
+
+def make_m3u(path, entries, groups=50):
+    rnd = random.Random(1)
+    with open(path, "w") as f:
+        f.write("#EXTM3U\n")
+        for i in range(entries):
+            f.write('#EXTINF:-1 tvg-id="ch{0}.pl" tvg-logo="http://logo/{0}.png" group-title="Grupa {1}",Kanał {0}\n'
+                    .format(i, rnd.randrange(groups)))
+            f.write("http://stream.example/{}/{}.ts\n".format(rnd.randrange(1000), i))
+
+def make_manifest(path, entries):
+    kinds = ("LIST", "M3U", "BOUQUET")
+    items = []
+    for i in range(entries):
+        kind = kinds[i % 3]
+        item = {"name": "Lista {}".format(i), "author": "autor{}".format(i % 40), "type": kind,
+                "url": "http://lists.example/{}/{}".format(kind.lower(), i), "version": "2024-{:02d}".format(i % 12 + 1)}
+        if kind != "LIST":
+            item["bouquet_id"] = "userbouquet.b{}.tv".format(i)
+        items.append(item)
+    with open(path, "w") as f:
+        json.dump(items, f)
+
+def _services(count):
+    rnd = random.Random(2)
+    return [(rnd.randrange(1, 0xffff), rnd.choice((0xC00000, 0xE080000, 0x820000)), rnd.randrange(1, 0xfff), rnd.choice((1, 0x13e, 0x71)))
+            for i in range(count)]
+
+def make_lamedb(path, services, version):
+    with open(path, "w") as f:
+        if version == 5:
+            f.write("eDVB services /5/\n")
+            for sid, ns, tsid, onid in services:
+                f.write('s:{:04x}:{:08x}:{:04x}:{:04x}:1:0,"Usługa {}"\n'.format(sid, ns, tsid, onid, sid))
+        else:
+            f.write("eDVB services /4/\ntransponders\nend\nservices\n")
+            for sid, ns, tsid, onid in services:
+                f.write("{:04x}:{:08x}:{:04x}:{:04x}:1:0\nUsługa {}\np:bench\n".format(sid, ns, tsid, onid, sid))
+            f.write("end\n")
+
+def make_bouquet(path, services, missing):
+    with open(path, "w") as f:
+        f.write("#NAME Benchmark\n")
+        for sid, ns, tsid, onid in services:
+            f.write("#SERVICE 1:0:1:{:X}:{:X}:{:X}:{:X}:0:0:0:\n".format(sid, tsid, onid, ns))
+        for i in range(missing):
+            f.write("#SERVICE 1:0:1:{:X}:1:1:C00000:0:0:0:\n".format(0x10000 - i - 1))
+        f.write("#SERVICE 4097:0:1:0:0:0:0:0:0:0:http%3a//stream.example/x.ts:Strumień\n")
+
+def make_picon_zip(path, files, size):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(files):
+            # nagłówek PNG + niekompresowalna treść, jak w prawdziwych piconach
+            data = b"\x89PNG\r\n\x1a\n" + b"".join(hashlib.sha256("{}-{}".format(i, k).encode("ascii")).digest()
+                                                    for k in range(size // 32))
+            zf.writestr("picon/1_0_1_{:X}_1_1_C00000_0_0_0.png".format(i), data)
+
+def make_list_zip(path, services):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.write(services, "lista/lamedb")
+        zf.writestr("lista/bouquets.tv", "#NAME Bouquets (TV)\n")
+        for i in range(20):
+            zf.writestr("lista/userbouquet.b{}.tv".format(i), "#NAME B{}\n".format(i) + "#SERVICE 1:0:1:1:1:1:C00000:0:0:0:\n" * 500)
+
+def make_opkg(root, feeds, per_feed):
+    """Listy feedów i plik status w układzie /var/lib/opkg"""
+    rnd = random.Random(3)
+    lists = os.path.join(root, "lists")
+    os.makedirs(lists)
+    variants = ("", "-emu", "-stable", "-master-ipv4only", "-dbg", "-webif")
+    for feed in range(feeds):
+        with open(os.path.join(lists, "feed{}".format(feed)), "w") as f:
+            for i in range(per_feed):
+                if i % 500 == 0:
+                    name = "enigma2-plugin-softcams-{}{}".format(("oscam", "ncam")[(i // 500) % 2], variants[(i // 500 + feed) % len(variants)])
+                else:
+                    name = "pkg{}-{}".format(feed, i)
+                f.write("Package: {}\nVersion: 1.{}-r{}\nDepends: libc6\nSection: base\nArchitecture: mips32el\n"
+                        "Maintainer: bench\nFilename: {}.ipk\nSize: {}\nDescription: pakiet {}\n\n"
+                        .format(name, rnd.randrange(100), rnd.randrange(10), name, rnd.randrange(100000), i))
+    with open(os.path.join(root, "status"), "w") as f:
+        for i in range(0, per_feed, 7):
+            f.write("Package: pkg0-{}\nVersion: 1.0-r0\nStatus: install ok installed\nArchitecture: mips32el\n\n".format(i))
+
+# --- przypadki ---
+
+class Bench(object):
+    def __init__(self, work, scale):
+        self.work = work
+        self.scale = scale
+        self.results = []
+
+    def n(self, full):
+        return max(1, int(full * self.scale))
+
+    def path(self, name):
+        return os.path.join(self.work, name)
+
+    def run(self, name, detail, func, items=None):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        rate = "{:,.0f}/s".format(items / elapsed) if items and elapsed else ""
+        self.results.append((name, detail, elapsed, rate))
+        print("{:<32} {:<26} {:8.3f} s  {}".format(name, detail, elapsed, rate))
+        sys.stdout.flush()
+
+def bench_m3u(b, core):
+    m3u = core.m3u
+    entries = b.n(500000)
+    src = b.path("big.m3u")
+    make_m3u(src, entries)
+    out = b.path("m3u_out")
+    os.makedirs(out)
+    b.run("m3u.convert_file", "{} linii".format(entries * 2 + 1),
+          lambda: m3u.convert_file(src, out, "userbouquet.big.tv", "Big"), entries)
+    b.run("m3u.convert_file (grupy)", "{} linii".format(entries * 2 + 1),
+          lambda: m3u.convert_file(src, out, "userbouquet.big.tv", "Big", split_groups=True), entries)
+    b.run("m3u.convert_file (dedupe=False)", "{} linii".format(entries * 2 + 1),
+          lambda: m3u.convert_file(src, out, "userbouquet.big.tv", "Big", dedupe=False), entries)
+
+def bench_manifest(b, core):
+    sources = core.sources
+    entries = b.n(5000)
+    path = b.path("manifest.json")
+    make_manifest(path, entries)
+    with open(path, "rb") as f:
+        body = f.read()
+    src = sources.ManifestSource("bench", file_url(path))
+    b.run("sources.parse_manifest", "{} wpisów".format(entries), lambda: src.parse(body), entries)
+    s4a = "\n".join("lista_{0}_url: http://s4a.example/{0}.zip\nlista_{0}_version: 2024-01-{1:02d}".format(i, i % 28 + 1)
+                    for i in range(entries)).splitlines()
+    b.run("sources.parse_s4a", "{} wpisów".format(entries), lambda: sources.parse_s4a(s4a, "bench"), entries)
+
+def bench_lamedb(b, core):
+    lamedb = core.lamedb
+    count = b.n(20000)
+    services = _services(count)
+    for version in (4, 5):
+        path = b.path("lamedb{}".format(version))
+        make_lamedb(path, services, version)
+        b.run("lamedb.load_index (v{})".format(version), "{} usług".format(count),
+              lambda: lamedb.load_index(path), count)
+    bouquet = b.path("userbouquet.check.tv")
+    make_bouquet(bouquet, services[:b.n(5000)], b.n(200))
+    index = lamedb.load_index(b.path("lamedb5"))
+
+    def check():
+        with open(bouquet) as f:
+            lamedb.check_bouquet(f, index)
+    b.run("lamedb.check_bouquet", "{} referencji".format(b.n(5000) + b.n(200)), check, b.n(5000) + b.n(200))
+
+def bench_bouquets(b, core):
+    bouquets = core.bouquets
+    e2 = b.path("e2_registry")
+    os.makedirs(e2)
+    existing = b.n(2000)
+    with open(os.path.join(e2, "bouquets.tv"), "w") as f:
+        f.write("#NAME User - bouquets (TV)\n")
+        for i in range(existing):
+            f.write(bouquets.bouquet_line("userbouquet.old{}.tv".format(i)) + "\n")
+    adds = b.n(500)
+
+    def edit():
+        with bouquets.transaction(e2) as registry:
+            for i in range(adds):
+                registry.add("userbouquet.new{}.tv".format(i))
+            for i in range(0, existing, 10):
+                registry.move("userbouquet.old{}.tv".format(i), 0)
+    b.run("bouquets.transaction", "{} + {} zmian".format(existing, adds + existing // 10), edit, adds + existing // 10)
+
+def bench_picons(b, core):
+    picons = core.picons
+    files = b.n(8000)
+    path = b.path("picons.zip")
+    make_picon_zip(path, files, 3000)
+    picon_dir = b.path("picon")
+    index = b.path("picon_index.json")
+    mb = os.path.getsize(path) / 1048576.0
+    sync = lambda: picons.sync_picons(file_url(path), picon_dir=picon_dir, index_path=index)
+    b.run("picons.sync_picons (pierwsza)", "{} plików, {:.1f} MB".format(files, mb), sync, files)
+    b.run("picons.sync_picons (bez zmian)", "{} plików, {:.1f} MB".format(files, mb), sync, files)
+
+def make_picon_pngs(root, files, Image):
+    """Prawdziwe PNG 400x240 z przezroczystością (wygładzone jak logotypy)"""
+    os.makedirs(root)
+    rnd = random.Random(6)
+    for i in range(files):
+        img = Image.new("RGBA", (200, 120), (0, 0, 0, 0))
+        for k in range(8):
+            x, y = rnd.randrange(160), rnd.randrange(90)
+            img.paste((rnd.randrange(256), rnd.randrange(256), rnd.randrange(256), 255), (x, y, x + 40, y + 30))
+        img.resize((400, 240), Image.BICUBIC).save(os.path.join(root, "{}.png".format(i)), "PNG")
+
+def bench_piconsize(b, core):
+    piconsize = core.piconsize
+    if not piconsize.available():
+        print("piconsize: brak Pillow - pominięto")
+        return
+    files = b.n(600)
+    src = b.path("picon_png")
+    make_picon_pngs(src, files, piconsize.Image)
+    names = [("{}.png".format(i), i) for i in range(files)]
+    mb = sum(os.path.getsize(os.path.join(src, n)) for n, c in names) / 1048576.0
+
+    def fit(workers):
+        out = b.path("picon_fit")
+        shutil.rmtree(out, ignore_errors=True)
+        shutil.copytree(src, out)
+        results, stats = piconsize.fit_all(names, (220, 132), out, workers=workers)
+        return stats
+    detail = "{} plików, {:.1f} MB".format(files, mb)
+    b.run("piconsize.fit_all (workers=1)", detail, lambda: fit(1), files)
+    b.run("piconsize.fit_all (workers=cpu)", detail, lambda: fit(None), files)
+    print("    rdzeni: {}, po dopasowaniu {:.1f} MB".format(piconsize._cpu_count(), sum(
+        os.path.getsize(os.path.join(b.path("picon_fit"), n)) for n, c in names) / 1048576.0))
+
+def bench_opkg(b, core):
+    opkg = core.opkg
+    root = b.path("opkg")
+    feeds, per_feed = 6, b.n(8000)
+    make_opkg(root, feeds, per_feed)
+    lists, status, cache = os.path.join(root, "lists"), os.path.join(root, "status"), os.path.join(root, "index.json")
+    total = feeds * per_feed
+    load = lambda: opkg.load_index(lists, status, cache)
+    b.run("opkg.load_index (pierwszy)", "{} pakietów".format(total), load, total)
+    b.run("opkg.load_index (bez zmian)", "{} pakietów".format(total), load, total)
+    opkg._index = opkg._parsed = None  # nowy proces: indeks z pliku pamięci podręcznej
+    b.run("opkg.load_index (z pliku)", "{} pakietów".format(total), load, total)
+    index = load()
+    b.run("opkg.softcam_candidates", "{} pakietów".format(total), lambda: opkg.softcam_candidates(index), total)
+    b.run("opkg.prefix", "{} pakietów".format(total), lambda: index.prefix("enigma2-plugin-softcams-"), total)
+
+def bench_archive(b, core):
+    archive, snapshots = core.archive, core.snapshots
+    e2 = b.path("e2_lists")
+    os.makedirs(e2)
+    services = b.path("lamedb_list")
+    make_lamedb(services, _services(b.n(20000)), 4)
+    path = b.path("lista.zip")
+    make_list_zip(path, services)
+    store = snapshots.SnapshotStore(root=b.path("snapshots"), e2_dir=e2)
+    size = "{:.1f} MB".format(os.path.getsize(path) / 1048576.0)
+    b.run("archive.install_list_archive", size,
+          lambda: archive.install_list_archive(file_url(path), "zip", e2_dir=e2, backup=False))
+    changes = []
+    b.run("install_list_archive (bez zmian)", size,
+          lambda: changes.append(archive.install_list_archive(file_url(path), "zip", e2_dir=e2)))
+    print("    {}, przeładowanie: {}".format(changes[0].describe(), core.delta.RELOAD_NAMES[changes[0].reload]))
+    b.run("snapshots.take (pierwsza)", "{} plików".format(len(os.listdir(e2))), lambda: store.take("bench"))
+    b.run("snapshots.take (bez zmian)", "{} plików".format(len(os.listdir(e2))), lambda: store.take("bench"))
+
+def bench_catalog(b, core):
+    catalog = core.catalog
+    entries = b.n(5000)
+    path = b.path("manifest_catalog.json")
+    make_manifest(path, entries)
+    with open(path, "rb") as f:
+        items = core.sources.ManifestSource("bench", file_url(path)).parse(f.read())
+    cat = catalog.Catalog()
+    b.run("catalog.update", "{} wpisów".format(len(items)), lambda: cat.update("bench", items), len(items))
+    queries = [("lista 12", False), ("autor3", False), ("547012", True), ("288673", True)] * 25
+    b.run("catalog.search", "{} zapytań".format(len(queries)),
+          lambda: [cat.search(q, digits) for q, digits in queries], len(queries))
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # nagłówki i treść w osobnych zapisach - bez opóźnionego ACK
+
+    def log_message(self, *args):
+        pass
+
+def bench_http(b, core):
+    net = core.net
+    root = b.path("www")
+    os.makedirs(root)
+    with open(os.path.join(root, "manifest.json"), "wb") as f:
+        f.write(b"x" * 20000)
+    cwd = os.getcwd()
+    os.chdir(root)  # SimpleHTTPRequestHandler serwuje bieżący katalog
+    server = HTTPServer(("127.0.0.1", 0), _QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = "http://127.0.0.1:{}/manifest.json".format(server.server_port)
+    count = b.n(2000)
+
+    def fetch_all(pooled):
+        for i in range(count):
+            if not pooled:
+                net._pool.clear()  # jak wget: nowe połączenie dla każdego pliku
+            net.fetch(url, timeout=10)
+    try:
+        b.run("net.fetch (bez keep-alive)", "{} zapytań".format(count), lambda: fetch_all(False), count)
+        before = net.totals()
+        b.run("net.fetch (keep-alive)", "{} zapytań".format(count), lambda: fetch_all(True), count)
+        after = net.totals()
+        print("    połączeń z puli: {} z {}".format(after["reused"] - before["reused"], after["requests"] - before["requests"]))
+    finally:
+        net._pool.clear()  # serwer jednowątkowy czeka na kolejne zapytanie z otwartego połączenia
+        server.shutdown()
+        server.server_close()
+        os.chdir(cwd)
+
+class _RangeHandler(_QuietHandler):
+    """Serwer plików z obsługą "Range: bytes=a-b" i ETag (SimpleHTTPRequestHandler jej nie ma)"""
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        with open(path, "rb") as f:
+            data = f.read()
+        start, end = 0, len(data) - 1
+        byte_range = self.headers.get("Range")
+        if byte_range:
+            a, b = byte_range.split("=", 1)[1].split("-")
+            start, end = int(a), int(b) if b else end
+        self.send_response(206 if byte_range else 200)
+        self.send_header("ETag", '"{}"'.format(len(data)))
+        if byte_range:
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, end, len(data)))
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(data[start:end + 1])
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 64  # przy domyślnych 5 równoległe połączenia czekają na ponowienie SYN (1 s)
+
+    def handle_error(self, request, client_address):
+        pass  # klient zamyka połączenie pierwszego segmentu przed końcem pliku
+
+class _DelayHandler(_QuietHandler):
+    """Serwer plików z opóźnieniem pierwszych bajtów (s)"""
+    delay = 0
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        _QuietHandler.do_GET(self)
+
+class _OriginHandler(_DelayHandler):
+    delay = 0.3
+
+class _MirrorHandler(_DelayHandler):
+    delay = 0.02
+
+def bench_mirrors(b, core):
+    """Wolny serwer oryginalny i szybkie lustro z ustawienia "mirrors": pierwszy wyścig wygrywa
+    lustro startujące po mirror_race_delay, potem oceny hostów stawiają je na pierwszym miejscu"""
+    net, mirrors, common = core.net, core.mirrors, core.common
+    root = b.path("mirror_www")
+    os.makedirs(root)
+    with open(os.path.join(root, "list.json"), "wb") as f:
+        f.write(b"x" * 20000)
+    cwd = os.getcwd()
+    os.chdir(root)
+    servers = [_ThreadingServer(("127.0.0.1", 0), handler) for handler in (_OriginHandler, _MirrorHandler)]
+    for server in servers:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+    origin, mirror = ["http://127.0.0.1:{}/".format(server.server_port) for server in servers]
+    url = origin + "list.json"
+    common.ensure_dir(os.path.dirname(common.SETTINGS_FILE))
+    with open(common.SETTINGS_FILE, "w") as f:
+        json.dump({"mirrors": [{"prefix": origin, "url": mirror}], "mirror_race_delay": 0.1}, f)
+    saved_scores, mirrors._scores = mirrors._scores, mirrors.HostScores(b.path("host_scores.json"))
+    count = max(5, b.n(30))
+    winners = []
+
+    def fetch_all(use_mirrors):
+        for i in range(count):
+            resp = net.open_url(url, timeout=10, use_mirrors=use_mirrors)
+            try:
+                resp.read()
+            finally:
+                resp.close()
+            winners.append(mirrors.host_of(resp.url))
+    detail = "{} zapytań, {:.0f}/{:.0f} ms".format(count, _OriginHandler.delay * 1000, _MirrorHandler.delay * 1000)
+    try:
+        b.run("net.open_url (bez luster)", detail, lambda: fetch_all(False), count)
+        del winners[:]
+        b.run("net.open_url (wyścig luster)", detail, lambda: fetch_all(True), count)
+        order = [mirrors.host_of(u) for u in mirrors.scores().order(mirrors.candidates(url))]
+        print("    wygrane: pierwsze {}, lustro {} z {}; kolejność: {}".format(
+            winners[0], winners.count(mirrors.host_of(mirror)), count, ", ".join(order)))
+        for host, score, entry in mirrors.scores().rows():
+            print("    {:<22} ocena {:.3f} s  ok {ok}  błędy {errors}".format(host, score, **entry))
+        if winners[0] != mirrors.host_of(mirror) or order[0] != mirrors.host_of(mirror):
+            raise RuntimeError("Lustro nie wygrało wyścigu z wolnym serwerem oryginalnym")
+    finally:
+        mirrors._scores = saved_scores
+        os.remove(common.SETTINGS_FILE)
+        net._pool.clear()
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        os.chdir(cwd)
+
+def bench_download(b, core):
+    download, net = core.download, core.net
+    root = b.path("dl")
+    os.makedirs(root)
+    rnd = random.Random(5)
+    block = bytes(bytearray(rnd.getrandbits(8) for i in range(64 * 1024)))
+    size = b.n(640) * len(block)
+    with open(os.path.join(root, "pack.zip"), "wb") as f:
+        for i in range(size // len(block)):
+            f.write(block)
+    cwd = os.getcwd()
+    os.chdir(root)
+    server = _ThreadingServer(("127.0.0.1", 0), _RangeHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = "http://127.0.0.1:{}/pack.zip".format(server.server_port)
+    dest = b.path("pack.zip")
+
+    def fetch(segments):
+        if os.path.exists(dest):
+            os.remove(dest)
+        return download.fetch(url, dest, segments=segments)
+    mb = "{:.0f} MB".format(size / 1048576.0)
+    try:
+        b.run("download.fetch (1 segment)", mb, lambda: fetch(1))
+        b.run("download.fetch (4 segmenty)", mb, lambda: fetch(4))
+    finally:
+        net._pool.clear()
+        server.shutdown()
+        server.server_close()
+        os.chdir(cwd)
+
+class _StreamHandler(_QuietHandler):
+    """HEAD z opóźnieniem serwera strumieni; adresy /dead/ odpowiadają 404"""
+    latency = 0.02
+
+    def do_HEAD(self):
+        time.sleep(self.latency)
+        self.send_response(404 if self.path.startswith("/dead/") else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+def bench_probe(b, core):
+    probe = core.probe
+    server = _ThreadingServer(("127.0.0.1", 0), _StreamHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    count = b.n(1000)
+    urls = ["http://127.0.0.1:{}/{}/{}.ts".format(server.server_port, "dead" if i % 10 == 0 else "live", i)
+            for i in range(count)]
+    cache = probe.ProbeCache(b.path("probes.json"))
+    detail = "{} adresów, {:.0f} ms".format(count, _StreamHandler.latency * 1000)
+    try:
+        b.run("probe.probe_urls (workers=1)", detail,
+              lambda: probe.probe_urls(urls, probe.ProbeCache(b.path("probes1.json")), timeout=5, workers=1), count)
+        b.run("probe.probe_urls (workers=4)", detail, lambda: probe.probe_urls(urls, cache, timeout=5, workers=4), count)
+        b.run("probe.probe_urls (cache)", detail, lambda: probe.probe_urls(urls, cache, timeout=5, workers=4), count)
+    finally:
+        core.net._pool.clear()
+        server.shutdown()
+        server.server_close()
+
+CASES = [("m3u", bench_m3u), ("manifest", bench_manifest), ("lamedb", bench_lamedb),
+         ("bouquets", bench_bouquets), ("picons", bench_picons), ("opkg", bench_opkg), ("archive", bench_archive),
+         ("catalog", bench_catalog), ("http", bench_http), ("mirrors", bench_mirrors), ("download", bench_download),
+         ("probe", bench_probe), ("piconsize", bench_piconsize)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarki rdzenia MyUpdater na danych syntetycznych")
+    parser.add_argument("--quick", action="store_true", help="dane 10x mniejsze")
+    parser.add_argument("--only", help="lista przypadków: " + ",".join(n for n, f in CASES))
+    parser.add_argument("--keep", action="store_true", help="nie usuwaj katalogu z danymi")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="myupdater_core_bench_")
+    os.environ["MYUPDATER_E2_DIR"] = os.path.join(work, "e2")
+    os.environ["MYUPDATER_DATA_PATH"] = os.path.join(work, "data") + "/"
+    os.environ["MYUPDATER_TMP_PATH"] = os.path.join(work, "tmp") + "/"
+    sys.path.insert(0, EXTENSIONS_DIR)
+    import MyUpdater.core.m3u, MyUpdater.core.sources, MyUpdater.core.lamedb, MyUpdater.core.bouquets
+    import MyUpdater.core.picons, MyUpdater.core.archive, MyUpdater.core.snapshots, MyUpdater.core.opkg
+    import MyUpdater.core.delta, MyUpdater.core.catalog, MyUpdater.core.net, MyUpdater.core.download
+    import MyUpdater.core.probe, MyUpdater.core.piconsize, MyUpdater.core.mirrors, MyUpdater.core.common
+    from MyUpdater import core
+
+    only = set(args.only.split(",")) if args.only else None
+    bench = Bench(work, 0.1 if args.quick else 1.0)
+    print("Python {}, dane w {}".format(sys.version.split()[0], work))
+    try:
+        for name, func in CASES:
+            if only is None or name in only:
+                func(bench, core)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – pomiar czasu ładowania wtyczki przy starcie GUI
+#
+#  Enigma2 importuje plugin.py każdej wtyczki przy uruchomieniu GUI i woła
+#  Plugins(). Skrypt odtwarza to w czystym interpreterze z zaślepkami modułów
+#  enigma/Screens/Components/twisted i mierzy czas oraz liczbę importowanych
+#  modułów - osobno dla ścieżki deskryptora i dla pierwszego main().
+#
+#  Użycie: python benchmarks/bench_startup.py [--repeat 5] [--max-modules N] [--max-ms N]
+#
+from __future__ import print_function, absolute_import
+
+import os, sys, json, time, shutil, argparse, tempfile, subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN_DIR = os.path.join(ROOT, "usr", "lib", "enigma2", "python", "Plugins", "Extensions", "MyUpdater")
+PACKAGE = "Plugins.Extensions.MyUpdater"
+
+_SCREEN = '''
+class Screen(dict):
+    def __init__(self, session, parent=None):
+        dict.__init__(self)
+        self.session = session
+        self.onClose = []
+    def setTitle(self, title):
+        pass
+    def close(self, *args):
+        pass
+'''
+_WIDGET = '''
+class {0}(object):
+    def __init__(self, *args, **kwargs):
+        pass
+'''
+
+STUBS = {
+    "enigma.py": "class eDVBDB(object):\n    @staticmethod\n    def getInstance():\n        return eDVBDB()\n\n"
+                 "class eTimer(object):\n    pass\n",
+    "Screens/__init__.py": "",
+    "Screens/Screen.py": _SCREEN,
+    "Screens/MessageBox.py": "class MessageBox(object):\n    TYPE_YESNO, TYPE_INFO, TYPE_WARNING, TYPE_ERROR = 0, 1, 2, 3\n",
+    "Screens/Console.py": _WIDGET.format("Console"),
+    "Screens/ChoiceBox.py": _WIDGET.format("ChoiceBox"),
+    "Screens/Standby.py": "inStandby = None\n\n" + _WIDGET.format("TryQuitMainloop"),
+    "Screens/VirtualKeyBoard.py": _WIDGET.format("VirtualKeyBoard"),
+    "Components/__init__.py": "",
+    "Components/ActionMap.py": _WIDGET.format("ActionMap") + _WIDGET.format("NumberActionMap"),
+    "Components/MenuList.py": _WIDGET.format("MenuList"),
+    "Components/Label.py": _WIDGET.format("Label"),
+    "Components/ScrollLabel.py": _WIDGET.format("ScrollLabel"),
+    "Tools/__init__.py": "",
+    "Tools/Directories.py": "import os\n\ndef fileExists(path, mode='r'):\n    return os.path.exists(path)\n",
+    "Plugins/__init__.py": "",
+    "Plugins/Extensions/__init__.py": "",
+    "Plugins/Plugin.py": "class PluginDescriptor(object):\n"
+                        "    WHERE_PLUGINMENU, WHERE_EXTENSIONSMENU, WHERE_SESSIONSTART, WHERE_AUTOSTART = range(4)\n"
+                        "    def __init__(self, **kwargs):\n        self.__dict__.update(kwargs)\n",
+    "twisted/__init__.py": "",
+    "twisted/internet/__init__.py": "",
+    "twisted/internet/reactor.py": "def callFromThread(f, *a, **k):\n    f(*a, **k)\n\n"
+                                   "def callLater(delay, f, *a, **k):\n    pass\n",
+}
+
+def make_stubs(root):
+    for name, source in STUBS.items():
+        path = os.path.join(root, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write(source)
+    target = os.path.join(root, "Plugins", "Extensions", "MyUpdater")
+    try:
+        os.symlink(PLUGIN_DIR, target)
+    except (AttributeError, OSError):
+        shutil.copytree(PLUGIN_DIR, target)
+
+class _Session(object):
+    def open(self, *args, **kwargs):
+        pass
+
+def _measure(step):
+    before = set(sys.modules)
+    start = time.time()
+    result = step()
+    elapsed = time.time() - start
+    new = sorted(set(sys.modules) - before)
+    return result, {"ms": elapsed * 1000.0, "modules": len(new),
+                    "own": [m for m in new if m.startswith(PACKAGE)]}
+
+def child():
+    """Jeden pomiar w świeżym interpreterze; wynik jako JSON na stdout"""
+    import importlib
+    plugin, descriptor = _measure(lambda: importlib.import_module(PACKAGE + ".plugin").Plugins())
+    _, first_main = _measure(lambda: importlib.import_module(PACKAGE + ".plugin").main(_Session()))
+    print(json.dumps({"descriptor": descriptor, "main": first_main}))
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description="Czas ładowania wtyczki MyUpdater przy starcie GUI")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-modules", type=int, help="próg liczby modułów ścieżki deskryptora")
+    parser.add_argument("--max-ms", type=float, help="próg czasu (ms) ścieżki deskryptora")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    stubs = tempfile.mkdtemp(prefix="myupdater_bench_")
+    try:
+        make_stubs(stubs)
+        env = dict(os.environ, PYTHONPATH=stubs, PYTHONDONTWRITEBYTECODE="1")
+        runs = []
+        for i in range(args.repeat):
+            out = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--child"], env=env, cwd=stubs)
+            runs.append(json.loads(out.decode("utf-8").strip().splitlines()[-1]))
+    finally:
+        shutil.rmtree(stubs, ignore_errors=True)
+
+    for phase, label in (("descriptor", "Plugins() przy starcie GUI"), ("main", "pierwsze main()")):
+        ms = median([r[phase]["ms"] for r in runs])
+        last = runs[-1][phase]
+        print("{:<28} {:8.2f} ms  modułów: {:4d}  (wtyczki: {})".format(label, ms, last["modules"], len(last["own"])))
+        print("    " + ", ".join(m[len(PACKAGE) + 1:] or "__init__" for m in last["own"]))
+
+    descriptor = runs[-1]["descriptor"]
+    failed = False
+    if args.max_modules is not None and descriptor["modules"] > args.max_modules:
+        print("BŁĄD: ścieżka deskryptora importuje {} modułów (próg {})".format(descriptor["modules"], args.max_modules))
+        failed = True
+    if args.max_ms is not None and median([r["descriptor"]["ms"] for r in runs]) > args.max_ms:
+        print("BŁĄD: ścieżka deskryptora trwa dłużej niż {} ms".format(args.max_ms))
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,13 @@
 
 set -e
 
+# Z zainstalowaną wtyczką diagnostyka działa w procesie (równoległe sprawdzenia
+# z limitami czasu, raport JSON w /tmp/MyUpdater/diagnostic.json); poniższe
+# sprawdzenia powłoki zostają dla systemów przed instalacją wtyczki
+if [ -x /usr/bin/myupdater ]; then
+    exec /usr/bin/myupdater diagnose "$@"
+fi
+
 # Kolory dla wyświetlania
 RED='\033[0;31m'
 GREEN='\033[0;32m'
@@ -113,7 +120,7 @@ log "Przestrzeń dyskowa - root: $ROOT_AVAIL KB dostępne"
 # 5. Sprawdzenie połączenia internetowego
 echo ""
 echo -e "${BLUE}5. Połączenie internetowe:${NC}"
-if ping -c 1 8.8.8.8 >/dev/null 2>&1; then
+if ping -c 1 -W 3 8.8.8.8 >/dev/null 2>&1; then
     print_status "Internet: Połączenie aktywne" "OK"
     log "Połączenie internetowe: OK"
     
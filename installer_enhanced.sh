@@ -9,11 +9,38 @@ REQUIRED_PKGS="wget curl tar unzip bash python-json python-core"
 
 # Pliki do pobrania
 FILES_TO_DOWNLOAD="
+plugin.py
 plugin_enhanced.py
 logo.png
 myupdater.png
 __init__.py
-install_archive_script.sh
+core/__init__.py
+core/common.py
+core/sources.py
+core/net.py
+core/cache.py
+core/m3u.py
+core/archive.py
+core/picons.py
+core/snapshots.py
+core/lamedb.py
+core/bouquets.py
+core/jobs.py
+core/ledger.py
+core/system.py
+core/cli.py
+core/operations.py
+core/tasks.py
+core/opkg.py
+core/diagnostics.py
+core/delta.py
+core/catalog.py
+core/mirrors.py
+core/download.py
+core/selfupdate.py
+core/prefetch.py
+core/probe.py
+core/piconsize.py
 "
 
 # Funkcje pomocnicze
@@ -118,14 +145,8 @@ FAILED_FILES=""
 for FILE in $FILES_TO_DOWNLOAD; do
     echo "  > Pobieranie $FILE..."
     
-    # Specjalne traktowanie dla plugin_enhanced.py
-    if [ "$FILE" = "plugin_enhanced.py" ]; then
-        TARGET_FILE="plugin.py"
-    else
-        TARGET_FILE="$FILE"
-    fi
-    
-    if wget -q --timeout=30 "$GITHUB_RAW_URL/$FILE" -O "$PLUGIN_DIR/$TARGET_FILE" 2>/dev/null; then
+    mkdir -p "$(dirname "$PLUGIN_DIR/$FILE")"
+    if wget -q --timeout=30 "$GITHUB_RAW_URL/$FILE" -O "$PLUGIN_DIR/$FILE" 2>/dev/null; then
         echo "    ✓ Sukces"
         log "Pobrano: $FILE"
     else
@@ -149,19 +170,31 @@ fi
 echo ""
 echo ">>> Ustawianie uprawnień dla plików wtyczki..."
 chmod 644 "$PLUGIN_DIR"/*.png "$PLUGIN_DIR"/*.py 2>/dev/null || true
-chmod +x "$PLUGIN_DIR/install_archive_script.sh"
+chmod 644 "$PLUGIN_DIR"/core/*.py 2>/dev/null || true
+
+# --- Polecenie myupdater (wiersz poleceń) ---
+echo ""
+echo ">>> Tworzenie polecenia /usr/bin/myupdater..."
+cat > /usr/bin/myupdater <<'EOF'
+#!/bin/sh
+PY=$(command -v python3 || command -v python)
+PYTHONPATH=/usr/lib/enigma2/python exec "$PY" -m Plugins.Extensions.MyUpdater.core.cli "$@"
+EOF
+chmod 755 /usr/bin/myupdater 2>/dev/null || true
 
 # --- Czyszczenie starych plików ---
 echo ""
 echo ">>> Czyszczenie starych plików..."
 rm -f "$PLUGIN_DIR"/*.pyo 2>/dev/null || true
 rm -f "$PLUGIN_DIR"/*.pyc 2>/dev/null || true
+rm -f "$PLUGIN_DIR"/core/*.pyo "$PLUGIN_DIR"/core/*.pyc 2>/dev/null || true
+rm -f "$PLUGIN_DIR/install_archive_script.sh" 2>/dev/null || true
 
 # --- Sprawdzenie instalacji ---
 echo ""
 echo ">>> Sprawdzanie instalacji..."
 MISSING_FILES=""
-for FILE in plugin.py logo.png myupdater.png __init__.py install_archive_script.sh; do
+for FILE in plugin.py plugin_enhanced.py logo.png myupdater.png __init__.py core/archive.py; do
     if [ ! -f "$PLUGIN_DIR/$FILE" ]; then
         MISSING_FILES="$MISSING_FILES $FILE"
     fi
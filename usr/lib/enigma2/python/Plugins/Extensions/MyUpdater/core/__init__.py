@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+# MyUpdater Enhanced - logika niezależna od interfejsu Enigma2
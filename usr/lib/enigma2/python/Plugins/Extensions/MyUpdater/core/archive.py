@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – instalacja archiwów bez wget/unzip/mv
+#
+#  tar.gz rozpakowywany jest prosto ze strumienia sieciowego (tarfile "r|gz"),
+#  zip czytany jest sekwencyjnie po nagłówkach lokalnych i dekompresowany
+#  w locie (zlib); rozmiar i SHA-256 z manifestu sprawdzane są po przeczytaniu
+#  całego strumienia. Gdy zip nie daje się czytać strumieniowo (np. pliki
+#  "stored" z deskryptorem danych) albo połączenie zostanie zerwane,
+#  archiwum pobierane jest modułem download (wznawianie, segmenty) do
+#  DOWNLOAD_DIR na flashu - nie do /tmp w pamięci RAM - i rozpakowywane po
+#  sprawdzeniu; przerwane pobieranie wznawia się przy kolejnej próbie.
+#  Na docelowy flash trafiają wyłącznie wybrane pliki.
+#
+from __future__ import print_function, absolute_import
+
+import os, re, time, shutil, struct, hashlib, tarfile, zipfile, zlib
+
+from . import net, download, ledger, delta
+from .snapshots import SnapshotStore
+from .operations import STAGE_NAMES
+from .common import log, ensure_dir, PLUGIN_TMP_PATH, DATA_PATH, E2_DIR, WARNING
+
+CHUNK = 64 * 1024
+STAGING_DIR = os.path.join(PLUGIN_TMP_PATH, "chlist")
+# Całe archiwa (wznawiane pobieranie, pobieranie w tle) - na tym samym systemie plików co pamięć podręczna archiwów
+DOWNLOAD_DIR = os.path.join(DATA_PATH, "downloads")
+LIST_FILE_RE = re.compile(r'^(lamedb5?|.+\.tv|.+\.radio)$')
+
+class ArchiveError(Exception):
+    pass
+
+class ZipStreamUnsupported(ArchiveError):
+    pass
+
+class Progress(object):
+    """Etapy operacji i ich czasy; callback(stage, done, total) przy każdej zmianie;
+    cancelled() - czy odbiorca (np. zamknięty ekran) zrezygnował z wyniku"""
+
+    def __init__(self, callback=None, cancelled=None):
+        self.callback = callback
+        self.cancel_check = cancelled
+        self.timings = []
+        self.current = None
+        self.started = None
+
+    def stage(self, name):
+        self._close()
+        self.current, self.started = name, time.time()
+        self.update(0, None)
+
+    def update(self, done, total=None):
+        if self.callback:
+            self.callback(self.current, done, total)
+
+    def cancelled(self):
+        return bool(self.cancel_check and self.cancel_check())
+
+    def _close(self):
+        if self.current is not None:
+            self.timings.append((self.current, time.time() - self.started))
+            self.current = None
+
+    def finish(self):
+        self._close()
+        return self.timings
+
+def archive_type_of(url):
+    """"zip" / "tar.gz" na podstawie adresu, None dla nieobsługiwanych"""
+    path = url.split("?")[0].lower()
+    if path.endswith(".zip"):
+        return "zip"
+    if path.endswith((".tar.gz", ".tgz")):
+        return "tar.gz"
+    return None
+
+def format_timings(timings):
+    return "\n".join("{}: {:.1f} s".format(STAGE_NAMES.get(k, k), t) for k, t in timings)
+
+class _CountingReader(object):
+    """Opakowanie strumienia liczące pobrane bajty (dla postępu) i ich SHA-1/SHA-256;
+    opcjonalnie kopiuje strumień do pliku `sink`"""
+
+    def __init__(self, fileobj, progress, total, sink=None):
+        self.fileobj = fileobj
+        self.progress = progress
+        self.total = total
+        self.sink = sink
+        self.sha1 = hashlib.sha1()
+        self.sha256 = hashlib.sha256()
+        self.done = 0
+        self.reported = 0
+
+    def read(self, n=-1):
+        data = self.fileobj.read(n)
+        self.sha1.update(data)
+        self.sha256.update(data)
+        if self.sink:
+            self.sink.write(data)
+        self.done += len(data)
+        if self.progress and (self.done - self.reported >= 256 * 1024 or not data):
+            self.reported = self.done
+            self.progress.update(self.done, self.total)
+        return data
+
+class _StreamReader(object):
+    """Czytanie dokładnej liczby bajtów ze strumienia z możliwością zwrotu nadmiaru"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.buf = b""
+
+    def read(self, n):
+        if self.buf:
+            data, self.buf = self.buf[:n], self.buf[n:]
+            return data
+        return self.fileobj.read(n)
+
+    def read_exact(self, n):
+        parts, left = [], n
+        while left > 0:
+            data = self.read(min(left, CHUNK))
+            if not data:
+                raise ArchiveError("Nieoczekiwany koniec archiwum")
+            parts.append(data)
+            left -= len(data)
+        return b"".join(parts)
+
+    def unread(self, data):
+        self.buf = data + self.buf
+
+def write_member(src_chunks, dest):
+    """Zapisuje dane do pliku tymczasowego i podmienia go atomowo; zwraca CRC32"""
+    tmp = dest + ".part"
+    crc = 0
+    with open(tmp, "wb") as f:
+        for chunk in src_chunks:
+            crc = zlib.crc32(chunk, crc)
+            f.write(chunk)
+    os.rename(tmp, dest)
+    return crc & 0xffffffff
+
+def _discard(chunks):
+    crc = 0
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+    return crc & 0xffffffff
+
+def _stored_chunks(reader, size):
+    left = size
+    while left > 0:
+        data = reader.read_exact(min(left, CHUNK))
+        left -= len(data)
+        yield data
+
+def _deflate_chunks(reader, size):
+    d = zlib.decompressobj(-15)
+    left = size
+    while True:
+        if size is not None and left <= 0:
+            break
+        data = reader.read(CHUNK if size is None else min(left, CHUNK))
+        if not data:
+            raise ArchiveError("Nieoczekiwany koniec archiwum")
+        if size is not None:
+            left -= len(data)
+        out = d.decompress(data)
+        if out:
+            yield out
+        if d.unused_data or getattr(d, "eof", False):
+            reader.unread(d.unused_data)
+            break
+    out = d.flush()
+    if out:
+        yield out
+
+def extract_zip_stream(fileobj, select):
+    """Rozpakowuje zip sekwencyjnie; select(nazwa) zwraca ścieżkę docelową lub None"""
+    reader = _StreamReader(fileobj)
+    extracted = []
+    while True:
+        sig = reader.read_exact(4)
+        if sig != b"PK\x03\x04":
+            break  # katalog centralny - koniec wpisów
+        (_, flags, method, _, _, crc, csize, usize,
+         name_len, extra_len) = struct.unpack("<HHHHHIIIHH", reader.read_exact(26))
+        name = reader.read_exact(name_len).decode("cp437" if not flags & 0x800 else "utf-8")
+        reader.read_exact(extra_len)
+        has_descriptor = flags & 0x08
+        if flags & 0x01:
+            raise ZipStreamUnsupported("Zaszyfrowane archiwum")
+        if method == 0:
+            if has_descriptor:
+                raise ZipStreamUnsupported("Plik 'stored' z deskryptorem danych")
+            chunks = _stored_chunks(reader, csize)
+        elif method == 8:
+            chunks = _deflate_chunks(reader, None if has_descriptor else csize)
+        else:
+            raise ZipStreamUnsupported("Nieobsługiwana metoda kompresji: {}".format(method))
+
+        dest = None if name.endswith("/") else select(name)
+        got = write_member(chunks, dest) if dest else _discard(chunks)
+
+        if has_descriptor:
+            head = reader.read_exact(4)
+            if head == b"PK\x07\x08":
+                head = reader.read_exact(4)
+            crc = struct.unpack("<I", head)[0]
+            reader.read_exact(8)
+        if got != crc:
+            raise ArchiveError("Błąd CRC: {}".format(name))
+        if dest:
+            extracted.append(dest)
+    return extracted
+
+def extract_zip_file(path, select):
+    extracted = []
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            if info.filename.endswith("/"):
+                continue
+            dest = select(info.filename)
+            if dest:
+                with zf.open(info) as src:
+                    write_member(iter(lambda: src.read(CHUNK), b""), dest)
+                extracted.append(dest)
+    return extracted
+
+def extract_tar_stream(fileobj, select):
+    extracted = []
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as tf:
+        for member in tf:
+            if not member.isfile():
+                continue
+            dest = select(member.name)
+            if dest:
+                src = tf.extractfile(member)
+                write_member(iter(lambda: src.read(CHUNK), b""), dest)
+                extracted.append(dest)
+    return extracted
+
+def _drain(reader):
+    while reader.read(CHUNK):
+        pass
+
+def stream_extract(url, archive_type, select, progress=None, timeout=30, keep=None, size=None, sha256=None):
+    """Pobiera archiwum i rozpakowuje wybrane pliki w locie; zwraca (pliki, sha1 archiwum).
+    Niezgodny rozmiar lub SHA-256 -> download.IntegrityError (rozpakowane pliki nie nadają się
+    do instalacji). Gdy podano `keep`, całe archiwum zapisywane jest też pod tą ścieżką."""
+    if progress:
+        progress.stage("download")
+    resp = net.open_url(url, timeout=timeout)
+    sink = open(keep + ".part", "wb") if keep else None
+    try:
+        reader = _CountingReader(resp, progress, net.content_length(resp), sink)
+        if archive_type == "tar.gz":
+            extracted = extract_tar_stream(reader, select)
+        else:
+            extracted = extract_zip_stream(reader, select)
+        _drain(reader)  # reszta archiwum (katalog centralny) - do skrótu i kopii
+        download.check(reader.done, reader.sha256.hexdigest(), reader.total, size, sha256)
+        if sink:
+            sink.close()
+            os.rename(keep + ".part", keep)
+        return extracted, reader.sha1.hexdigest()
+    finally:
+        resp.close()
+        if sink and not sink.closed:
+            sink.close()
+            os.remove(keep + ".part")
+
+def extract_local(path, archive_type, select):
+    """Rozpakowuje wybrane pliki z archiwum na dysku"""
+    if archive_type == "tar.gz":
+        with open(path, "rb") as f:
+            return extract_tar_stream(f, select)
+    return extract_zip_file(path, select)
+
+def _download_path(key):
+    # Nazwa zależna od adresu i wersji - przerwane pobieranie (także w tle) wznawia się przy kolejnej próbie
+    ensure_dir(DOWNLOAD_DIR)
+    return os.path.join(DOWNLOAD_DIR, "archive_" + hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+def prefetch_archive(url, version, sha256=None, size=None, throttle=None):
+    """Pobiera archiwum listy do pamięci podręcznej (url#wersja) bez instalacji - instalacja tej
+    wersji nie będzie potrzebowała sieci; zwraca sha1 archiwum"""
+    key = ledger.archive_key(url, version)
+    path = _download_path(key)
+    try:
+        digest = download.fetch(url, path, size=size, sha256=sha256, segments=1, throttle=throttle)["sha1"]
+        ledger.archive_cache().put_file(key, path, hash=digest)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return digest
+
+def stage_list_archive(url, archive_type, staging, progress=None, version="", sha256=None, size=None):
+    """Rozpakowuje pliki list z archiwum do katalogu `staging`; zwraca (ścieżki, sha1 archiwum).
+    Archiwa z wersją brane są z pamięci podręcznej (url#wersja) lub do niej dodawane;
+    pobrane sprawdzane jest wg rozmiaru i SHA-256 z manifestu (gdy je podaje). Nowe archiwum
+    rozpakowywane jest w locie; wznawiane pobieranie na flash tylko po nieudanej próbie."""
+    progress = progress or Progress()
+    shutil.rmtree(staging, ignore_errors=True)
+    ensure_dir(staging)
+
+    def select(name):
+        base = os.path.basename(name)
+        if LIST_FILE_RE.match(base):
+            return os.path.join(staging, base)
+
+    cache = ledger.archive_cache() if version else None
+    key = ledger.archive_key(url, version)
+    entry = cache.get(key) if cache else None
+    if entry:
+        progress.stage("cache")
+        log("Archiwum z pamięci podręcznej: {}".format(key))
+        staged, digest = extract_local(entry.path, archive_type, select), entry.meta.get("hash")
+    else:
+        path = _download_path(key)
+        staged = None
+        if not download.resumable(path):
+            try:
+                staged, digest = stream_extract(url, archive_type, select, progress, keep=path if cache else None,
+                                                size=size, sha256=sha256)
+            except (download.IntegrityError, net.HTTPError):
+                raise
+            except Exception as e:
+                log("Rozpakowanie w locie {}: {} - pobieram całe archiwum".format(url, e), WARNING)
+                shutil.rmtree(staging, ignore_errors=True)
+                ensure_dir(staging)
+        if staged is None:
+            staged, digest = _fetch_extract(url, archive_type, select, path, progress, size, sha256, cache, key)
+        elif cache and staged:
+            cache.put_file(key, path, hash=digest)
+        elif os.path.exists(path):
+            os.remove(path)
+    if not staged:
+        raise ArchiveError("Nie znaleziono plików list (lamedb, *.tv) w archiwum!")
+    return staged, digest
+
+def _fetch_extract(url, archive_type, select, path, progress, size, sha256, cache, key):
+    """Pobiera archiwum do `path` (wznawiając przerwane pobieranie) i rozpakowuje je po sprawdzeniu"""
+    digest = download.fetch(url, path, size=size, sha256=sha256, progress=progress)["sha1"]
+    try:
+        progress.stage("extract")
+        staged = extract_local(path, archive_type, select)
+        if cache and staged:
+            cache.put_file(key, path, hash=digest)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return staged, digest
+
+def diff_staged(staged, progress=None, e2_dir=E2_DIR):
+    """Porównuje przygotowane pliki list z zainstalowanymi; zwraca delta.ChangeSet"""
+    if progress:
+        progress.stage("diff")
+    return delta.diff([(os.path.basename(p), p) for p in staged], e2_dir)
+
+def apply_staged(staged, progress=None, e2_dir=E2_DIR):
+    """Przenosi do katalogu Enigma2 tylko pliki różniące się od zainstalowanych; zwraca delta.ChangeSet"""
+    progress = progress or Progress()
+    changes = diff_staged(staged, progress, e2_dir)
+    progress.stage("install")
+    return changes.apply(e2_dir, progress)
+
+def install_list_archive(url, archive_type, progress=None, e2_dir=E2_DIR, backup=True, version="", title="",
+                         sha256=None, size=None):
+    """Instaluje listę kanałów (lamedb, *.tv, *.radio) z archiwum i zapisuje ją w rejestrze.
+    Zapisywane są tylko zmienione pliki, migawka tylko gdy coś się zmienia; zwraca delta.ChangeSet"""
+    progress = progress or Progress()
+    try:
+        staged, digest = stage_list_archive(url, archive_type, STAGING_DIR, progress, version, sha256, size)
+        changes = diff_staged(staged, progress, e2_dir)
+        if backup and changes.written:
+            progress.stage("backup")
+            SnapshotStore(e2_dir=e2_dir).take("Przed instalacją: {}".format(os.path.basename(url)))
+        progress.stage("install")
+        changes.apply(e2_dir, progress)
+        ledger.record(url, version, digest, "list", title)
+        return changes
+    finally:
+        shutil.rmtree(STAGING_DIR, ignore_errors=True)
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – rejestr bukietów (bouquets.tv / bouquets.radio)
+#
+#  Pliki parsowane są raz do uporządkowanej listy wpisów z indeksem po
+#  dokładnej nazwie bukietu (bez dopasowań podciągów). Dowolna liczba zmian
+#  zapisywana jest jednym atomowym rename na plik.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, re
+from contextlib import contextmanager
+
+from .common import log, E2_DIR
+
+BOUQUET_RE = re.compile(r'FROM BOUQUET "([^"]+)"')
+
+KINDS = {
+    ".tv": ("bouquets.tv", "#NAME User - bouquets (TV)", 1),
+    ".radio": ("bouquets.radio", "#NAME User - bouquets (Radio)", 2),
+}
+
+def bouquet_line(bouquet_id, service_type=1):
+    return u'#SERVICE 1:7:{}:0:0:0:0:0:0:0:FROM BOUQUET "{}" ORDER BY bouquet'.format(service_type, bouquet_id)
+
+def atomic_write_lines(path, lines):
+    tmp = path + ".tmp"
+    with io.open(tmp, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + u"\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp, path)
+
+class BouquetFile(object):
+    """Jeden plik bouquets.*: wiersze w oryginalnej kolejności i indeks bouquet_id -> wiersz"""
+
+    def __init__(self, path, name_line, service_type):
+        self.path = path
+        self.service_type = service_type
+        self.dirty = False
+        self._index = None
+        self.lines = []
+        try:
+            with io.open(path, "r", encoding="utf-8", errors="ignore") as f:
+                self.lines = [l.rstrip("\r\n") for l in f]
+        except (IOError, OSError):
+            self.lines = [name_line]
+        while self.lines and not self.lines[-1].strip():
+            self.lines.pop()
+        # bouquet_id dla każdego wiersza (None dla pozostałych), równolegle do self.lines
+        self.line_ids = [self.bouquet_of(l) for l in self.lines]
+
+    @staticmethod
+    def bouquet_of(line):
+        m = BOUQUET_RE.search(line) if line.startswith("#SERVICE") else None
+        return m.group(1) if m else None
+
+    def ids(self):
+        return [b for b in self.line_ids if b]
+
+    def _position(self, bouquet_id):
+        if self._index is None:
+            self._index = {}
+            for i, b in enumerate(self.line_ids):
+                if b:
+                    self._index.setdefault(b, i)
+        return self._index.get(bouquet_id, -1)
+
+    def _changed(self):
+        self.dirty = True
+        self._index = None
+
+    def add(self, bouquet_id, position=None):
+        if self._position(bouquet_id) >= 0:
+            return False
+        line = bouquet_line(bouquet_id, self.service_type)
+        if position is None:
+            self.lines.append(line)
+            self.line_ids.append(bouquet_id)
+            self.dirty = True
+            self._index[bouquet_id] = len(self.lines) - 1  # dopisanie na końcu nie przesuwa innych
+        else:
+            self._insert(position, line, bouquet_id)
+            self._changed()
+        return True
+
+    def remove(self, bouquet_id):
+        i = self._position(bouquet_id)
+        if i < 0:
+            return False
+        del self.lines[i]
+        del self.line_ids[i]
+        self._changed()
+        return True
+
+    def move(self, bouquet_id, position):
+        i = self._position(bouquet_id)
+        if i < 0:
+            return False
+        line = self.lines.pop(i)
+        del self.line_ids[i]
+        self._insert(position, line, bouquet_id)
+        self._changed()
+        return True
+
+    def _insert(self, position, line, bouquet_id):
+        """Wstawia wpis przed bukiet o numerze `position` (liczonym wśród bukietów)"""
+        count = 0
+        for i, b in enumerate(self.line_ids):
+            if b:
+                if count == position:
+                    self.lines.insert(i, line)
+                    self.line_ids.insert(i, bouquet_id)
+                    return
+                count += 1
+        self.lines.append(line)
+        self.line_ids.append(bouquet_id)
+
+    def save(self):
+        if self.dirty:
+            atomic_write_lines(self.path, self.lines)
+            self.dirty = False
+            return True
+        return False
+
+class BouquetRegistry(object):
+    """Rejestr bukietów użytkownika; zmiany zapisywane hurtowo przez commit()"""
+
+    def __init__(self, e2_dir=E2_DIR):
+        self.e2_dir = e2_dir
+        self.files = {}
+
+    def _file(self, bouquet_id):
+        ext = os.path.splitext(bouquet_id)[1]
+        if ext not in KINDS:
+            raise ValueError("Nieznany typ bukietu: {}".format(bouquet_id))
+        if ext not in self.files:
+            name, name_line, service_type = KINDS[ext]
+            self.files[ext] = BouquetFile(os.path.join(self.e2_dir, name), name_line, service_type)
+        return self.files[ext]
+
+    def __contains__(self, bouquet_id):
+        return self._file(bouquet_id)._position(bouquet_id) >= 0
+
+    def ids(self, ext=".tv"):
+        return self._file("x" + ext).ids()
+
+    def add(self, bouquet_id, position=None):
+        return self._file(bouquet_id).add(bouquet_id, position)
+
+    def remove(self, bouquet_id):
+        return self._file(bouquet_id).remove(bouquet_id)
+
+    def move(self, bouquet_id, position):
+        return self._file(bouquet_id).move(bouquet_id, position)
+
+    def commit(self):
+        """Zapisuje zmienione pliki; zwraca listę zapisanych ścieżek"""
+        written = [f.path for f in self.files.values() if f.save()]
+        if written:
+            log("Rejestr bukietów: zapisano {}".format(", ".join(written)))
+        return written
+
+@contextmanager
+def transaction(e2_dir=E2_DIR):
+    """with transaction() as reg: reg.add(...); ... - jeden zapis na końcu bloku"""
+    registry = BouquetRegistry(e2_dir)
+    yield registry
+    registry.commit()
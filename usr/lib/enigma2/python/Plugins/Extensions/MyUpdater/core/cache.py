@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – trwała pamięć podręczna dokumentów źródłowych
+#
+#  Każdy wpis to para plików <sha1>.body / <sha1>.json w katalogu na flashu
+#  (nie w /tmp), więc przetrwa restart. Metadane zawierają ETag/Last-Modified
+#  do warunkowej rewalidacji. Po przekroczeniu limitu rozmiaru usuwane są
+#  najdawniej używane wpisy.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, json, time, shutil, hashlib
+
+from .common import log, ensure_dir, get_setting, DATA_PATH
+
+CACHE_PATH = os.path.join(DATA_PATH, "cache")
+
+def _atomic_write(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.rename(tmp, path)
+
+class CacheEntry(object):
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+
+    def age(self, now=None):
+        return (now or time.time()) - self.meta.get("fetched", 0)
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+class DocumentCache(object):
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _base(self, key):
+        return os.path.join(self.root, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _load_meta(self, base):
+        try:
+            with io.open(base + ".json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _save_meta(self, base, meta):
+        _atomic_write(base + ".json", json.dumps(meta).encode('utf-8'))
+
+    def get(self, key):
+        base = self._base(key)
+        meta = self._load_meta(base)
+        if meta is None or not os.path.exists(base + ".body"):
+            return None
+        try:
+            os.utime(base + ".body", None)  # znacznik LRU
+        except OSError:
+            pass
+        return CacheEntry(base + ".body", meta)
+
+    def put(self, key, body, **meta):
+        ensure_dir(self.root)
+        base = self._base(key)
+        meta.update(key=key, fetched=time.time(), size=len(body))
+        _atomic_write(base + ".body", body)
+        self._save_meta(base, meta)
+        self.evict()
+        return CacheEntry(base + ".body", meta)
+
+    def put_file(self, key, path, **meta):
+        """Jak put(), ale przenosi gotowy plik zamiast trzymać treść w pamięci"""
+        ensure_dir(self.root)
+        base = self._base(key)
+        meta.update(key=key, fetched=time.time(), size=os.path.getsize(path))
+        shutil.move(path, base + ".body")
+        self._save_meta(base, meta)
+        self.evict()
+        return self.get(key)
+
+    def touch(self, key, **meta):
+        """Odświeża czas pobrania po odpowiedzi 304 (treść bez zmian)"""
+        base = self._base(key)
+        old = self._load_meta(base)
+        if old is None:
+            return
+        old.update(meta)
+        old["fetched"] = time.time()
+        self._save_meta(base, old)
+
+    def remove(self, key):
+        base = self._base(key)
+        for ext in (".body", ".json"):
+            try: os.remove(base + ext)
+            except OSError: pass
+
+    def evict(self):
+        """Usuwa najdawniej używane wpisy, aż łączny rozmiar zmieści się w limicie"""
+        try:
+            names = [n for n in os.listdir(self.root) if n.endswith(".body")]
+        except OSError:
+            return
+        items, total = [], 0
+        for n in names:
+            st = os.stat(os.path.join(self.root, n))
+            items.append((st.st_mtime, st.st_size, n[:-len(".body")]))
+            total += st.st_size
+        items.sort()
+        while total > self.max_bytes and items:
+            _, size, name = items.pop(0)
+            for ext in (".body", ".json"):
+                try: os.remove(os.path.join(self.root, name + ext))
+                except OSError: pass
+            total -= size
+            log("Cache: usunięto wpis {} ({} B)".format(name, size))
+
+_document_cache = None
+
+def document_cache():
+    global _document_cache
+    if _document_cache is None:
+        _document_cache = DocumentCache(CACHE_PATH, get_setting("cache_max_kb") * 1024)
+    return _document_cache
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – katalog list z indeksem wyszukiwania
+#
+#  Wpisy wszystkich źródeł indeksowane są raz, gdy źródło dostarczy wyniki:
+#  nazwa, autor i typ rozbijane są na znormalizowane słowa (małe litery,
+#  bez polskich znaków), a słowa i ich zapis T9 (klawisze pilota) trzymane
+#  są w posortowanych tablicach. Wyszukiwanie po prefiksie to bisect, nie
+#  przeglądanie wszystkich wpisów; ekran liczy etykiety tylko dla bieżącej strony.
+#
+from __future__ import print_function, absolute_import
+
+import re, time, bisect, unicodedata
+
+from .common import log, DEBUG
+
+TYPES = ("LIST", "M3U", "BOUQUET", "S4A")
+
+STATE_NEW = "new"
+STATE_CURRENT = "current"
+STATE_UPDATE = "update"  # zainstalowana inna wersja niż w źródle
+
+_SPLIT_RE = re.compile(r'[^0-9a-z]+')
+_LETTERS = {u"ł": u"l", u"Ł": u"l", u"ß": u"ss", u"ø": u"o", u"đ": u"d"}
+_T9 = dict((c, str(k)) for k, letters in enumerate(("", "", "abc", "def", "ghi", "jkl", "mno", "pqrs", "tuv", "wxyz"))
+           for c in letters)
+
+def normalize(text):
+    """Słowa tekstu: małe litery ASCII i cyfry, np. u"Łódź HD 4K" -> [u"lodz", u"hd", u"4k"]"""
+    if isinstance(text, bytes):
+        text = text.decode("utf-8", "ignore")
+    text = u"".join(_LETTERS.get(c, c) for c in text)
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+    return [w for w in _SPLIT_RE.split(text) if w]
+
+def t9(word):
+    """Zapis słowa klawiszami pilota (cyfry bez zmian): u"hd" -> "43" """
+    return "".join(_T9.get(c, c) for c in word)
+
+def entry_state(info, ledger):
+    installed = ledger.get(info.get("url")) if ledger is not None else None
+    if not installed:
+        return STATE_NEW
+    if info.get("version") and installed.get("version") != info.get("version"):
+        return STATE_UPDATE
+    return STATE_CURRENT
+
+class Catalog(object):
+    """Wpisy menu (tytuł, akcja, info) ze źródeł, w kolejności źródeł, z indeksem słów"""
+
+    def __init__(self, ledger=None):
+        self.ledger = ledger
+        self.sources = []
+        self.by_source = {}
+        self.entries = []
+        self.states = []
+        self.words = []  # posortowane (słowo, nr wpisu)
+        self.keys = []   # posortowane (słowo T9, nr wpisu)
+
+    def update(self, source_name, entries):
+        """Podmienia wpisy źródła i przebudowuje indeks"""
+        if source_name not in self.by_source:
+            self.sources.append(source_name)
+        self.by_source[source_name] = list(entries or [])
+        start = time.time()
+        self.entries = [e for name in self.sources for e in self.by_source[name]]
+        self.states, words = [], set()
+        for i, entry in enumerate(self.entries):
+            info = entry[2] if len(entry) > 2 else {}
+            self.states.append(entry_state(info, self.ledger))
+            for word in normalize(u" ".join((info.get("name") or entry[0], info.get("author", ""), info.get("type", "")))):
+                words.add((word, i))
+        self.words = sorted(words)
+        self.keys = sorted((t9(w), i) for w, i in words)
+        log("Katalog: {} wpisów, {} słów w {:.3f} s".format(len(self.entries), len(self.words), time.time() - start), DEBUG)
+
+    @staticmethod
+    def _prefix(table, prefix):
+        start = bisect.bisect_left(table, (prefix,))
+        end = bisect.bisect_left(table, (prefix + u"\uffff",))
+        return set(i for w, i in table[start:end])
+
+    def search(self, query="", digits=False, entry_type=None, updates_only=False):
+        """Numery wpisów (w kolejności katalogu), w których każde słowo zapytania jest prefiksem
+        któregoś słowa wpisu. digits=True: zapytanie z klawiszy pilota (T9, "0" rozdziela słowa)."""
+        if digits:
+            table, terms = self.keys, [t for t in re.split(r'0+', query) if t]
+        else:
+            table, terms = self.words, normalize(query)
+        found = None
+        for term in terms:
+            matches = self._prefix(table, term)
+            found = matches if found is None else found & matches
+            if not found:
+                return []
+        result = range(len(self.entries)) if found is None else sorted(found)
+        if entry_type:
+            result = [i for i in result if self.info(i).get("type") == entry_type]
+        if updates_only:
+            result = [i for i in result if self.states[i] == STATE_UPDATE]
+        return list(result)
+
+    def info(self, i):
+        entry = self.entries[i]
+        return entry[2] if len(entry) > 2 else {}
+
+    def counts(self):
+        """Liczba wpisów wg typu i liczba dostępnych aktualizacji"""
+        counts = dict((t, 0) for t in TYPES)
+        for i in range(len(self.entries)):
+            t = self.info(i).get("type")
+            counts[t] = counts.get(t, 0) + 1
+        return counts, self.states.count(STATE_UPDATE)
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – wiersz poleceń (SSH, cron)
+#
+#  myupdater lists [--json]
+#  myupdater install <id> [<id>...] [--force] [--no-reload]
+#  myupdater m3u2bouquet <plik|url> [<plik|url>...] <bouquet_id> [--name N] [--split-groups]
+#                        [--probe] [--keep-duplicates] [--out DIR | --install]
+#  myupdater snapshot [list | take [--label L] | restore <id>]
+#  myupdater history [--last N]
+#  myupdater packages [<regex> | --prefix P] [--installed] [--softcams]
+#  myupdater diagnose [--json] [--force]
+#  myupdater hosts [--json]
+#  myupdater selfupdate [--check]
+#  myupdater release-manifest [--version V] [--out update.json]
+#  myupdater prefetch [--status]
+#
+#  Uruchamiane przez python -m Plugins.Extensions.MyUpdater.core.cli, bez enigma2.
+#
+from __future__ import print_function, absolute_import
+
+import os, sys, json, time, shutil, argparse, datetime
+
+from . import sources, jobs, ledger, m3u, probe, net, snapshots, system, operations, opkg, diagnostics, delta, mirrors, selfupdate, prefetch
+from .bouquets import BouquetRegistry
+from .common import ensure_dir, get_setting, flush_log, PLUGIN_TMP_PATH, E2_DIR
+
+def _all_entries():
+    results = sources.load_all(sources.configured_sources())
+    entries = []
+    for name, (status, lst) in sorted(results.items()):
+        if status not in (sources.STATUS_OK, sources.STATUS_EMPTY):
+            print("Źródło {}: {}".format(name, status), file=sys.stderr)
+        entries.extend(lst or [])
+    return entries
+
+def cmd_lists(args):
+    installed = ledger.Ledger()
+    rows = []
+    for title, action, info in _all_entries():
+        state = ""
+        if installed.is_current(info.get("url"), info.get("version")):
+            state = "aktualna"
+        elif installed.get(info.get("url")):
+            state = "zainstalowana"
+        rows.append(dict(info, title=title, action=action, state=state))
+    if args.json:
+        print(json.dumps(rows, indent=1, sort_keys=True))
+        return 0
+    for r in rows:
+        print("{:<8}  {:<7}  {:<12}  {:<13}  {}".format(r["id"], r["type"], r.get("version", "")[:12], r["state"], r["title"]))
+    return 0
+
+# Tryb servicelistreload w OpenWebif dla poziomu przeładowania z delta.ChangeSet.reload
+WEBIF_RELOAD_MODES = {delta.RELOAD_FULL: 0, delta.RELOAD_BOUQUETS: 2}
+
+def _reload(args, reload, operation=None):
+    if args.no_reload:
+        return
+    if reload == delta.RELOAD_NONE:
+        print("Przeładowanie list: pominięte (bez zmian)")
+        return
+    operation = operation or operations.Operation("reload", "Przeładowanie list")
+    with operation.span("reload"):
+        ok = system.reload_lists_webif(WEBIF_RELOAD_MODES[reload])
+    print("Przeładowanie list ({}): {}".format(delta.RELOAD_NAMES[reload], "OK" if ok else "niedostępne (OpenWebif)"))
+
+def cmd_install(args):
+    by_id = dict((e[2]["id"], e) for e in _all_entries())
+    missing = [i for i in args.ids if i not in by_id]
+    if missing:
+        print("Nieznane identyfikatory: {}".format(", ".join(missing)), file=sys.stderr)
+        return 2
+    last = {}
+
+    def on_update(job):
+        if last.get(id(job)) != job.status:
+            last[id(job)] = job.status
+            print("  {} - {}{}".format(job.title, job.status, ": {}".format(job.error) if job.error else ""))
+
+    queue = jobs.InstallQueue([jobs.Job(*by_id[i][:3]) for i in args.ids], on_update=on_update, force=args.force)
+    queue.run()
+    for job in queue.jobs:
+        times = " + ".join("{:.1f} s".format(job.timings[k]) for k in ("download", "install") if k in job.timings)
+        print("{:<10} {} {} {}".format(job.status, job.title, job.result, "({})".format(times) if times else ""))
+    _reload(args, queue.changes.reload, queue.operation)
+    failed = [j for j in queue.jobs if j.status == jobs.STATUS_ERROR]
+    queue.operation.finish(status=operations.STATUS_ERROR if failed else None,
+                           detail="{} z {} poz.".format(len(queue.jobs) - len(failed), len(queue.jobs)))
+    return 1 if failed else 0
+
+def cmd_m3u2bouquet(args):
+    operation = operations.Operation("m3u", "m3u2bouquet: {}".format(args.bouquet_id))
+    try:
+        converted = _m3u2bouquet(args, operation)
+    except Exception as e:
+        operation.finish(e)
+        raise
+    operation.finish(status=None if converted else operations.STATUS_ERROR,
+                     detail="{} bukietów".format(len(converted)))
+    return 0 if converted else 1
+
+def _m3u2bouquet(args, operation):
+    paths, downloaded = [], []
+    try:
+        for i, source in enumerate(args.source):
+            path = source
+            if "://" in path:
+                ensure_dir(PLUGIN_TMP_PATH)
+                path = os.path.join(PLUGIN_TMP_PATH, "cli_{}.m3u".format(i))
+                downloaded.append(path)
+                with operation.span("download", source):
+                    net.download(source, path, timeout=30)
+            paths.append(path)
+        staging = os.path.join(PLUGIN_TMP_PATH, "cli_m3u")
+        out_dir = ensure_dir(staging) if args.install else ensure_dir(args.out)
+        split_groups = args.split_groups or get_setting("m3u_split_groups")
+        keep = None
+        if args.probe or get_setting("m3u_probe"):
+            with operation.span("probe"):
+                keep, stats = probe.stream_filter(paths)
+            print("Strumienie: sprawdzono {checked}, z pamięci {cached}, niedziałających {dead} ({time:.1f} s)".format(**stats))
+        start = time.time()
+        with operation.span("parse"):
+            converted = m3u.convert_files(paths, out_dir, args.bouquet_id, args.name or args.bouquet_id, split_groups,
+                                          not args.keep_duplicates and get_setting("m3u_dedupe"), keep)
+    finally:
+        for path in downloaded:
+            if os.path.exists(path):
+                os.remove(path)
+    for bouquet_id, name, count in converted:
+        print("{}  {}  ({} kanałów)".format(bouquet_id, name, count))
+    print("Czas konwersji: {:.2f} s".format(time.time() - start))
+    if args.install and converted:
+        try:
+            with operation.span("diff"):
+                changes = delta.diff([(b_id, os.path.join(staging, b_id)) for b_id, name, count in converted], E2_DIR)
+            registry = BouquetRegistry(E2_DIR)
+            added = [b_id for b_id, name, count in converted if registry.add(b_id)]
+            if changes.written or added:
+                with operation.span("backup"):
+                    snapshots.SnapshotStore().take("Przed m3u2bouquet: {}".format(args.bouquet_id))
+            with operation.span("install"):
+                changes.apply(E2_DIR)
+            with operation.span("bouquets"):
+                for path in registry.commit():
+                    changes.add(os.path.basename(path))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        print("Pliki list: {}".format(changes.describe()))
+        _reload(args, changes.reload, operation)
+    return converted
+
+def cmd_snapshot(args):
+    store = snapshots.SnapshotStore()
+    if args.action == "take":
+        print(store.take(args.label or "CLI"))
+    elif args.action == "restore":
+        if not args.id:
+            print("Podaj identyfikator migawki", file=sys.stderr)
+            return 2
+        restored, removed = store.restore(args.id)
+        print("Przywrócono {} plików, usunięto {}".format(restored, removed))
+        _reload(args, delta.RELOAD_FULL if restored or removed else delta.RELOAD_NONE)
+    else:
+        for snap in store.list():
+            print("{}  {}".format(snap["id"], snapshots.describe(snap)))
+    return 0
+
+def cmd_history(args):
+    for record in operations.recent()[:args.last]:
+        when = datetime.datetime.fromtimestamp(record["started"]).strftime("%Y-%m-%d %H:%M:%S")
+        print("{}  {:<9}  {:6.1f} s  {}{}".format(when, record["status"], record["duration"], record["title"],
+                                                   " - {}".format(record["detail"]) if record.get("detail") else ""))
+        for stage, seconds, share in operations.breakdown(record):
+            print("    {:<36} {:6.2f} s  {:3.0f}%".format(operations.STAGE_NAMES.get(stage, stage), seconds, share))
+    return 0
+
+def cmd_packages(args):
+    start = time.time()
+    index = opkg.load_index()
+    if args.softcams:
+        rows = opkg.softcam_candidates(index, limit=args.limit)
+    else:
+        names = index.prefix(args.prefix) if args.prefix else index.search(args.pattern or "")
+        rows = [index.info(n) for n in names if not args.installed or n in index.installed][:args.limit]
+    for r in rows:
+        state = "zainstalowany {}".format(r["installed"]) if r["installed"] else ""
+        if r["upgradable"]:
+            state += ", dostępna aktualizacja"
+        print("{:<48} {:<24} {}".format(r["name"], r["version"], state))
+    print("{} pakietów, {:.3f} s".format(len(rows), time.time() - start), file=sys.stderr)
+    return 0
+
+def cmd_diagnose(args):
+    report = diagnostics.collect(force=args.force)
+    if args.json:
+        print(json.dumps(report, indent=1, sort_keys=True))
+    else:
+        print(diagnostics.format_report(report))
+    return 1 if report["status"] in (diagnostics.STATUS_ERROR, diagnostics.STATUS_TIMEOUT) else 0
+
+def cmd_hosts(args):
+    rows = mirrors.scores().rows()
+    if args.json:
+        print(json.dumps([dict(e, host=h, score=s) for h, s, e in rows], indent=1, sort_keys=True))
+        return 0
+    for host, score, e in rows:
+        latency = "{:.0f} ms".format(e["latency"] * 1000) if e.get("latency") is not None else "-"
+        print("{:<36} ocena {:6.2f} s  odpowiedź {:>8}  błędy {:4.1f}  ({} OK, {} błędów)".format(
+            host, score, latency, e.get("failures", 0), e.get("ok", 0), e.get("errors", 0)))
+    return 0
+
+def cmd_selfupdate(args):
+    update = selfupdate.check()
+    print("Zainstalowana {}, dostępna {}: {}".format(update.current or "?", update.version, update.describe()))
+    if args.check or not update.newer:
+        return 0
+    stats = selfupdate.apply(update)
+    print("Zaktualizowano {} plików w {:.1f} s; nowa wersja działa po restarcie GUI".format(len(stats["files"]), stats["time"]))
+    return 0
+
+def cmd_release_manifest(args):
+    manifest = json.dumps(selfupdate.build_manifest(version=args.version), indent=1, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(manifest + "\n")
+    else:
+        print(manifest)
+    return 0
+
+def cmd_prefetch(args):
+    if not args.status:
+        # Z crona: od razu, bez okna czasowego i warunku bezczynności
+        started = time.time()
+        prefetch.record(prefetch.run_round(), started)
+    state = prefetch.load_state()
+    if not state.get("last_attempt"):
+        print("Pobieranie w tle jeszcze się nie odbyło")
+        return 0
+    report = state.get("report", {})
+    print("Ostatnia runda: {} ({:.1f} s)".format(
+        datetime.datetime.fromtimestamp(state["last_attempt"]).strftime("%Y-%m-%d %H:%M"), report.get("time", 0)))
+    for name, status in sorted(report.get("sources", {}).items()):
+        print("  źródło {}: {}".format(name, status))
+    plugin = report.get("plugin")
+    if plugin:
+        print("  wtyczka: {}{}".format(plugin["version"], " (nowsza, {} plików)".format(plugin["files"]) if plugin.get("newer") else ""))
+    for url in report.get("archives", []):
+        print("  pobrano: {}".format(url))
+    for error in report.get("errors", []):
+        print("  błąd: {}".format(error))
+    return 1 if report.get("errors") else 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="myupdater", description="MyUpdater Enhanced - listy kanałów z wiersza poleceń")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("lists", help="wpisy ze wszystkich źródeł")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_lists)
+
+    p = sub.add_parser("install", help="instalacja wpisów o podanych identyfikatorach")
+    p.add_argument("ids", nargs="+", metavar="id")
+    p.add_argument("--force", action="store_true", help="instaluj także aktualne wersje")
+    p.add_argument("--no-reload", action="store_true")
+    p.set_defaults(func=cmd_install)
+
+    p = sub.add_parser("m3u2bouquet", help="konwersja M3U na bukiet(y) Enigma2")
+    p.add_argument("source", nargs="+", help="plik lub adres URL (kilka - jeden wspólny bukiet)")
+    p.add_argument("bouquet_id", help="np. userbouquet.iptv.tv")
+    p.add_argument("--name")
+    p.add_argument("--split-groups", action="store_true")
+    p.add_argument("--probe", action="store_true", help="pomiń strumienie, które nie odpowiadają")
+    p.add_argument("--keep-duplicates", action="store_true", help="zachowaj powtórzone adresy")
+    p.add_argument("--out", default=".", help="katalog wyjściowy (domyślnie bieżący)")
+    p.add_argument("--install", action="store_true", help="zapisz w {} i dodaj do bouquets.tv".format(E2_DIR))
+    p.add_argument("--no-reload", action="store_true")
+    p.set_defaults(func=cmd_m3u2bouquet)
+
+    p = sub.add_parser("snapshot", help="migawki list kanałów")
+    p.add_argument("action", nargs="?", choices=("list", "take", "restore"), default="list")
+    p.add_argument("id", nargs="?")
+    p.add_argument("--label")
+    p.add_argument("--no-reload", action="store_true")
+    p.set_defaults(func=cmd_snapshot)
+
+    p = sub.add_parser("history", help="ostatnie operacje i czasy ich etapów")
+    p.add_argument("--last", type=int, default=10)
+    p.set_defaults(func=cmd_history)
+
+    p = sub.add_parser("packages", help="wyszukiwanie w listach pakietów opkg")
+    p.add_argument("pattern", nargs="?", help="wyrażenie regularne dla nazwy")
+    p.add_argument("--prefix", help="nazwy zaczynające się od")
+    p.add_argument("--installed", action="store_true", help="tylko zainstalowane")
+    p.add_argument("--softcams", action="store_true", help="ranking pakietów oscam/ncam")
+    p.add_argument("--limit", type=int, default=50)
+    p.set_defaults(func=cmd_packages)
+
+    p = sub.add_parser("diagnose", help="diagnostyka systemu (raport także w {})".format(diagnostics.REPORT_FILE))
+    p.add_argument("--json", action="store_true")
+    p.add_argument("--force", action="store_true", help="pomiń raport z ostatnich diagnostic_ttl sekund")
+    p.set_defaults(func=cmd_diagnose)
+
+    p = sub.add_parser("hosts", help="oceny hostów pobierania (czas odpowiedzi, błędy)")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_hosts)
+
+    p = sub.add_parser("selfupdate", help="aktualizacja wtyczki (tylko zmienione pliki wg update.json)")
+    p.add_argument("--check", action="store_true", help="tylko sprawdź, nic nie pobieraj")
+    p.set_defaults(func=cmd_selfupdate)
+
+    p = sub.add_parser("release-manifest", help="spis plików wydania (update.json) z katalogu wtyczki")
+    p.add_argument("--version", help="domyślnie VER z plugin.py")
+    p.add_argument("--out", help="plik wyjściowy (domyślnie stdout)")
+    p.set_defaults(func=cmd_release_manifest)
+
+    p = sub.add_parser("prefetch", help="pobieranie w tle: źródła, aktualizacja wtyczki, nowe wersje list")
+    p.add_argument("--status", action="store_true", help="tylko wynik ostatniej rundy")
+    p.set_defaults(func=cmd_prefetch)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not getattr(args, "func", None):
+        parser.print_help()
+        return 2
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        print("Błąd: {}".format(e), file=sys.stderr)
+        return 1
+    finally:
+        flush_log()
+
+if __name__ == "__main__":
+    sys.exit(main())
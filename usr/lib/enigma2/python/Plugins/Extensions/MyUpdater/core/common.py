@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – wspólne ścieżki, ustawienia i log
+#
+#  Log trzymany jest w pamięci i zapisywany partiami (co kilkadziesiąt
+#  wierszy, po kilku sekundach lub od razu dla błędów) do pliku w katalogu
+#  danych wtyczki, z rotacją wg rozmiaru - historia przetrwa restart tunera.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, sys, json, atexit, datetime
+from threading import Lock, Timer
+
+# Ścieżki można nadpisać zmiennymi środowiskowymi (CLI i benchmarki poza tunerem)
+E2_DIR = os.environ.get("MYUPDATER_E2_DIR", "/etc/enigma2")
+PLUGIN_TMP_PATH = os.environ.get("MYUPDATER_TMP_PATH", "/tmp/MyUpdater/")
+DATA_PATH = os.environ.get("MYUPDATER_DATA_PATH", os.path.join(E2_DIR, "MyUpdater/"))
+OPKG_DIR = os.environ.get("MYUPDATER_OPKG_DIR", "/var/lib/opkg")
+SETTINGS_FILE = os.path.join(DATA_PATH, "settings.json")
+LOG_FILE = os.path.join(DATA_PATH, "MyUpdater.log")
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARN", ERROR: "ERROR"}
+
+DEFAULT_SETTINGS = {
+    # Limit czasu (s) dla pojedynczego źródła list
+    "source_timeout": 20,
+    # Dodatkowe źródła: [{"name": ..., "url": ..., "type": "manifest"|"s4a", "timeout": 20}]
+    "extra_sources": [],
+    # Czas (s), przez który dokument z pamięci podręcznej uznawany jest za świeży
+    "cache_ttl": 3600,
+    # Limit rozmiaru pamięci podręcznej dokumentów (KB)
+    "cache_max_kb": 2048,
+    # Podział bukietu M3U na osobne bukiety wg group-title (gdy manifest nie określa split_groups)
+    "m3u_split_groups": False,
+    # Bukiety M3U: pomijanie powtórzonych adresów, sprawdzanie strumieni przed zapisem
+    # (gdy manifest nie określa probe), limit czasu (s) i liczba jednoczesnych sprawdzeń
+    # (zadań wspólnej puli, więc najwyżej worker_pool_size), czas (s) ważności wyniku sprawdzenia
+    "m3u_dedupe": True,
+    "m3u_probe": False,
+    "m3u_probe_timeout": 3,
+    "m3u_probe_workers": 4,
+    "m3u_probe_ttl": 12 * 3600,
+    # Usuwanie picon zainstalowanych wcześniej, których nie ma już w paczce
+    "picon_remove_orphans": False,
+    # Dopasowanie picon do skórki po synchronizacji (wymaga Pillow): włączenie, rozmiar "220x132"
+    # ("" - wykryty z aktywnej skórki) i liczba wątków (0 - wszystkie rdzenie)
+    "picon_optimize": True,
+    "picon_size": "",
+    "picon_workers": 0,
+    # Retencja migawek list: maksymalna liczba i łączny rozmiar danych (KB)
+    "snapshot_keep": 10,
+    "snapshot_max_kb": 20480,
+    # Liczba jednoczesnych pobrań w kolejce instalacji
+    "queue_max_downloads": 3,
+    # Limit pamięci podręcznej pobranych archiwów list (KB), klucz url#wersja
+    "archive_cache_max_kb": 16384,
+    # Liczba wątków wspólnej puli zadań w tle (sprawdzenia diagnostyki mają własne wątki)
+    "worker_pool_size": 4,
+    # HTTP: limit czasu nawiązania połączenia (s), liczba ponowień błędów przejściowych
+    # i odstęp (s) przed pierwszym ponowieniem, podwajany przy kolejnych
+    "http_connect_timeout": 10,
+    "http_retries": 2,
+    "http_retry_backoff": 1.0,
+    # Lustra: [{"prefix": "https://raw.githubusercontent.com/", "url": "http://192.168.1.2/mirror/"}],
+    # wbudowane lustro jsDelivr dla plików z GitHuba (może być kilka godzin za repozytorium)
+    # i czas (s), po którym startuje zapytanie do kolejnego lustra (0 - wszystkie naraz)
+    "mirrors": [],
+    "mirror_cdn": True,
+    "mirror_race_delay": 0.5,
+    # Pobieranie archiwów: maks. liczba równoległych segmentów (serwery z Range)
+    # i liczba wznowień segmentu po zerwanym połączeniu bez postępu
+    "download_segments": 4,
+    "download_retries": 3,
+    # Pobieranie w tle (źródła, aktualizacja wtyczki, nowe wersje zainstalowanych list):
+    # włączenie, odstęp między rundami (s), okno czasowe "HH:MM-HH:MM" ("" - cała doba),
+    # bezczynność pilota (min) wystarczająca poza czuwaniem i limit przepustowości (KB/s)
+    "prefetch_enabled": False,
+    "prefetch_interval": 6 * 3600,
+    "prefetch_window": "01:00-06:00",
+    "prefetch_idle_minutes": 20,
+    "prefetch_rate_kb": 256,
+    # Diagnostyka: limit czasu (s) pojedynczego sprawdzenia, liczony od jego startu we własnym
+    # wątku (niezależnie od zajętości wspólnej puli), i czas ważności raportu (s)
+    "diagnostic_timeout": 8,
+    "diagnostic_ttl": 120,
+    # Log: najniższy zapisywany poziom (DEBUG/INFO/WARN/ERROR), rozmiar pliku (KB) i liczba starszych plików
+    "log_level": "INFO",
+    "log_max_kb": 256,
+    "log_backups": 2,
+}
+
+class BufferedLog(object):
+    """Log buforowany w pamięci; zapis partiami, rotacja pliku po przekroczeniu max_bytes"""
+
+    FLUSH_LINES = 50
+    FLUSH_DELAY = 5
+
+    def __init__(self, path, level=INFO, max_bytes=256 * 1024, backups=2):
+        self.path = path
+        self.level = level
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lines = []
+        self.lock = Lock()
+        self.timer = None
+        self.failed = False
+
+    def write(self, msg, level=INFO):
+        if level < self.level:
+            return
+        if isinstance(msg, bytes):  # Python 2: literały str w UTF-8
+            msg = msg.decode("utf-8", "replace")
+        line = u"{} {:<5} {}\n".format(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                      LEVEL_NAMES.get(level, level), msg)
+        with self.lock:
+            self.lines.append(line)
+            pending = len(self.lines)
+        if level >= WARNING or pending >= self.FLUSH_LINES:
+            self.flush()
+        elif self.timer is None:
+            self.timer = Timer(self.FLUSH_DELAY, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            lines, self.lines = self.lines, []
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not lines:
+                return
+            try:
+                ensure_dir(os.path.dirname(self.path))
+                if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                    self._rotate()
+                with io.open(self.path, "a", encoding="utf-8") as f:
+                    f.write(u"".join(lines))
+                self.failed = False
+            except (IOError, OSError) as e:
+                if not self.failed:  # jeden komunikat na serię błędów, trafia do logu enigma2
+                    print("[MyUpdater] Nie można zapisać logu {}: {}".format(self.path, e), file=sys.stderr)
+                self.failed = True
+
+    def close(self):
+        """Zapis bufora i zakończenie wątku timera (koniec procesu)"""
+        timer = self.timer
+        self.flush()
+        if timer is not None:
+            timer.join(1)
+
+    def _rotate(self):
+        """MyUpdater.log -> MyUpdater.log.1 -> ... -> MyUpdater.log.<backups>"""
+        for i in range(self.backups - 1, 0, -1):
+            older = "{}.{}".format(self.path, i)
+            if os.path.exists(older):
+                os.rename(older, "{}.{}".format(self.path, i + 1))
+        if self.backups:
+            os.rename(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+
+_log = None
+
+def _logger():
+    global _log
+    if _log is None:
+        settings = load_settings()
+        levels = dict((v, k) for k, v in LEVEL_NAMES.items())
+        _log = BufferedLog(LOG_FILE, levels.get(str(settings.get("log_level")).upper(), INFO),
+                           settings.get("log_max_kb", 256) * 1024, settings.get("log_backups", 2))
+        # zapis reszty bufora przed końcem procesu (CLI), zanim wątek timera trafi na zamykany interpreter
+        atexit.register(_log.close)
+    return _log
+
+def log(msg, level=INFO):
+    _logger().write(msg, level)
+
+def flush_log():
+    """Zapisuje zbuforowane wiersze (np. przy zamknięciu ekranu wtyczki)"""
+    if _log is not None:
+        _log.flush()
+
+def ensure_dir(path):
+    if not os.path.exists(path):
+        os.makedirs(path)
+    return path
+
+def load_settings():
+    """Ustawienia domyślne nadpisane zawartością settings.json"""
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with io.open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f))
+    except (IOError, OSError):
+        pass
+    except ValueError as e:
+        print("[MyUpdater] Błędny plik ustawień {}: {}".format(SETTINGS_FILE, e), file=sys.stderr)
+    return settings
+
+def get_setting(key):
+    return load_settings().get(key, DEFAULT_SETTINGS.get(key))
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – różnice plików list i najtańsze wystarczające przeładowanie
+#
+#  Nowe pliki list porównywane są z zainstalowanymi przed zapisem: pliki
+#  identyczne nie są przepisywane, dla bukietów liczone są dodane i usunięte
+#  wiersze. Z listy faktycznie zapisanych plików wynika przeładowanie:
+#  żadne, tylko bukiety (eDVBDB.reloadBouquets) albo pełne z lamedb -
+#  codzienne odświeżenie bez zmian nie zatrzymuje przełączania kanałów.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, shutil, hashlib
+from collections import Counter
+
+from .common import log, E2_DIR
+
+RELOAD_NONE = 0
+RELOAD_BOUQUETS = 1
+RELOAD_FULL = 2
+
+RELOAD_NAMES = {
+    RELOAD_NONE: "bez przeładowania",
+    RELOAD_BOUQUETS: "tylko bukiety",
+    RELOAD_FULL: "lamedb i bukiety",
+}
+
+ADDED = "added"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+def reload_for(name):
+    """Przeładowanie potrzebne po zmianie pliku o tej nazwie"""
+    if name.startswith("lamedb"):
+        return RELOAD_FULL
+    if name.endswith((".tv", ".radio")):
+        return RELOAD_BOUQUETS
+    return RELOAD_NONE
+
+def same_content(a, b, chunk=64 * 1024):
+    if os.path.getsize(a) != os.path.getsize(b):
+        return False
+    with open(a, "rb") as fa:
+        with open(b, "rb") as fb:
+            while True:
+                da, db = fa.read(chunk), fb.read(chunk)
+                if da != db:
+                    return False
+                if not da:
+                    return True
+
+def _lines(path):
+    with io.open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return Counter(l.rstrip("\r\n") for l in f)
+
+def line_diff(old_path, new_path):
+    """(dodane, usunięte) wiersze bukietu, bez względu na kolejność"""
+    old, new = _lines(old_path), _lines(new_path)
+    return sum((new - old).values()), sum((old - new).values())
+
+class FileChange(object):
+    def __init__(self, name, source, state, added=0, removed=0):
+        self.name = name
+        self.source = source
+        self.state = state
+        self.added = added
+        self.removed = removed
+
+    def describe(self):
+        if self.state == ADDED:
+            return "{} (nowy)".format(self.name)
+        if self.added or self.removed:
+            return "{} (+{}/-{})".format(self.name, self.added, self.removed)
+        return self.name
+
+class ChangeSet(object):
+    """Porównanie plików [(nazwa, ścieżka)] z katalogiem Enigma2; apply() zapisuje tylko zmienione"""
+
+    def __init__(self, changes=None):
+        self.changes = changes or []
+
+    @property
+    def written(self):
+        return [c for c in self.changes if c.state != UNCHANGED]
+
+    @property
+    def unchanged(self):
+        return [c for c in self.changes if c.state == UNCHANGED]
+
+    @property
+    def reload(self):
+        return max([reload_for(c.name) for c in self.written] or [RELOAD_NONE])
+
+    def add(self, name, state=CHANGED):
+        """Zmiana zapisana poza ChangeSet (np. bouquets.tv przez rejestr bukietów)"""
+        self.changes.append(FileChange(name, None, state))
+
+    def merge(self, other):
+        self.changes.extend(other.changes)
+        return self
+
+    def apply(self, e2_dir=E2_DIR, progress=None):
+        """Przenosi zmienione pliki do katalogu Enigma2, niezmienione kopie robocze usuwa"""
+        written = self.written
+        for i, change in enumerate(written):
+            shutil.move(change.source, os.path.join(e2_dir, change.name))
+            if progress:
+                progress.update(i + 1, len(written))
+        for change in self.unchanged:
+            if change.source and os.path.exists(change.source):
+                os.remove(change.source)
+        log("Pliki list: {}".format(self.describe()))
+        return self
+
+    def describe(self):
+        written = self.written
+        txt = "zapisano {}".format(len(written))
+        if written:
+            txt += " ({})".format(", ".join(c.describe() for c in written[:5]) + (", ..." if len(written) > 5 else ""))
+        return txt + ", bez zmian {}".format(len(self.unchanged))
+
+def fingerprint(path):
+    """SHA-1 pliku albo None, gdy go nie ma"""
+    if not os.path.exists(path):
+        return None
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+class NetChanges(object):
+    """Zmiany kilku kolejnych zapisów (np. kolejki) względem stanu sprzed pierwszego z nich:
+    plik przepisany, a potem przywrócony do pierwotnej treści, nie wymaga przeładowania"""
+
+    def __init__(self, e2_dir=E2_DIR):
+        self.e2_dir = e2_dir
+        self.original = {}
+        self.steps = ChangeSet()
+
+    def before_write(self, names):
+        for name in names:
+            if name not in self.original:
+                self.original[name] = fingerprint(os.path.join(self.e2_dir, name))
+
+    def record(self, changes):
+        self.steps.merge(changes)
+
+    def result(self):
+        """ChangeSet z jednym wpisem na plik: zmieniony, jeśli treść końcowa różni się od pierwotnej"""
+        changes = []
+        for name in sorted(set(c.name for c in self.steps.written)):
+            original = self.original.get(name)
+            if original is not None and fingerprint(os.path.join(self.e2_dir, name)) == original:
+                changes.append(FileChange(name, None, UNCHANGED))
+            else:
+                changes.append(FileChange(name, None, ADDED if original is None and name in self.original else CHANGED))
+        return ChangeSet(changes)
+
+def diff(files, e2_dir=E2_DIR):
+    """ChangeSet dla plików [(nazwa, ścieżka kopii roboczej)]; nic nie zapisuje"""
+    changes = []
+    for name, path in files:
+        target = os.path.join(e2_dir, name)
+        if not os.path.exists(target):
+            changes.append(FileChange(name, path, ADDED))
+        elif same_content(path, target):
+            changes.append(FileChange(name, path, UNCHANGED))
+        elif reload_for(name) == RELOAD_BOUQUETS:
+            added, removed = line_diff(target, path)
+            changes.append(FileChange(name, path, CHANGED, added, removed))
+        else:
+            changes.append(FileChange(name, path, CHANGED))
+    return ChangeSet(changes)
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – diagnostyka systemu w procesie (bez `opkg list`, `df`, `ping`)
+#
+#  Każde sprawdzenie (system, pamięć, miejsce, osiągalność hostów źródeł,
+#  softcamy, spójność bukietów z lamedb) jest osobnym zadaniem własnej,
+#  krótkotrwałej puli (wątek na sprawdzenie) z limitem czasu liczonym od
+#  startu sprawdzenia - zawieszony DNS nie blokuje raportu ani wątków
+#  wspólnej puli, a zajęta wspólna pula nie zamienia sprawdzeń w timeout.
+#  Wynik to raport JSON zapisywany w katalogu tymczasowym i zwracany
+#  z pamięci przez diagnostic_ttl sekund (GUI i CLI korzystają z tego samego).
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, json, time, socket, platform, datetime
+
+try:
+    from urlparse import urlparse
+except ImportError:
+    from urllib.parse import urlparse
+
+from . import net, tasks, opkg, lamedb, sources, system, mirrors
+from .bouquets import BouquetRegistry, KINDS as BOUQUET_KINDS
+from .common import log, ensure_dir, get_setting, E2_DIR, PLUGIN_TMP_PATH, WARNING, ERROR
+
+REPORT_FILE = os.path.join(PLUGIN_TMP_PATH, "diagnostic.json")
+
+STATUS_OK = "ok"
+STATUS_WARNING = "warning"
+STATUS_ERROR = "error"
+STATUS_TIMEOUT = "timeout"
+
+SEVERITY = {STATUS_OK: 0, STATUS_WARNING: 1, STATUS_TIMEOUT: 2, STATUS_ERROR: 3}
+STATUS_MARKS = {STATUS_OK: u"OK", STATUS_WARNING: u"UWAGA", STATUS_ERROR: u"BŁĄD", STATUS_TIMEOUT: u"CZAS"}
+
+RELEASE_FILES = (("/etc/openatv-release", "OpenATV"), ("/etc/openpli-release", "OpenPLI"),
+                 ("/etc/vti-version-info", "ViX"))
+IMAGE_VERSION_FILE = "/etc/image-version"
+MEMINFO_FILE = "/proc/meminfo"
+
+# Minimalne wolne miejsce (MB): flash jak w diagnostic.sh, /tmp na pobrane archiwa list
+STORAGE = (("flash", "/", 50), ("tmp", PLUGIN_TMP_PATH, 20), ("enigma2", E2_DIR, 10))
+MEMORY_MIN_MB = 20
+# Odpowiedź wolniejsza niż tyle sekund oznaczana jest ostrzeżeniem
+HTTP_SLOW = 3.0
+
+def result(status, message, details=(), **data):
+    return {"status": status, "message": message, "details": list(details), "data": data}
+
+def _mb(size):
+    return size / 1048576.0
+
+# --- sprawdzenia ---
+
+def check_system():
+    """Dystrybucja, wersja obrazu i enigma2"""
+    distro = system.detect_distribution()
+    image, details = {}, []
+    for path, name in RELEASE_FILES:
+        if os.path.exists(path):
+            with io.open(path, "r", encoding="utf-8", errors="ignore") as f:
+                image = {"name": name, "release": f.readline().strip()}
+            break
+    if os.path.exists(IMAGE_VERSION_FILE):
+        with io.open(IMAGE_VERSION_FILE, "r", encoding="utf-8", errors="ignore") as f:
+            fields = dict(l.strip().split("=", 1) for l in f if "=" in l)
+        image.setdefault("name", fields.get("distro", ""))
+        image.setdefault("release", fields.get("imageversion", ""))
+        if fields.get("imagebuild"):
+            image["build"] = fields["imagebuild"]
+    enigma2 = opkg.load_index().installed.get("enigma2")
+    if image:
+        details.append(u"Obraz: {} {}{}".format(image.get("name", ""), image.get("release", ""),
+                                               u" (build {})".format(image["build"]) if image.get("build") else u""))
+    details.append(u"Enigma2: {}".format(enigma2[0] if enigma2 else u"nieznana"))
+    details.append(u"Python {}, jądro {}".format(platform.python_version(), platform.release()))
+    status = STATUS_WARNING if distro == "unknown" else STATUS_OK
+    message = u"nieznany system (tryb uniwersalny)" if distro == "unknown" else distro
+    return result(status, message, details, distro=distro, image=image,
+                  enigma2=enigma2[0] if enigma2 else None, python=platform.python_version())
+
+def _existing(path):
+    while path and not os.path.exists(path):
+        path = os.path.dirname(path.rstrip("/"))
+    return path or "/"
+
+def check_storage():
+    """Wolne miejsce na flashu, w /tmp i w katalogu list"""
+    low, details, data = [], [], {}
+    for name, path, minimum in STORAGE:
+        st = os.statvfs(_existing(path))
+        free, total = st.f_bavail * st.f_frsize, st.f_blocks * st.f_frsize
+        data[name] = {"path": path, "free": free, "total": total}
+        if _mb(free) < minimum:
+            low.append(name)
+        details.append(u"{} ({}): wolne {:.1f} MB z {:.1f} MB{}".format(
+            name, path, _mb(free), _mb(total), u" - mało miejsca!" if name in low else u""))
+    if low:
+        return result(STATUS_WARNING, u"mało miejsca: {}".format(u", ".join(low)), details, **data)
+    return result(STATUS_OK, u"OK", details, **data)
+
+def check_memory():
+    """Pamięć RAM z /proc/meminfo"""
+    info = {}
+    with io.open(MEMINFO_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            key, sep, value = line.partition(":")
+            if sep and value.split():
+                info[key] = int(value.split()[0]) * 1024
+    available = info.get("MemAvailable")
+    if available is None:  # starsze jądra
+        available = info.get("MemFree", 0) + info.get("Buffers", 0) + info.get("Cached", 0)
+    total = info.get("MemTotal", 0)
+    status = STATUS_WARNING if _mb(available) < MEMORY_MIN_MB else STATUS_OK
+    return result(status, u"dostępne {:.0f} MB z {:.0f} MB".format(_mb(available), _mb(total)),
+                  [u"Swap: {:.0f} MB wolne".format(_mb(info["SwapFree"]))] if info.get("SwapTotal") else [],
+                  total=total, available=available)
+
+def check_host(host, url, timeout):
+    """Rozwiązanie nazwy i zapytanie HTTP do źródła list"""
+    start = time.time()
+    try:
+        addresses = sorted(set(a[4][0] for a in socket.getaddrinfo(host, None, 0, socket.SOCK_STREAM)))
+    except socket.error as e:
+        return result(STATUS_ERROR, u"DNS: {}".format(e), host=host, url=url)
+    dns = time.time() - start
+    details = [u"DNS {:.0f} ms: {}".format(dns * 1000, u", ".join(addresses[:3]))]
+    start = time.time()
+    try:
+        resp = net.open_url(url, timeout=timeout, use_mirrors=False)
+        code = resp.getcode()
+        resp.close()
+    except net.HTTPError as e:
+        code = e.code
+    except Exception as e:
+        return result(STATUS_ERROR, u"HTTP: {}".format(e), details, host=host, url=url, addresses=addresses, dns=dns)
+    elapsed = time.time() - start
+    details.append(u"HTTP {} w {:.0f} ms: {}".format(code, elapsed * 1000, url))
+    details.append(u"Ocena hosta (pobrania): {:.2f} s".format(mirrors.scores().score(mirrors.host_of(url))))
+    status = STATUS_WARNING if code >= 400 or elapsed > HTTP_SLOW else STATUS_OK
+    return result(status, u"HTTP {} ({:.1f} s)".format(code, dns + elapsed), details,
+                  host=host, url=url, addresses=addresses, dns=dns, http_status=code, http_time=elapsed)
+
+def check_softcams():
+    """Zainstalowane pakiety softcamów i pliki w /usr/bin"""
+    index = opkg.load_index()
+    installed = opkg.installed_softcams(index)
+    binaries = sorted(n for n in (os.listdir("/usr/bin") if os.path.isdir("/usr/bin") else [])
+                      if n.startswith(("oscam", "ncam")))
+    details = [u"{} {}".format(n, v) for n, v in installed]
+    if binaries:
+        details.append(u"Pliki: {}".format(u", ".join(binaries)))
+    available = [c["name"] for c in opkg.softcam_candidates(index, limit=3)]
+    if not installed and available:
+        details.append(u"Dostępne w feed: {}".format(u", ".join(available)))
+    message = u", ".join(n for n, v in installed) if installed else u"brak zainstalowanych softcamów"
+    return result(STATUS_OK, message, details, installed=installed, binaries=binaries, available=available)
+
+def check_channels(e2_dir=E2_DIR):
+    """Czy bukiety z bouquets.tv/.radio istnieją i ile ich kanałów DVB jest w lamedb"""
+    path = lamedb.lamedb_path(e2_dir)
+    if path is None:
+        return result(STATUS_ERROR, u"brak pliku lamedb w {}".format(e2_dir))
+    index = lamedb.load_index(path)
+    registry = BouquetRegistry(e2_dir)
+    details = [u"{}: {} usług (v{})".format(os.path.basename(path), len(index), index.version)]
+    missing_files, counts = [], {"bouquets": 0, "total": 0, "resolved": 0, "partial": 0, "streams": 0}
+    for ext, (name, name_line, service_type) in sorted(BOUQUET_KINDS.items()):
+        if not os.path.exists(os.path.join(e2_dir, name)):
+            if ext == ".tv":
+                missing_files.append(name)
+            continue
+        for bouquet_id in registry.ids(ext):
+            bouquet = os.path.join(e2_dir, bouquet_id)
+            if not os.path.exists(bouquet):
+                missing_files.append(bouquet_id)
+                continue
+            with io.open(bouquet, "r", encoding="utf-8", errors="ignore") as f:
+                check = lamedb.check_bouquet(f, index)
+            counts["bouquets"] += 1
+            for key in ("total", "resolved", "partial", "streams"):
+                counts[key] += getattr(check, key)
+    unresolved = counts["total"] - counts["resolved"] - counts["partial"]
+    details.append(u"Bukiety: {}, kanały DVB: {}, w lamedb: {}, strumienie IPTV: {}".format(
+        counts["bouquets"], counts["total"], counts["resolved"] + counts["partial"], counts["streams"]))
+    if missing_files:
+        details.append(u"Brakujące pliki: {}".format(u", ".join(missing_files[:10])))
+    if unresolved:
+        details.append(u"Kanały bez wpisu w lamedb ('N/A'): {}".format(unresolved))
+    status = STATUS_WARNING if missing_files or unresolved else STATUS_OK
+    message = u"{} bukietów, {} brakujących plików, {} kanałów bez lamedb".format(
+        counts["bouquets"], len(missing_files), unresolved) if status != STATUS_OK else u"{} bukietów spójnych z lamedb".format(counts["bouquets"])
+    return result(status, message, details, lamedb=path, missing_files=missing_files, unresolved=unresolved, **counts)
+
+# --- zbieranie raportu ---
+
+class Check(object):
+    """Sprawdzenie uruchamiane w puli: func(*args) -> result(...)"""
+
+    def __init__(self, id, title, func, args=(), timeout=None):
+        self.id = id
+        self.title = title
+        self.func = func
+        self.args = args
+        self.timeout = timeout or get_setting("diagnostic_timeout")
+
+def default_checks():
+    timeout = get_setting("diagnostic_timeout")
+    checks = [Check("system", u"System", check_system),
+              Check("storage", u"Miejsce", check_storage),
+              Check("memory", u"Pamięć RAM", check_memory)]
+    hosts = []
+    for source in sources.configured_sources():
+        host = urlparse(source.url).hostname
+        if host and host not in hosts:
+            hosts.append(host)
+            checks.append(Check("host:" + host, u"Źródło {} ({})".format(source.name, host), check_host,
+                                (host, source.url, min(timeout, source.timeout))))
+    checks += [Check("softcams", u"Softcamy", check_softcams),
+               Check("channels", u"Bukiety i lamedb", check_channels)]
+    return checks
+
+def _run_check(check, started):
+    start = started[check] = time.time()
+    try:
+        res = check.func(*check.args)
+    except Exception as e:
+        res = result(STATUS_ERROR, u"{}".format(e))
+    res["duration"] = round(time.time() - start, 3)
+    return res
+
+def run(checks=None, pool=None):
+    """Uruchamia sprawdzenia równolegle; niezakończone w swoim limicie czasu (od startu sprawdzenia)
+    oznaczane są jako timeout. Domyślnie własna pula z wątkiem na każde sprawdzenie."""
+    checks = default_checks() if checks is None else checks
+    pool = pool or tasks.WorkerPool(len(checks))
+    start = time.time()
+    started = {}
+    submitted = [(c, pool.submit(_run_check, (c, started))) for c in checks]
+    report = {"created": start, "checks": []}
+    for check, task in submitted:
+        # bez Task.wait(): zawieszone sprawdzenie nie może zostać przejęte przez bieżący wątek;
+        # czekanie w kolejce puli nie wlicza się do limitu (o ile sprawdzenie ruszy w jego czasie)
+        while not task.done:
+            left = started.get(check, start) + check.timeout - time.time()
+            if left <= 0:
+                break
+            task.finished.wait(left if check in started else min(left, 0.1))
+        if task.done and task.error is None:
+            res = task.result
+        else:
+            pool.release(task)
+            res = result(STATUS_TIMEOUT, u"brak wyniku po {} s".format(check.timeout))
+            res["duration"] = check.timeout
+        res.update(id=check.id, title=check.title)
+        report["checks"].append(res)
+        if res["status"] != STATUS_OK:
+            log(u"Diagnostyka {}: {} - {}".format(check.id, res["status"], res["message"]),
+                ERROR if res["status"] == STATUS_ERROR else WARNING)
+    report["duration"] = round(time.time() - start, 3)
+    report["counts"] = dict((s, len([c for c in report["checks"] if c["status"] == s])) for s in SEVERITY)
+    report["status"] = max((c["status"] for c in report["checks"]), key=SEVERITY.get) if checks else STATUS_OK
+    log(u"Diagnostyka: {} sprawdzeń w {:.2f} s, stan {}".format(len(checks), report["duration"], report["status"]))
+    return report
+
+_report = None
+
+def cached_report(path=REPORT_FILE):
+    """Ostatni raport (z pamięci lub pliku) albo None"""
+    if _report is not None:
+        return _report
+    try:
+        with io.open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+def _save(report, path=REPORT_FILE):
+    try:
+        ensure_dir(os.path.dirname(path))
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(report, indent=1, sort_keys=True).encode("utf-8"))
+        os.rename(tmp, path)
+    except (IOError, OSError) as e:
+        log("Nie można zapisać raportu diagnostyki: {}".format(e), WARNING)
+
+def collect(force=False, checks=None, pool=None):
+    """Raport diagnostyki; świeży raport (młodszy niż diagnostic_ttl) zwracany jest bez ponownych sprawdzeń"""
+    global _report
+    if not force and checks is None:
+        report = cached_report()
+        if report is not None and 0 <= time.time() - report["created"] < get_setting("diagnostic_ttl"):
+            return report
+    report = run(checks, pool)
+    if checks is None:
+        _report = report
+        _save(report)
+    return report
+
+def format_report(report, now=None):
+    """Raport jako tekst dla ekranu i CLI"""
+    age = (now or time.time()) - report["created"]
+    when = datetime.datetime.fromtimestamp(report["created"]).strftime("%Y-%m-%d %H:%M:%S")
+    lines = [u"Data: {} ({:.1f} s){}".format(when, report["duration"],
+                                           u", sprzed {:.0f} s".format(age) if age >= 5 else u"")]
+    for c in report["checks"]:
+        lines.append(u"")
+        lines.append(u"[{}] {}: {}".format(STATUS_MARKS.get(c["status"], c["status"]), c["title"], c["message"]))
+        lines += [u"    " + d for d in c["details"]]
+    counts = report["counts"]
+    lines.append(u"")
+    lines.append(u"Podsumowanie: OK {}, ostrzeżenia {}, błędy {}".format(
+        counts.get(STATUS_OK, 0), counts.get(STATUS_WARNING, 0), counts.get(STATUS_ERROR, 0) + counts.get(STATUS_TIMEOUT, 0)))
+    return u"\n".join(lines)
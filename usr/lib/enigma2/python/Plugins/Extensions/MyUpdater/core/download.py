@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – wznawiane, wielosegmentowe pobieranie dużych plików
+#
+#  Plik pobierany jest do dest.part, a obok (dest.part.json) zapisywany jest
+#  stan: lustro, które wygrało wyścig, ETag/Last-Modified, rozmiar i postęp
+#  każdego segmentu. Zerwane połączenie nie zaczyna pobierania od zera -
+#  brakujące bajty dociągane są zapytaniem Range z If-Range, także przy
+#  kolejnym uruchomieniu. Gdy serwer obsługuje Range, duży plik pobierany
+#  jest kilkoma równoległymi segmentami - zadaniami wspólnej puli (tasks);
+#  segment, którego zajęta pula nie zdążyła rozpocząć, pobiera sam wątek
+#  wywołujący, więc liczba wątków nie rośnie z liczbą pobrań. Przed
+#  oddaniem pliku sprawdzany jest rozmiar i - jeśli podaje go manifest -
+#  SHA-256; plik niezgodny jest usuwany i nie trafia do instalacji.
+#  Pobieranie w tle może mieć limit przepustowości i warunek przerwania
+#  (Throttle).
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, re, json, time, socket, hashlib
+from threading import Lock
+
+try:
+    import httplib as http_client
+except ImportError:
+    import http.client as http_client
+
+from . import net, tasks
+from .common import log, ensure_dir, get_setting, WARNING
+
+CHUNK = net.CHUNK
+# Najmniejszy segment (B) - mniejszych plików nie opłaca się dzielić
+SEGMENT_MIN = 1024 * 1024
+# Co tyle sekund zapisywany jest stan i raportowany postęp
+REPORT_INTERVAL = 0.5
+
+_CONTENT_RANGE_RE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+)')
+
+class IntegrityError(IOError):
+    """Pobrany plik ma inny rozmiar lub skrót niż oczekiwany"""
+
+class FileChanged(IOError):
+    """Plik na serwerze zmienił się od początku pobierania - wznowienie niemożliwe"""
+
+class Cancelled(Exception):
+    """Pobieranie przerwane warunkiem Throttle.stop; plik .part zostaje do wznowienia"""
+
+class Throttle(object):
+    """Limit przepustowości (B/s, None - bez limitu) wspólny dla wszystkich segmentów pobrania;
+    stop() zwracające True przerywa pobieranie (Cancelled) przy najbliższym fragmencie"""
+
+    def __init__(self, rate=None, stop=None, clock=time.time, sleep=time.sleep):
+        self.rate = float(rate) if rate else None
+        self.stop = stop
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = Lock()
+        self.next = None
+
+    def consume(self, n):
+        if self.stop and self.stop():
+            raise Cancelled("Pobieranie przerwane")
+        if not self.rate:
+            return
+        with self.lock:
+            now = self.clock()
+            start = now if self.next is None else max(self.next, now)
+            self.next = start + n / self.rate
+        if start > now:
+            self.sleep(start - now)
+
+_dest_locks = {}
+_dest_locks_lock = Lock()
+
+def _dest_lock(dest):
+    """Jedno pobranie naraz do danego pliku (np. pobieranie w tle i instalacja tej samej wersji)"""
+    with _dest_locks_lock:
+        return _dest_locks.setdefault(os.path.abspath(dest), Lock())
+
+def _content_range(resp):
+    """(początek, koniec, rozmiar) z nagłówka Content-Range albo None"""
+    m = _CONTENT_RANGE_RE.match(resp.info().get("Content-Range") or "")
+    return tuple(int(x) for x in m.groups()) if m else None
+
+def _validator(resp):
+    """Wartość If-Range: silny ETag albo Last-Modified (słaby ETag nie wystarcza)"""
+    etag = resp.info().get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return resp.info().get("Last-Modified")
+
+def _segments(total, count):
+    """Podział [0, total) na segmenty [początek, koniec, następny bajt do pobrania]"""
+    if total <= 0:
+        return []
+    count = max(1, min(count, total // SEGMENT_MIN))
+    step = -(-total // count)
+    return [[start, min(start + step, total) - 1, start] for start in range(0, total, step)]
+
+class _Transfer(object):
+    """Pobieranie jednego pliku: stan w dest.part.json, segmenty jako zadania puli"""
+
+    def __init__(self, url, dest, progress, timeout, use_mirrors, segments, throttle):
+        self.url = url
+        self.part = dest + ".part"
+        self.state_path = self.part + ".json"
+        self.progress = progress
+        self.timeout = timeout
+        self.use_mirrors = use_mirrors
+        self.segments = segments or get_setting("download_segments")
+        self.throttle = throttle
+        self.retries = get_setting("download_retries")
+        self.backoff = get_setting("http_retry_backoff")
+        self.lock = Lock()
+        self.state = None
+        self.error = None
+
+    def discard(self):
+        for path in (self.part, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def load(self):
+        """Zapisany stan tego samego adresu, jeśli plik .part do niego pasuje"""
+        try:
+            with io.open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("url") == self.url and os.path.getsize(self.part) == state["size"]:
+                self.state = state
+                return True
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+        self.discard()
+        return False
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.state, sort_keys=True).encode("utf-8")
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.rename(tmp, self.state_path)
+
+    def done(self):
+        with self.lock:
+            return sum(seg[2] - seg[0] for seg in self.state["segments"])
+
+    def start(self):
+        """Pierwsze zapytanie (z wyścigiem luster); zwraca odpowiedź dla pierwszego segmentu
+        albo None, gdy serwer nie obsługuje Range i plik został już pobrany w całości"""
+        try:
+            resp = net.open_url(self.url, {"Range": "bytes=0-"}, self.timeout, use_mirrors=self.use_mirrors)
+        except net.HTTPError as e:
+            if e.code != 416:
+                raise
+            # Pusty plik - zakres od bajtu 0 jest już poza nim
+            resp = net.open_url(self.url, timeout=self.timeout, use_mirrors=self.use_mirrors)
+        span = _content_range(resp) if resp.getcode() == 206 else None
+        if span is None or span[0] != 0 or span[2] <= 0:
+            try:
+                self._single(resp)
+            finally:
+                resp.close()
+            return None
+        total = span[2]
+        segments = _segments(total, self.segments)
+        self.state = {"url": self.url, "source": resp.url, "validator": _validator(resp),
+                      "size": total, "segments": segments}
+        with open(self.part, "wb") as f:
+            f.truncate(total)
+        self.save()
+        if len(segments) > 1:
+            log("Pobieranie {}: {} B w {} segmentach".format(self.url, total, len(segments)))
+        return resp
+
+    def _single(self, resp):
+        """Serwer bez Range: cały plik jednym strumieniem, bez możliwości wznowienia"""
+        total, done = net.content_length(resp), 0
+        with open(self.part, "wb") as f:
+            for chunk in iter(lambda: resp.read(CHUNK), b""):
+                f.write(chunk)
+                if self.throttle:
+                    self.throttle.consume(len(chunk))
+                done += len(chunk)
+                if self.progress:
+                    self.progress.update(done, total)
+
+    def _open_segment(self, seg):
+        headers = {"Range": "bytes={}-{}".format(seg[2], seg[1])}
+        if self.state.get("validator"):
+            headers["If-Range"] = self.state["validator"]
+        # Dalsze fragmenty z tej samej kopii pliku, co pierwszy
+        resp = net.open_url(self.state["source"], headers, self.timeout, use_mirrors=False)
+        span = _content_range(resp) if resp.getcode() == 206 else None
+        if span is None or span[0] != seg[2] or span[2] != self.state["size"]:
+            resp.close()
+            raise FileChanged("Plik {} zmienił się na serwerze".format(self.url))
+        return resp
+
+    def run_segment(self, seg, resp=None):
+        failures = 0
+        while seg[2] <= seg[1] and self.error is None:
+            offset = seg[2]
+            try:
+                if resp is None:
+                    resp = self._open_segment(seg)
+                # Bez buforowania: zapisany stan nie wyprzedza danych w pliku
+                with open(self.part, "r+b", 0) as f:
+                    f.seek(seg[2])
+                    while seg[2] <= seg[1] and self.error is None:
+                        data = resp.read(min(CHUNK, seg[1] + 1 - seg[2]))
+                        if not data:
+                            raise IOError("Przerwane połączenie po {} B".format(seg[2]))
+                        f.write(data)
+                        with self.lock:
+                            seg[2] += len(data)
+                        if self.throttle:
+                            self.throttle.consume(len(data))
+            except FileChanged:
+                raise
+            except (IOError, OSError, socket.error, http_client.HTTPException) as e:
+                # Liczą się tylko próby bez postępu - słabe łącze może zrywać wielokrotnie
+                failures = 1 if seg[2] > offset else failures + 1
+                if failures > self.retries:
+                    raise
+                delay = self.backoff * 2 ** (failures - 1)
+                log("Segment {}-{} {}: {} - wznowienie od {} za {:.1f} s".format(
+                    seg[0], seg[1], self.url, e, seg[2], delay), WARNING)
+                time.sleep(delay)
+            finally:
+                if resp is not None:
+                    resp.close()
+                    resp = None
+
+    def _worker(self, seg, resp):
+        try:
+            self.run_segment(seg, resp)
+        except Exception as e:
+            with self.lock:
+                if self.error is None:
+                    self.error = e
+
+    def run(self, resp=None):
+        """Pobiera brakujące segmenty równolegle w puli zadań; stan i postęp zapisuje wątek wywołujący"""
+        pending = [seg for seg in self.state["segments"] if seg[2] <= seg[1]]
+        if resp is not None and not pending:
+            resp.close()
+        jobs = [tasks.submit(self._worker, (seg, resp if i == 0 else None)) for i, seg in enumerate(pending)]
+        for task in jobs:
+            # Nierozpoczęty segment wait() pobiera od razu w tym wątku
+            while not task.wait(REPORT_INTERVAL):
+                self.save()
+                if self.progress:
+                    self.progress.update(self.done(), self.state["size"])
+        self.save()
+        if self.error is not None:
+            raise self.error
+
+def check(actual, digest, total=None, size=None, sha256=None):
+    """Porównuje rozmiar (B) i SHA-256 (hex) pobranych danych z oczekiwanymi; niezgodność -> IntegrityError"""
+    for expected in (total, size):
+        if expected is not None and actual != int(expected):
+            raise IntegrityError("Rozmiar pliku {} B, oczekiwano {} B".format(actual, expected))
+    if sha256 and digest != sha256.strip().lower():
+        raise IntegrityError("Niezgodna suma SHA-256 ({})".format(digest))
+
+def resumable(dest):
+    """Czy do `dest` czeka przerwane pobieranie do wznowienia"""
+    return os.path.exists(dest + ".part.json")
+
+def _verify(path, total=None, size=None, sha256=None):
+    """Sprawdza rozmiar i SHA-256 pliku; zwraca (sha1, sha256)"""
+    sha1, sha2 = hashlib.sha1(), hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            sha1.update(chunk)
+            sha2.update(chunk)
+    check(os.path.getsize(path), sha2.hexdigest(), total, size, sha256)
+    return sha1.hexdigest(), sha2.hexdigest()
+
+def fetch(url, dest, size=None, sha256=None, progress=None, timeout=30, use_mirrors=True, segments=None, throttle=None):
+    """Pobiera plik do `dest` z wznawianiem i segmentami, sprawdza rozmiar i SHA-256 (z manifestu).
+    progress - archive.Progress (etapy "download" i "verify"); segments - maks. liczba segmentów
+    (domyślnie ustawienie download_segments); throttle - Throttle. Zwraca słownik: size, sha1,
+    sha256, resumed (bajty z poprzedniej próby), segments, time. Błędny plik -> IntegrityError."""
+    with _dest_lock(dest):
+        return _fetch(url, dest, size, sha256, progress, timeout, use_mirrors, segments, throttle)
+
+def _fetch(url, dest, size, sha256, progress, timeout, use_mirrors, segments, throttle):
+    start = time.time()
+    ensure_dir(os.path.dirname(dest) or ".")
+    for attempt in range(2):
+        transfer = _Transfer(url, dest, progress, timeout, use_mirrors, segments, throttle)
+        if progress:
+            progress.stage("download")
+        resumed = transfer.done() if transfer.load() else 0
+        try:
+            if resumed:
+                log("Wznawiam pobieranie {}: {} z {} B".format(url, resumed, transfer.state["size"]))
+                transfer.run()
+            else:
+                resp = transfer.start()
+                if resp is not None:
+                    transfer.run(resp)
+        except FileChanged as e:
+            transfer.discard()
+            if attempt:
+                raise
+            log("{} - pobieram od nowa".format(e), WARNING)
+            continue
+        if progress:
+            progress.stage("verify")
+        total = transfer.state["size"] if transfer.state else None
+        try:
+            sha1, sha2 = _verify(transfer.part, total, size, sha256)
+        except IntegrityError as e:
+            transfer.discard()
+            if attempt or not resumed:
+                raise
+            # Fragment z poprzedniej próby mógł być uszkodzony - jeszcze raz w całości
+            log("Pobieranie {}: {} - pobieram od nowa".format(url, e), WARNING)
+            continue
+        if os.path.exists(transfer.state_path):
+            os.remove(transfer.state_path)
+        os.rename(transfer.part, dest)
+        result = {"size": os.path.getsize(dest), "sha1": sha1, "sha256": sha2, "resumed": resumed,
+                  "segments": len(transfer.state["segments"]) if transfer.state else 1, "time": time.time() - start}
+        log("Pobrano {}: {size} B, {segments} segm., wznowiono od {resumed} B, {time:.1f} s".format(url, **result))
+        return result
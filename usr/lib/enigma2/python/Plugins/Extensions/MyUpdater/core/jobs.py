@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – kolejka instalacji wielu list naraz
+#
+#  Faza 1: pobieranie (i rozpakowanie do katalogu roboczego) równolegle,
+#  najwyżej `queue_max_downloads` naraz; potem konwersja playlist M3U -
+#  pozycje z tym samym bouquet_id łączone są w jeden bukiet bez powtórzeń
+#  adresów, opcjonalnie bez niedziałających strumieni. Faza 2: instalacja
+#  po kolei w bezpiecznym porządku - najpierw pełne listy (podmieniają
+#  lamedb i bouquets.tv), potem bukiety REF i M3U (jeden zapis rejestru
+#  bukietów), na końcu picony. Zapisywane są tylko pliki różniące się od
+#  zainstalowanych, a migawka robiona jest przed pierwszym zapisem. Wywołujący
+#  raz wykonuje przeładowanie wskazane przez `queue.changes.reload` (żadne,
+#  tylko bukiety albo pełne - wg plików, których treść po całej kolejce
+#  różni się od pierwotnej) i zamyka operację kolejki (`queue.operation`).
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, re, time, shutil, hashlib
+from threading import Lock
+
+from collections import OrderedDict
+
+from . import net, archive, m3u, picons, lamedb, ledger, tasks, delta, probe
+from .bouquets import BouquetRegistry
+from .snapshots import SnapshotStore
+from .operations import Operation
+from .common import log, ensure_dir, get_setting, PLUGIN_TMP_PATH, E2_DIR, ERROR
+
+WORK_PATH = os.path.join(PLUGIN_TMP_PATH, "queue")
+
+STATUS_WAITING = "waiting"
+STATUS_DOWNLOADING = "downloading"
+STATUS_PROBING = "probing"  # sprawdzanie strumieni M3U
+STATUS_READY = "ready"
+STATUS_INSTALLING = "installing"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+STATUS_CANCELLED = "cancelled"
+STATUS_SKIPPED = "skipped"  # ta sama wersja jest już zainstalowana
+
+KIND_LIST = "list"
+KIND_REF = "bouquet"
+KIND_M3U = "m3u"
+KIND_PICON = "picon"
+INSTALL_ORDER = (KIND_LIST, KIND_REF, KIND_M3U, KIND_PICON)
+
+# m3u:<url>:<bouquet_id>[:<nazwa>] - url może zawierać port, więc nie dzielimy po ":"
+BOUQUET_ACTION_RE = re.compile(r'^(m3u|bouquet):(.+?):([^:/]+\.(?:tv|radio))(?::(.*))?$')
+
+def parse_action(title, action):
+    """Zwraca (rodzaj, url, bouquet_id, bouquet_name) dla akcji wpisu listy"""
+    prefix = action.split(":", 1)[0]
+    if prefix == "archive":
+        url = action.split(":", 1)[1]
+        archive_type = archive.archive_type_of(url)
+        if archive_type is None:
+            raise ValueError("Nieobsługiwany format archiwum: {}".format(url))
+        kind = KIND_PICON if "picon" in title.lower() and archive_type == "zip" else KIND_LIST
+        return kind, url, None, None
+    m = BOUQUET_ACTION_RE.match(action)
+    if m:
+        prefix, url, bouquet_id, bouquet_name = m.groups()
+        return (KIND_M3U if prefix == "m3u" else KIND_REF), url, bouquet_id, bouquet_name or bouquet_id
+    raise ValueError("Nieznany typ akcji: {}".format(action))
+
+class Job(object):
+    """Jedna pozycja kolejki: wpis listy, jego stan, wynik i czasy faz"""
+
+    def __init__(self, title, action, info=None):
+        self.title = title
+        self.action = action
+        self.info = info or {}
+        self.version = self.info.get("version", "")
+        self.digest = None
+        self.status = STATUS_WAITING
+        self.error = None
+        self.result = ""
+        self.done = self.total = 0
+        self.timings = {}
+        self.staged = None
+        self.workdir = None
+        self.source = None  # pobrana playlista M3U do konwersji
+        self.merged_into = None  # pozycja M3U, z której bukietem połączono tę playlistę
+        try:
+            self.kind, self.url, self.bouquet_id, self.bouquet_name = parse_action(title, action)
+        except (ValueError, IndexError) as e:
+            self.kind = self.url = self.bouquet_id = self.bouquet_name = None
+            self.status, self.error = STATUS_ERROR, e
+
+class _JobProgress(archive.Progress):
+    """Postęp pobierania pojedynczej pozycji przekazywany do kolejki"""
+
+    def __init__(self, queue, job):
+        archive.Progress.__init__(self)
+        self.queue = queue
+        self.job = job
+
+    def update(self, done, total=None):
+        self.job.done, self.job.total = done, total
+        self.queue._notify(self.job)
+
+class InstallQueue(object):
+    def __init__(self, jobs, on_update=None, max_downloads=None, e2_dir=E2_DIR, work_path=WORK_PATH, force=False):
+        self.jobs = jobs
+        self.force = force
+        self.on_update = on_update
+        self.max_downloads = max(1, max_downloads or get_setting("queue_max_downloads"))
+        self.e2_dir = e2_dir
+        self.work_path = work_path
+        self.cancelled = False
+        self.changes = delta.ChangeSet()
+        self.net = delta.NetChanges(e2_dir)
+        self.backed_up = False
+        self.ready = 0
+        self.timings = []
+        self.registry = None
+        self.operation = Operation("queue", "Kolejka: " + ", ".join(j.title for j in jobs[:3]) +
+                                   (" (+{})".format(len(jobs) - 3) if len(jobs) > 3 else ""))
+
+    def _notify(self, job):
+        if self.on_update:
+            self.on_update(job)
+
+    def _set(self, job, status, error=None):
+        job.status, job.error = status, error
+        self._notify(job)
+
+    def cancel(self):
+        """Pozycje jeszcze nierozpoczęte nie zostaną wykonane"""
+        self.cancelled = True
+
+    def start(self, on_done, group=None):
+        """Uruchamia kolejkę w puli zadań; on_done(kolejka) dostarczane przez tasks.dispatch()"""
+        group = group or tasks.TaskGroup()
+        return group.submit(self.run, on_done=lambda task: on_done(self))
+
+    def run(self):
+        shutil.rmtree(self.work_path, ignore_errors=True)
+        self.ledger = ledger.Ledger()
+        try:
+            start = time.time()
+            self._download_all()
+            self.timings.append(("download", time.time() - start))
+            if [j for j in self.jobs if j.kind == KIND_M3U]:
+                start = time.time()
+                self._convert_all()
+                self.timings.append(("parse", time.time() - start))
+            start = time.time()
+            self._install_all()
+            self.timings.append(("install", time.time() - start))
+        finally:
+            self.changes = self.net.result()
+            shutil.rmtree(self.work_path, ignore_errors=True)
+            for job in self.jobs:
+                if job.status in (STATUS_WAITING, STATUS_READY):
+                    self._set(job, STATUS_CANCELLED)
+        log("Kolejka: {} pozycji, {}".format(len(self.jobs), ", ".join("{} {:.2f} s".format(k, t) for k, t in self.timings)))
+        return self
+
+    # --- faza 1: pobieranie ---
+
+    def _download_all(self):
+        pending = [j for j in self.jobs if j.status == STATUS_WAITING]
+        lock = Lock()
+
+        def worker():
+            while not self.cancelled:
+                with lock:
+                    if not pending:
+                        return
+                    job = pending.pop(0)
+                self._download(job)
+
+        workers = [tasks.submit(worker) for i in range(min(self.max_downloads, len(pending)))]
+        for task in workers:
+            task.wait()
+
+    def _merged(self, job):
+        """Czy inna pozycja kolejki zapisuje ten sam bukiet M3U (wtedy aktualnej nie pomijamy,
+        żeby jej kanały nie zniknęły z połączonego bukietu)"""
+        return job.kind == KIND_M3U and len([j for j in self.jobs if j.kind == KIND_M3U and j.bouquet_id == job.bouquet_id]) > 1
+
+    def _download(self, job):
+        if not self.force and self.ledger.is_current(job.url, job.version) and not self._merged(job):
+            self._set(job, STATUS_SKIPPED)
+            return
+        if job.kind == KIND_PICON:
+            self._set(job, STATUS_READY)  # synchronizacja picon pobiera tylko zmienione pliki w fazie 2
+            return
+        self._set(job, STATUS_DOWNLOADING)
+        job.workdir = ensure_dir(os.path.join(self.work_path, str(self.jobs.index(job))))
+        start = time.time()
+        span = self.operation.span
+        try:
+            progress = _JobProgress(self, job)
+            if job.kind == KIND_LIST:
+                try:
+                    job.staged, job.digest = archive.stage_list_archive(job.url, archive.archive_type_of(job.url),
+                                                                        job.workdir, progress, job.version,
+                                                                        job.info.get("sha256"), job.info.get("size"))
+                finally:
+                    self.operation.add_timings(progress.finish(), job.title)
+            elif job.kind == KIND_REF:
+                with span("download", job.title):
+                    resp = net.fetch(job.url, timeout=30)
+                if not resp.body.strip():
+                    raise Exception("Pobrany plik bukietu jest pusty")
+                path = os.path.join(job.workdir, job.bouquet_id)
+                with open(path, "wb") as f:
+                    f.write(resp.body)
+                job.staged = [(job.bouquet_id, path)]
+                job.digest = hashlib.sha1(resp.body).hexdigest()
+            else:
+                with span("download", job.title):
+                    job.source = self._download_file(job, progress)
+                job.digest = ledger.file_hash(job.source)
+            job.timings["download"] = time.time() - start
+            self._set(job, STATUS_READY)
+        except Exception as e:
+            log("Kolejka: błąd pobierania '{}': {}".format(job.title, e), ERROR)
+            self._set(job, STATUS_ERROR, e)
+
+    def _download_file(self, job, progress):
+        path = os.path.join(job.workdir, "source.m3u")
+        reported = [0]
+
+        def on_progress(done, total):
+            if done - reported[0] >= 256 * 1024:
+                reported[0] = done
+                progress.update(done, total)
+
+        metrics = net.download(job.url, path, progress=on_progress, timeout=30)
+        if not metrics["bytes"]:
+            raise Exception("Nie udało się pobrać pliku M3U")
+        return path
+
+    # --- konwersja M3U ---
+
+    def _convert_all(self):
+        groups = OrderedDict()
+        for job in self.jobs:
+            if job.kind == KIND_M3U and job.status == STATUS_READY:
+                groups.setdefault(job.bouquet_id, []).append(job)
+        for group in groups.values():
+            if self.cancelled:
+                return
+            try:
+                self._convert(group)
+            except Exception as e:
+                log("Kolejka: błąd konwersji M3U '{}': {}".format(group[0].bouquet_id, e), ERROR)
+                for job in group:
+                    self._set(job, STATUS_ERROR, e)
+            finally:
+                for job in group:
+                    if job.source and os.path.exists(job.source):
+                        os.remove(job.source)
+
+    def _convert(self, group):
+        """Playlisty pozycji z jednym bouquet_id -> jeden bukiet (lub bukiety grup) w katalogu pierwszej"""
+        first = group[0]
+        titles = ", ".join(j.title for j in group)
+        paths = [j.source for j in group]
+        split_groups = first.info.get("split_groups", get_setting("m3u_split_groups"))
+        keep = None
+        if [j for j in group if j.info.get("probe", get_setting("m3u_probe"))]:
+            start = time.time()
+
+            def on_progress(done, total):
+                for job in group:
+                    job.done, job.total = done, total
+                    self._notify(job)
+
+            for job in group:
+                self._set(job, STATUS_PROBING)
+            with self.operation.span("probe", titles):
+                keep, stats = probe.stream_filter(paths, progress=on_progress, cancelled=lambda: self.cancelled)
+            for job in group:
+                job.timings["probe"] = time.time() - start
+                job.done = job.total = 0
+                self._set(job, STATUS_READY)
+        with self.operation.span("parse", titles):
+            converted = m3u.convert_files(paths, first.workdir, first.bouquet_id, first.bouquet_name, split_groups,
+                                          get_setting("m3u_dedupe"), keep)
+        if not converted:
+            raise Exception("Nie znaleziono kanałów w pliku M3U")
+        first.staged = [(b_id, os.path.join(first.workdir, b_id)) for b_id, name, count in converted]
+        for job in group[1:]:
+            job.staged, job.merged_into = [], first
+
+    # --- faza 2: instalacja ---
+
+    def _install_all(self):
+        ready = [j for j in self.jobs if j.status == STATUS_READY]
+        ready.sort(key=lambda j: INSTALL_ORDER.index(j.kind))
+        if self.cancelled or not ready:
+            return
+        self.ready = len(ready)
+        try:
+            for job in ready:
+                if self.cancelled:
+                    break
+                self._set(job, STATUS_INSTALLING)
+                start = time.time()
+                try:
+                    job.result = self._install(job)
+                    job.timings["install"] = time.time() - start
+                    self._set(job, STATUS_DONE)
+                except Exception as e:
+                    log("Kolejka: błąd instalacji '{}': {}".format(job.title, e), ERROR)
+                    self._set(job, STATUS_ERROR, e)
+        finally:
+            if self.registry:
+                dirty = [os.path.basename(f.path) for f in self.registry.files.values() if f.dirty]
+                if dirty:
+                    self._write(dirty)
+                with self.operation.span("bouquets"):
+                    self.registry.commit()
+                self.net.record(delta.ChangeSet([delta.FileChange(name, None, delta.CHANGED) for name in dirty]))
+
+    def _write(self, names):
+        """Przed zapisem plików: migawka list (jedna na kolejkę) i treść pierwotna dla NetChanges"""
+        self.net.before_write(names)
+        if not self.backed_up:
+            self.backed_up = True
+            with self.operation.span("backup"):
+                SnapshotStore(e2_dir=self.e2_dir).take("Przed instalacją kolejki ({} poz.)".format(self.ready))
+
+    def _install(self, job):
+        span = self.operation.span
+        if job.kind == KIND_PICON:
+            progress = archive.Progress(cancelled=lambda: self.cancelled)
+            try:
+                stats = picons.sync_picons(job.url, progress, version=job.version, title=job.title,
+                                           sha256=job.info.get("sha256"), size=job.info.get("size"))
+            finally:
+                self.operation.add_timings(progress.finish(), job.title)
+            return picons.describe(stats)
+        if job.kind == KIND_LIST:
+            with span("diff", job.title):
+                changes = archive.diff_staged(job.staged, e2_dir=self.e2_dir)
+            if changes.written:
+                self._write([c.name for c in changes.written])
+            with span("install", job.title):
+                changes.apply(self.e2_dir)
+            ledger.record(job.url, job.version, job.digest, job.kind, job.title)
+            self.net.record(changes)
+            return changes.describe()
+
+        if job.merged_into is not None:
+            # Playlista zapisana już w bukiecie wcześniejszej pozycji
+            if job.merged_into.status != STATUS_DONE:
+                raise Exception("Połączony bukiet nie został zainstalowany")
+            ledger.record(job.url, job.version, job.digest, job.kind, job.title)
+            return "połączono z: {}".format(job.merged_into.title)
+
+        # Rejestr tworzony dopiero tutaj: pełne listy mogły właśnie podmienić bouquets.tv
+        if self.registry is None:
+            self.registry = BouquetRegistry(self.e2_dir)
+        result = ""
+        if job.kind == KIND_REF:
+            with span("check", job.title):
+                index = lamedb.load_index(lamedb.lamedb_path(self.e2_dir))
+                if index is not None:
+                    with io.open(job.staged[0][1], "r", encoding="utf-8", errors="ignore") as f:
+                        check = lamedb.check_bouquet(f, index)
+                    result = "w lamedb {} z {}".format(check.resolved + check.partial, check.total)
+        with span("diff", job.title):
+            changes = delta.diff(job.staged, self.e2_dir)
+        if changes.written:
+            self._write([c.name for c in changes.written])
+        with span("install", job.title):
+            changes.apply(self.e2_dir)
+            for bouquet_id, path in job.staged:
+                self.registry.add(bouquet_id)
+        ledger.record(job.url, job.version, job.digest, job.kind, job.title)
+        self.net.record(changes)
+        return result or "{} bukietów, {}".format(len(job.staged), changes.describe())
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – indeks usług z lamedb (v4 i v5)
+#
+#  Usługa pakowana jest do jednej liczby (namespace:sid:tsid:onid), a indeks to
+#  dwa zbiory takich liczb: pełnych i bez namespace. Indeks trzymany jest
+#  w pamięci i odświeżany dopiero po zmianie mtime/rozmiaru pliku.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, time
+from collections import namedtuple
+
+from .common import log, E2_DIR
+
+BouquetCheck = namedtuple("BouquetCheck", "total resolved partial streams missing")
+
+def pack(sid, tsid, onid, ns=0):
+    return (((ns << 16 | sid) << 16 | tsid) << 16) | onid
+
+class ServiceIndex(object):
+    def __init__(self, version=None):
+        self.version = version
+        self.full = set()   # namespace:sid:tsid:onid
+        self.loose = set()  # sid:tsid:onid (namespace pominięty)
+
+    def add(self, sid, ns, tsid, onid):
+        self.full.add(pack(sid, tsid, onid, ns))
+        self.loose.add(pack(sid, tsid, onid))
+
+    def __len__(self):
+        return len(self.full)
+
+def _parse_v4(lines, index):
+    it = iter(lines)
+    for line in it:
+        if line.startswith("services"):
+            break
+    for line in it:
+        if line.startswith("end"):
+            break
+        f = line.split(":", 5)
+        index.add(int(f[0], 16), int(f[1], 16), int(f[2], 16), int(f[3], 16))
+        next(it, None)  # nazwa
+        next(it, None)  # dostawca / dane
+    return index
+
+def _parse_v5(lines, index):
+    for line in lines:
+        if line.startswith("s:"):
+            f = line[2:].split(",", 1)[0].split(":", 5)
+            index.add(int(f[0], 16), int(f[1], 16), int(f[2], 16), int(f[3], 16))
+    return index
+
+def parse(lines):
+    """Buduje ServiceIndex z linii lamedb (wersja rozpoznawana po nagłówku)"""
+    it = iter(lines)
+    header = next(it, "")
+    if "/5/" in header:
+        return _parse_v5(it, ServiceIndex(5))
+    if "/4/" in header:
+        return _parse_v4(it, ServiceIndex(4))
+    raise ValueError("Nieobsługiwany format lamedb: {}".format(header.strip()))
+
+def lamedb_path(e2_dir=E2_DIR):
+    """Nowszy z plików lamedb / lamedb5"""
+    paths = [p for p in (os.path.join(e2_dir, "lamedb"), os.path.join(e2_dir, "lamedb5")) if os.path.isfile(p)]
+    if not paths:
+        return None
+    return max(paths, key=os.path.getmtime)
+
+_cache = {}
+
+def load_index(path=None):
+    """Indeks z pamięci, przebudowywany tylko po zmianie pliku"""
+    path = path or lamedb_path()
+    if not path:
+        return None
+    st = os.stat(path)
+    cached = _cache.get(path)
+    if cached and cached[0] == (st.st_mtime, st.st_size):
+        return cached[1]
+    start = time.time()
+    with io.open(path, "r", encoding="utf-8", errors="ignore") as f:
+        index = parse(f)
+    _cache[path] = ((st.st_mtime, st.st_size), index)
+    log("lamedb: {} usług (v{}) w {:.3f} s".format(len(index), index.version, time.time() - start))
+    return index
+
+def parse_service_ref(line):
+    """Zwraca (sid, tsid, onid, ns) dla usługi DVB z linii #SERVICE, w innym przypadku None"""
+    if not line.startswith("#SERVICE "):
+        return None
+    f = line[9:].split(":", 10)
+    if len(f) < 10 or f[0] != "1" or f[1] != "0":
+        return None  # strumienie (4097, 5001...), znaczniki i podbukiety
+    if len(f) > 10 and "%3a" in f[10]:
+        return None  # IPTV z referencją typu 1:0:...
+    try:
+        return int(f[3], 16), int(f[4], 16), int(f[5], 16), int(f[6], 16)
+    except ValueError:
+        return None
+
+def check_bouquet(lines, index, max_missing=10):
+    """Ile referencji DVB z bukietu ma odpowiednik w lamedb"""
+    total = resolved = partial = streams = 0
+    missing = []
+    for line in lines:
+        line = line.strip()
+        if not line.startswith("#SERVICE "):
+            continue
+        ref = parse_service_ref(line)
+        if ref is None:
+            if "%3a//" in line:
+                streams += 1
+            continue
+        total += 1
+        sid, tsid, onid, ns = ref
+        if pack(sid, tsid, onid, ns) in index.full:
+            resolved += 1
+        elif pack(sid, tsid, onid) in index.loose:
+            partial += 1
+        elif len(missing) < max_missing:
+            missing.append(line[9:])
+    return BouquetCheck(total, resolved, partial, streams, missing)
+
+def describe_check(check):
+    txt = "Kanały DVB znalezione w lamedb: {} z {}".format(check.resolved + check.partial, check.total)
+    if check.partial:
+        txt += "\n(w tym {} z inną przestrzenią nazw)".format(check.partial)
+    if check.streams:
+        txt += "\nStrumienie IPTV: {}".format(check.streams)
+    missing = check.total - check.resolved - check.partial
+    if missing:
+        txt += "\nBrak w lamedb (będą 'N/A'): {}".format(missing)
+    return txt
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – rejestr instalacji i pamięć podręczna archiwów
+#
+#  Dla każdej zainstalowanej listy, bukietu i paczki picon zapisywany jest
+#  adres, wersja z manifestu, skrót treści i czas instalacji. Pozwala to
+#  oznaczać w menu aktualne pozycje i pomijać ponowną instalację tej samej
+#  wersji. Pobrane archiwa list trzymane są w pamięci podręcznej LRU
+#  (klucz: url#wersja), więc ponowne zastosowanie lub powrót do
+#  wcześniejszej wersji nie wymaga sieci.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, json, time, hashlib
+
+from .cache import DocumentCache
+from .common import log, ensure_dir, get_setting, DATA_PATH
+
+LEDGER_FILE = os.path.join(DATA_PATH, "ledger.json")
+ARCHIVE_CACHE_PATH = os.path.join(DATA_PATH, "archives")
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class Ledger(object):
+    """Spis instalacji: url -> {version, hash, kind, title, installed}"""
+
+    def __init__(self, path=LEDGER_FILE):
+        self.path = path
+        self.entries = {}
+        try:
+            with io.open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", {})
+        except (IOError, OSError, ValueError):
+            pass
+
+    def get(self, url):
+        return self.entries.get(url)
+
+    def is_current(self, url, version):
+        """Czy ta sama (niepusta) wersja jest już zainstalowana"""
+        entry = self.entries.get(url)
+        return bool(version) and entry is not None and entry.get("version") == version
+
+    def record(self, url, version, content_hash, kind, title=""):
+        self.entries[url] = {"version": version or "", "hash": content_hash, "kind": kind,
+                             "title": title, "installed": time.time()}
+
+    def save(self):
+        ensure_dir(os.path.dirname(self.path))
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps({"entries": self.entries}, sort_keys=True).encode("utf-8"))
+        os.rename(tmp, self.path)
+
+def record(url, version, content_hash, kind, title=""):
+    """Dopisuje instalację do rejestru (odczyt, zmiana i zapis w jednym kroku)"""
+    ledger = Ledger()
+    ledger.record(url, version, content_hash, kind, title)
+    ledger.save()
+    log("Rejestr: {} {} ({}, {})".format(kind, url, version or "bez wersji", content_hash))
+
+def archive_key(url, version):
+    return "{}#{}".format(url, version)
+
+_archive_cache = None
+
+def archive_cache():
+    global _archive_cache
+    if _archive_cache is None:
+        _archive_cache = DocumentCache(ARCHIVE_CACHE_PATH, get_setting("archive_cache_max_kb") * 1024)
+    return _archive_cache
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – strumieniowa konwersja M3U na bukiety Enigma2
+#
+#  Playlista czytana jest linia po linii, a każdy wpis od razu zapisywany do
+#  pliku bukietu, więc zużycie pamięci nie zależy od rozmiaru playlisty.
+#  Powtórzone adresy (także różniące się tylko wielkością liter hosta,
+#  domyślnym portem czy fragmentem #) zapisywane są raz - w pamięci jest
+#  tylko zbiór skrótów adresów. Kilka playlist może trafić do jednego
+#  bukietu (convert_files), a filtr keep(url) pomija martwe strumienie.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, re, time, hashlib
+from collections import namedtuple, OrderedDict
+
+from .common import log
+
+M3UEntry = namedtuple("M3UEntry", "name url attrs")
+
+ATTR_RE = re.compile(r'([\w-]+)="([^"]*)"')
+SLUG_RE = re.compile(r'[^a-z0-9]+')
+MAX_OPEN_FILES = 128
+
+def parse_extinf(line):
+    """Zwraca (nazwa, atrybuty) z linii #EXTINF (tvg-id, tvg-name, group-title, ...)"""
+    body = line[len('#EXTINF:'):]
+    # Pierwszy przecinek poza cudzysłowem oddziela atrybuty od nazwy
+    comma = body.find(',')
+    while comma >= 0 and body.count('"', 0, comma) % 2:
+        comma = body.find(',', comma + 1)
+    head = body if comma < 0 else body[:comma]
+    attrs = dict(ATTR_RE.findall(head))
+    name = body[comma + 1:].strip() if comma >= 0 else u""
+    return name or attrs.get('tvg-name') or u"N/A", attrs
+
+def iter_m3u(lines):
+    """Generator wpisów M3UEntry z iterowalnej sekwencji linii"""
+    name, attrs = u"N/A", {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#EXTINF:'):
+            name, attrs = parse_extinf(line)
+        elif line.startswith('#EXTGRP:'):
+            attrs.setdefault('group-title', line[len('#EXTGRP:'):].strip())
+        elif not line.startswith('#') and '://' in line:
+            yield M3UEntry(name, line, attrs)
+            name, attrs = u"N/A", {}
+
+_DEFAULT_PORTS = {"http": "80", "https": "443", "rtsp": "554"}
+# schemat :// [użytkownik@] host [:port] reszta - bez urlsplit, który przy setkach tysięcy wpisów kosztuje więcej niż zapis
+_URL_RE = re.compile(r'^([A-Za-z][A-Za-z0-9+.-]*)://([^/?#@]*@)?(\[[^\]]*\]|[^/?#:]*)(?::(\d*))?([^#]*)')
+
+def normalize_url(url):
+    """Postać adresu do porównań: schemat i host małymi literami, bez domyślnego portu
+    i fragmentu; ścieżka i zapytanie (tokeny) bez zmian"""
+    url = url.strip()
+    m = _URL_RE.match(url)
+    if m is None:
+        return url
+    scheme, user, host, port, rest = m.groups()
+    scheme = scheme.lower()
+    if port and port != _DEFAULT_PORTS.get(scheme):
+        host = "{}:{}".format(host, port)
+    if not rest.startswith("/"):
+        rest = "/" + rest
+    return "{}://{}{}{}".format(scheme, user or "", host.lower(), rest)
+
+def url_key(url):
+    """Skrót znormalizowanego adresu (20 B niezależnie od długości adresu z tokenem)"""
+    return hashlib.sha1(normalize_url(url).encode("utf-8")).digest()
+
+def service_line(entry):
+    return u"#SERVICE 4097:0:1:0:0:0:0:0:0:0:{}:{}\n".format(entry.url.replace(':', '%3a'), entry.name)
+
+def group_bouquet_id(bouquet_id, group):
+    """userbouquet.iptv.tv + 'Sport HD' -> userbouquet.iptv_sport_hd.tv"""
+    base, ext = os.path.splitext(bouquet_id)
+    slug = SLUG_RE.sub('_', group.lower()).strip('_') or "inne"
+    return "{}_{}{}".format(base, slug, ext)
+
+class BouquetWriter(object):
+    """Zapisuje wpisy do jednego lub wielu plików bukietów (po group-title)"""
+
+    def __init__(self, out_dir, bouquet_id, bouquet_name, split_groups=False):
+        self.out_dir = out_dir
+        self.bouquet_id = bouquet_id
+        self.bouquet_name = bouquet_name
+        self.split_groups = split_groups
+        self.counts = OrderedDict()  # bouquet_id -> [nazwa, liczba wpisów]
+        self.files = OrderedDict()   # otwarte pliki, najdawniej używane na początku
+        self.last_bid = None
+
+    def path(self, bid):
+        return os.path.join(self.out_dir, bid)
+
+    def _file(self, bid, name):
+        if bid == self.last_bid:
+            return self.files[bid]
+        self.last_bid = bid
+        f = self.files.pop(bid, None)
+        if f is None:
+            if len(self.files) >= MAX_OPEN_FILES:
+                self.files.popitem(last=False)[1].close()
+            if bid in self.counts:
+                f = io.open(self.path(bid), 'a', encoding='utf-8')
+            else:
+                f = io.open(self.path(bid), 'w', encoding='utf-8')
+                f.write(u"#NAME {}\n".format(name))
+                self.counts[bid] = [name, 0]
+        self.files[bid] = f
+        return f
+
+    def write(self, entry):
+        group = entry.attrs.get('group-title') if self.split_groups else None
+        if group:
+            bid = group_bouquet_id(self.bouquet_id, group)
+            name = u"{} - {}".format(self.bouquet_name, group)
+        else:
+            bid, name = self.bouquet_id, self.bouquet_name
+        self._file(bid, name).write(service_line(entry))
+        self.counts[bid][1] += 1
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files.clear()
+        return [(bid, name, count) for bid, (name, count) in self.counts.items()]
+
+def convert(lines, out_dir, bouquet_id, bouquet_name, split_groups=False, dedupe=True, keep=None):
+    """Konwertuje playlistę w jednym przebiegu; zwraca [(bouquet_id, nazwa, liczba)].
+    dedupe - powtórzony adres zapisywany tylko raz, keep(url) == False - wpis pomijany"""
+    start = time.time()
+    writer = BouquetWriter(out_dir, bouquet_id, bouquet_name, split_groups)
+    seen = set()
+    duplicates = dead = 0
+    try:
+        for entry in iter_m3u(lines):
+            if dedupe:
+                key = url_key(entry.url)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+            if keep is not None and not keep(entry.url):
+                dead += 1
+                continue
+            writer.write(entry)
+    finally:
+        bouquets = writer.close()
+    total = sum(b[2] for b in bouquets)
+    elapsed = max(time.time() - start, 1e-6)
+    log("M3U: {} wpisów w {} bukietach, pominięto {} powtórzonych i {} niedziałających, {:.2f} s ({:.0f} wpisów/s)".format(
+        total, len(bouquets), duplicates, dead, elapsed, total / elapsed))
+    return bouquets
+
+def iter_files(paths):
+    """Linie kolejnych plików M3U, jak jeden plik (plik otwarty jest tylko w trakcie czytania)"""
+    for path in paths:
+        with io.open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                yield line
+
+def convert_files(m3u_paths, out_dir, bouquet_id, bouquet_name, split_groups=False, dedupe=True, keep=None):
+    """Łączy kilka playlist w jeden bukiet (lub zestaw bukietów grup); powtórzenia między
+    playlistami też są pomijane"""
+    return convert(iter_files(m3u_paths), out_dir, bouquet_id, bouquet_name, split_groups, dedupe, keep)
+
+def convert_file(m3u_path, out_dir, bouquet_id, bouquet_name, split_groups=False, dedupe=True, keep=None):
+    return convert_files([m3u_path], out_dir, bouquet_id, bouquet_name, split_groups, dedupe, keep)
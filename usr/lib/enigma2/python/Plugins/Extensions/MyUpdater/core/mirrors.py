@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – serwery lustrzane i ocena hostów
+#
+#  Zasób może mieć kilka adresów: oryginalny, wbudowane lustro GitHuba
+#  (raw.githubusercontent.com, jsDelivr) i lustra z ustawień (np. serwer
+#  w sieci lokalnej). Adresy sortowane są wg oceny hosta - średniego czasu
+#  do pierwszych bajtów i liczby błędów, które z czasem wygasają - i
+#  ścigają się o pierwsze bajty: najlepszy startuje od razu, kolejny po
+#  mirror_race_delay s lub po błędzie poprzedniego. Wygrywa pierwsza
+#  odpowiedź, pozostałe są zamykane. Oceny zapisywane są na flashu.
+#  W wyścigu startuje najwyżej MAX_RACERS najlepiej ocenionych adresów
+#  (każdy we własnym wątku), a pojedynczy adres - np. kolejne segmenty
+#  pobierania z tej samej kopii - sprawdzany jest w wątku wywołującym, bez
+#  dodatkowego wątku. Na jedno zadanie puli przypada więc najwyżej
+#  MAX_RACERS wątków wyścigu.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, re, json, time, atexit, socket, threading
+from threading import Lock, Condition
+
+from .common import log, ensure_dir, get_setting, DATA_PATH, DEBUG, WARNING
+
+SCORES_FILE = os.path.join(DATA_PATH, "host_scores.json")
+# Ocena hosta bez pomiarów (s) - nowy host nie wyprzedza znanego, szybkiego
+PRIOR_LATENCY = 1.0
+# Kara (s) za każdy niewygasły błąd połączenia
+FAILURE_PENALTY = 5.0
+# Po tym czasie (s) pomiary i błędy hosta ważą o połowę mniej
+HALF_LIFE = 6 * 3600
+# Waga nowego pomiaru w średniej czasu odpowiedzi
+ALPHA = 0.3
+# Zapis ocen na flash najwyżej raz na tyle sekund
+SAVE_INTERVAL = 300
+# Najwięcej adresów jednego zasobu ścigających się naraz (reszta - przy kolejnej próbie)
+MAX_RACERS = 3
+
+_GITHUB_RE = re.compile(r'^https?://github\.com/([^/]+)/([^/]+)/raw/([^/]+)/(.+)$')
+_RAW_RE = re.compile(r'^https?://raw\.githubusercontent\.com/([^/]+)/([^/]+)/([^/]+)/(.+)$')
+
+def host_of(url):
+    """host[:port] adresu, klucz oceny"""
+    return url.split("://", 1)[-1].split("/", 1)[0].lower()
+
+def github_mirrors(url):
+    """Adresy tego samego pliku z repozytorium GitHub: raw.githubusercontent.com i jsDelivr
+    (jsDelivr odświeża gałęzie z opóźnieniem do kilku godzin)"""
+    m = _GITHUB_RE.match(url) or _RAW_RE.match(url)
+    if not m:
+        return []
+    user, repo, branch, path = m.groups()
+    urls = ["https://raw.githubusercontent.com/{}/{}/{}/{}".format(user, repo, branch, path)]
+    if get_setting("mirror_cdn"):
+        urls.append("https://cdn.jsdelivr.net/gh/{}/{}@{}/{}".format(user, repo, branch, path))
+    return [u for u in urls if u != url]
+
+def candidates(url):
+    """Adresy zasobu: oryginalny, lustra GitHuba i lustra z ustawienia "mirrors"
+    ([{"prefix": ..., "url": ...}] - prefiks adresu zamieniany na adres lustra)"""
+    urls = [url] + github_mirrors(url)
+    for rule in get_setting("mirrors") or []:
+        prefix, mirror = rule.get("prefix"), rule.get("url")
+        if not prefix or not mirror:
+            continue
+        for u in list(urls):
+            if u.startswith(prefix):
+                urls.append(mirror + u[len(prefix):])
+    seen = set()
+    return [u for u in urls if not (u in seen or seen.add(u))]
+
+class HostScores(object):
+    """Host -> {latency, failures, ok, errors, updated}; wartości wygasają z czasem (HALF_LIFE)"""
+
+    def __init__(self, path=SCORES_FILE):
+        self.path = path
+        self.lock = Lock()
+        self.hosts = {}
+        self.dirty = False
+        self.saved = time.time()
+        try:
+            with io.open(path, "r", encoding="utf-8") as f:
+                self.hosts = json.load(f)
+        except (IOError, OSError, ValueError):
+            pass
+
+    @staticmethod
+    def _weight(entry, now):
+        return 0.5 ** (max(0, now - entry.get("updated", now)) / float(HALF_LIFE))
+
+    def score(self, host, now=None):
+        """Spodziewany czas (s) do pierwszych bajtów z karą za błędy; mniejszy = lepszy"""
+        with self.lock:
+            entry = self.hosts.get(host)
+            if not entry:
+                return PRIOR_LATENCY
+            w = self._weight(entry, now or time.time())
+            latency = entry.get("latency")
+            latency = PRIOR_LATENCY if latency is None else w * latency + (1 - w) * PRIOR_LATENCY
+            return latency + FAILURE_PENALTY * w * entry.get("failures", 0)
+
+    def record(self, host, latency=None, failed=False):
+        now = time.time()
+        with self.lock:
+            entry = self.hosts.setdefault(host, {"latency": None, "failures": 0, "ok": 0, "errors": 0, "updated": now})
+            w = self._weight(entry, now)
+            entry["failures"] = entry.get("failures", 0) * w + (1 if failed else 0)
+            if failed:
+                entry["errors"] = entry.get("errors", 0) + 1
+            else:
+                entry["ok"] = entry.get("ok", 0) + 1
+                old = entry.get("latency")
+                entry["latency"] = latency if old is None else (1 - ALPHA) * old + ALPHA * latency
+            entry["updated"] = now
+            self.dirty = True
+            due = now - self.saved >= SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def order(self, urls):
+        """Adresy od najlepiej ocenionego hosta; przy równej ocenie kolejność oryginalna"""
+        now = time.time()
+        return [u for i, u in sorted(enumerate(urls), key=lambda p: (self.score(host_of(p[1]), now), p[0]))]
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.hosts, sort_keys=True).encode("utf-8")
+            self.dirty = False
+            self.saved = time.time()
+        try:
+            ensure_dir(os.path.dirname(self.path))
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.rename(tmp, self.path)
+        except (IOError, OSError) as e:
+            log("Nie można zapisać ocen hostów: {}".format(e), WARNING)
+
+    def rows(self):
+        """[(host, ocena, słownik)] od najlepszego"""
+        now = time.time()
+        with self.lock:
+            hosts = dict((h, dict(e)) for h, e in self.hosts.items())
+        return sorted(((h, self.score(h, now), e) for h, e in hosts.items()), key=lambda r: (r[1], r[0]))
+
+_scores = None
+_scores_lock = Lock()
+
+def scores():
+    global _scores
+    with _scores_lock:
+        if _scores is None:
+            _scores = HostScores()
+            atexit.register(_scores.save)
+        return _scores
+
+class RaceFailed(IOError):
+    """Żaden adres nie odpowiedział; `errors` - [(adres, wyjątek)] w kolejności prób"""
+
+    def __init__(self, errors):
+        IOError.__init__(self, "; ".join("{}: {}".format(host_of(u), e) for u, e in errors) or "brak adresów")
+        self.errors = errors
+
+class _Race(object):
+    def __init__(self, attempt, host_failure):
+        self.attempt = attempt
+        self.host_failure = host_failure
+        self.cond = Condition()
+        self.winner = None
+        self.errors = []
+        self.started = 0
+        self.finished = 0
+        self.done = False
+
+    def start(self, url):
+        self.started += 1
+        t = threading.Thread(target=self._run, args=(url,), name="MyUpdater-mirror")
+        t.daemon = True
+        t.start()
+
+    def _run(self, url):
+        start = time.time()
+        try:
+            result = self.attempt(url)
+        except Exception as e:
+            if self.host_failure(e):
+                scores().record(host_of(url), failed=True)
+            log("Lustro {}: {}".format(host_of(url), e), DEBUG)
+            with self.cond:
+                self.errors.append((url, e))
+                self.finished += 1
+                self.cond.notify_all()
+            return
+        scores().record(host_of(url), time.time() - start)
+        with self.cond:
+            self.finished += 1
+            if self.winner is None and not self.done:
+                self.winner = (url, result)
+                result = None
+            self.cond.notify_all()
+        if result is not None:  # przegrany wyścig albo spóźniony po upływie czasu
+            result[0].close()
+
+def race(urls, attempt, timeout, delay=None, host_failure=lambda e: True):
+    """Wyścig adresów (już posortowanych) o pierwszą odpowiedź: attempt(url) zwraca
+    (odpowiedź, ...) albo zgłasza wyjątek; host_failure(e) - czy błąd obciąża hosta.
+    Zwraca (url, wynik attempt) zwycięzcy albo zgłasza RaceFailed."""
+    if delay is None:
+        delay = get_setting("mirror_race_delay")
+    urls = urls[:MAX_RACERS]
+    state = _Race(attempt, host_failure)
+    if len(urls) == 1:
+        state._run(urls[0])  # bez wyścigu - w bieżącym wątku
+        if state.winner is not None:
+            return state.winner
+        raise RaceFailed(state.errors)
+    deadline = time.time() + timeout + delay * len(urls) + 1
+    pending = list(urls)
+    with state.cond:
+        try:
+            while True:
+                if pending and (state.finished == state.started or not delay):
+                    state.start(pending.pop(0))  # pierwszy adres albo poprzednie już zawiodły
+                    continue
+                if state.winner is not None:
+                    url, result = state.winner
+                    if url != urls[0]:
+                        log("Lustro {} zamiast {}".format(host_of(url), host_of(urls[0])), DEBUG)
+                    return state.winner
+                if not pending and state.finished == state.started:
+                    break
+                now = time.time()
+                if now >= deadline:
+                    failed = [u for u, e in state.errors]
+                    state.errors += [(u, socket.timeout("przekroczony czas")) for u in urls if u not in failed]
+                    break
+                before = state.finished
+                state.cond.wait(min(delay, deadline - now) if pending else deadline - now)
+                if pending and state.winner is None and state.finished == before:
+                    state.start(pending.pop(0))  # najlepszy jeszcze milczy - startuje następny
+        finally:
+            state.done = True
+    raise RaceFailed(sorted(state.errors, key=lambda e: urls.index(e[0])))
@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – klient HTTP w procesie (bez wget)
+#
+#  Połączenia keep-alive trzymane są w puli per (schemat, host, port) i
+#  używane przez kolejne zapytania - bez fork/exec wget i bez nowego
+#  uzgadniania TCP/TLS dla każdego pliku. Odpowiedzi gzip rozpakowywane są
+#  w locie, treść czytana jest strumieniowo. Błędy przejściowe (zerwane
+#  połączenie, 5xx) ponawiane są z rosnącym odstępem; każde zapytanie ma
+#  metryki: bajty, czas do pierwszego bajtu i czas całkowity.
+#
+#  Każde pobranie idzie przez wyścig adresów z modułu mirrors: zasoby
+#  z lustrami pobierane są z najszybciej odpowiadającego hosta, a czasy
+#  odpowiedzi i błędy wszystkich hostów trafiają do ich ocen.
+#
+from __future__ import print_function, absolute_import
+
+import os, re, ssl, time, zlib, socket
+from threading import Lock
+
+try:
+    import httplib as http_client
+    from urlparse import urlsplit, urljoin
+    from urllib import url2pathname
+except ImportError:
+    import http.client as http_client
+    from urllib.parse import urlsplit, urljoin
+    from urllib.request import url2pathname
+
+from . import mirrors
+from .common import log, get_setting, DEBUG, WARNING
+
+USER_AGENT = "MyUpdater/5.1 (Enigma2)"
+CHUNK = 64 * 1024
+MAX_REDIRECTS = 5
+REDIRECTS = (301, 302, 303, 307, 308)
+# Bezczynne połączenie starsze niż tyle sekund jest zamykane (serwery i tak je zrywają)
+IDLE_TIMEOUT = 15
+MAX_IDLE_PER_HOST = 2
+# Tyle treści odpowiedzi błędu/przekierowania jest czytane, żeby połączenie wróciło do puli
+ERROR_BODY_MAX = 64 * 1024
+# Odpowiedzi na HEAD, po których probe() próbuje jeszcze GET (serwery strumieni często nie obsługują HEAD)
+HEAD_UNSUPPORTED = (400, 403, 404, 405, 501)
+PROBE_BYTES = 188  # jeden pakiet MPEG-TS
+# Pliki już skompresowane - bez Accept-Encoding: gzip (serwer z AddEncoding oddałby je "rozpakowane")
+_COMPRESSED_RE = re.compile(r'\.(gz|tgz|zip|ipk|xz|bz2|png|jpg)$', re.I)
+
+class Response(object):
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+class Headers(dict):
+    """Nagłówki odpowiedzi; nazwy małymi literami, get() bez względu na wielkość liter"""
+
+    def __init__(self, items=()):
+        dict.__init__(self, ((k.lower(), v) for k, v in items))
+
+    def get(self, key, default=None):
+        return dict.get(self, key.lower(), default)
+
+    def __getitem__(self, key):
+        return dict.__getitem__(self, key.lower())
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key.lower())
+
+class HTTPError(IOError):
+    """Odpowiedź z kodem >= 300 (także 304 Not Modified); interfejs jak urllib2.HTTPError"""
+
+    def __init__(self, url, code, reason, headers, body=b""):
+        IOError.__init__(self, "HTTP Error {}: {}".format(code, reason))
+        self.url = url
+        self.code = code
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def info(self):
+        return self.headers
+
+    def getcode(self):
+        return self.code
+
+    def geturl(self):
+        return self.url
+
+    def read(self, n=-1):
+        data = self.body if n is None or n < 0 else self.body[:n]
+        self.body = self.body[len(data):]
+        return data
+
+    def close(self):
+        pass
+
+def _ssl_context():
+    # Odpowiednik "wget --no-check-certificate" - stare obrazy mają nieaktualne CA
+    try:
+        return ssl._create_unverified_context()
+    except AttributeError:
+        return None
+
+class ConnectionPool(object):
+    """Bezczynne połączenia keep-alive per (schemat, host, port)"""
+
+    def __init__(self, max_idle=MAX_IDLE_PER_HOST, idle_timeout=IDLE_TIMEOUT):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.lock = Lock()
+        self.idle = {}
+
+    def get(self, key):
+        """Połączenie z puli albo None"""
+        now = time.time()
+        with self.lock:
+            conns = self.idle.get(key, [])
+            while conns:
+                conn, since = conns.pop()
+                if now - since < self.idle_timeout:
+                    return conn
+                conn.close()
+        return None
+
+    def put(self, key, conn):
+        with self.lock:
+            conns = self.idle.setdefault(key, [])
+            if len(conns) < self.max_idle:
+                conns.append((conn, time.time()))
+                return
+        conn.close()
+
+    def clear(self):
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for conns in idle.values():
+            for conn, since in conns:
+                conn.close()
+
+_pool = ConnectionPool()
+_totals_lock = Lock()
+_totals = {"requests": 0, "reused": 0, "bytes": 0, "wire_bytes": 0, "time": 0.0}
+
+def totals():
+    """Suma metryk zapytań tego procesu: requests, reused, bytes, wire_bytes, time"""
+    with _totals_lock:
+        return dict(_totals)
+
+def _connect(scheme, host, port, timeout):
+    connect_timeout = min(timeout, get_setting("http_connect_timeout"))
+    if scheme == "https":
+        ctx = _ssl_context()
+        if ctx is not None:
+            conn = http_client.HTTPSConnection(host, port, timeout=connect_timeout, context=ctx)
+        else:
+            conn = http_client.HTTPSConnection(host, port, timeout=connect_timeout)
+    else:
+        conn = http_client.HTTPConnection(host, port, timeout=connect_timeout)
+    conn.connect()
+    return conn
+
+def _request(url, headers, timeout, method="GET"):
+    """Jedno zapytanie (GET, HEAD); zwraca (odpowiedź httplib, połączenie, klucz puli, czy z puli)"""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("Nieobsługiwany adres: {}".format(url))
+    port = parts.port or (443 if scheme == "https" else 80)
+    key = (scheme, parts.hostname, port)
+    path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+    conn = _pool.get(key)
+    while True:
+        reused = conn is not None
+        if not reused:
+            conn = _connect(scheme, parts.hostname, port, timeout)
+        conn.sock.settimeout(timeout)
+        try:
+            conn.request(method, path, headers=headers)
+            return conn.getresponse(), conn, key, reused
+        except (http_client.HTTPException, socket.error) as e:
+            conn.close()
+            if not reused or isinstance(e, socket.timeout):
+                raise
+            conn = None  # serwer zamknął bezczynne połączenie - od nowa, bez liczenia jako ponowienie
+
+class Stream(object):
+    """Treść odpowiedzi czytana strumieniowo (plikopodobna, jak z urlopen);
+    po przeczytaniu całości połączenie wraca do puli"""
+
+    def __init__(self, url, resp, conn, key, reused, started, decode):
+        self.url = url
+        self.status = resp.status
+        self.reason = resp.reason
+        self.headers = Headers(resp.getheaders())
+        self.resp = resp
+        self.conn = conn
+        self.key = key
+        self.started = started
+        self.decoder = None
+        if decode and self.headers.get("content-encoding", "").lower() == "gzip":
+            self.decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            # Rozmiar po rozpakowaniu nieznany; treść oddawana jest już rozpakowana
+            for name in ("content-encoding", "content-length"):
+                self.headers.pop(name, None)
+        self.buffer = b""
+        self.metrics = {"url": url, "status": self.status, "reused": reused, "bytes": 0, "wire_bytes": 0,
+                        "ttfb": time.time() - started, "time": None}
+
+    def info(self):
+        return self.headers
+
+    def getcode(self):
+        return self.status
+
+    def geturl(self):
+        return self.url
+
+    def _raw(self, n):
+        if self.conn is None:
+            return b""
+        data = self.resp.read(n) if n is not None and n >= 0 else self.resp.read()
+        self.metrics["wire_bytes"] += len(data)
+        if not data or self.resp.isclosed():
+            self._release(True)
+        return data
+
+    def read(self, n=-1):
+        if self.decoder is None and not self.buffer:
+            data = self._raw(n)
+        else:
+            while self.decoder is not None and (n is None or n < 0 or len(self.buffer) < n):
+                raw = self._raw(CHUNK)
+                if raw:
+                    self.buffer += self.decoder.decompress(raw)
+                if self.conn is None:
+                    self.buffer += self.decoder.flush()
+                    self.decoder = None
+            if n is None or n < 0:
+                data, self.buffer = self.buffer, b""
+            else:
+                data, self.buffer = self.buffer[:n], self.buffer[n:]
+        self.metrics["bytes"] += len(data)
+        return data
+
+    def _release(self, complete):
+        conn, self.conn = self.conn, None
+        if conn is None:
+            return
+        if complete and not self.resp.will_close:
+            _pool.put(self.key, conn)
+        else:
+            conn.close()
+        m = self.metrics
+        m["time"] = time.time() - self.started
+        with _totals_lock:
+            _totals["requests"] += 1
+            _totals["reused"] += 1 if m["reused"] else 0
+            for k in ("bytes", "wire_bytes", "time"):
+                _totals[k] += m[k]
+        log("HTTP {} {}: {} B ({} B w sieci), TTFB {:.0f} ms, {:.2f} s{}".format(
+            m["status"], m["url"], m["bytes"], m["wire_bytes"], m["ttfb"] * 1000, m["time"],
+            ", połączenie z puli" if m["reused"] else ""), DEBUG)
+
+    def close(self):
+        if self.conn is not None:
+            self._release(self.resp.isclosed())
+            self.resp.close()
+
+class LocalFile(object):
+    """Zasób file:// (lokalne kopie, benchmarki) z tym samym interfejsem co Stream"""
+
+    def __init__(self, url):
+        path = url2pathname(urlsplit(url).path)
+        self.url = url
+        self.f = open(path, "rb")
+        self.headers = Headers([("Content-Length", str(os.path.getsize(path)))])
+        self.metrics = {"url": url, "status": 200, "reused": False, "bytes": 0, "wire_bytes": 0, "ttfb": 0.0, "time": None}
+
+    def info(self):
+        return self.headers
+
+    def getcode(self):
+        return 200
+
+    def geturl(self):
+        return self.url
+
+    def read(self, n=-1):
+        data = self.f.read() if n is None or n < 0 else self.f.read(n)
+        self.metrics["bytes"] += len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+def _open(url, headers=None, timeout=20, method="GET"):
+    """GET (lub HEAD) z przekierowaniami; odpowiedzi >= 300 (poza przekierowaniami) jako HTTPError"""
+    h = {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip"}
+    h.update(headers or {})
+    for i in range(MAX_REDIRECTS + 1):
+        # Zakres bajtów dotyczy pliku, nie postaci gzip; archiwów nie kompresujemy drugi raz
+        decode = "Range" not in h and not _COMPRESSED_RE.search(urlsplit(url).path)
+        if not decode:
+            h["Accept-Encoding"] = "identity"
+        started = time.time()
+        stream = Stream(url, *(_request(url, h, timeout, method) + (started, decode)))
+        if stream.status in REDIRECTS and stream.headers.get("location"):
+            stream.read(ERROR_BODY_MAX)
+            stream.close()
+            url = urljoin(url, stream.headers["location"])
+            continue
+        if stream.status >= 300:
+            body = stream.read(ERROR_BODY_MAX)
+            stream.close()
+            raise HTTPError(url, stream.status, stream.reason, stream.headers, body)
+        return stream
+    raise HTTPError(url, stream.status, "zbyt wiele przekierowań", stream.headers)
+
+class Prefetched(object):
+    """Odpowiedź, z której wyścig przeczytał już pierwsze bajty; read() oddaje je na początku"""
+
+    def __init__(self, resp, first, url):
+        self.resp = resp
+        self.first = first
+        self.url = url  # adres, który wygrał wyścig
+
+    def read(self, n=-1):
+        if not self.first:
+            return self.resp.read(n)
+        if n is None or n < 0:
+            data, self.first = self.first + self.resp.read(), b""
+            return data
+        data, self.first = self.first[:n], self.first[n:]
+        if len(data) < n:
+            data += self.resp.read(n - len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.resp, name)
+
+def _host_failure(e):
+    """Błąd połączenia lub serwera obciąża ocenę hosta; 4xx dotyczy tylko zasobu"""
+    return not isinstance(e, HTTPError) or e.code >= 500
+
+def _transient(e):
+    """Błąd, który warto ponowić: zerwane/odrzucone połączenie, 5xx, 429. Po przekroczeniu
+    czasu nie ponawiamy - budżet czasu wywołującego już minął."""
+    if isinstance(e, HTTPError):
+        return e.code >= 500 or e.code == 429
+    if isinstance(e, socket.timeout):
+        return False
+    return isinstance(e, (IOError, OSError, http_client.HTTPException))
+
+def open_url(url, headers=None, timeout=20, use_mirrors=True):
+    """Otwiera zasób do czytania strumieniowego (obiekt plikopodobny z .info() i .metrics);
+    use_mirrors=False - tylko podany adres (np. kolejne zapytania Range do tego samego pliku)"""
+
+    def attempt(u):
+        try:
+            resp = _open(u, headers, timeout)
+        except HTTPError as e:
+            if e.code == 304:
+                return e, b""
+            raise
+        try:
+            return resp, resp.read(1)
+        except Exception:
+            resp.close()
+            raise
+
+    if url.startswith("file:"):
+        return LocalFile(url)
+    retries, backoff = get_setting("http_retries"), get_setting("http_retry_backoff")
+    for retry in range(retries + 1):
+        urls = mirrors.scores().order(mirrors.candidates(url)) if use_mirrors else [url]
+        try:
+            winner, (resp, first) = mirrors.race(urls, attempt, timeout, host_failure=_host_failure)
+            break
+        except mirrors.RaceFailed as e:
+            errors = [err for u, err in e.errors if u == url] or [err for u, err in e.errors]
+            if retry == retries or not _transient(errors[0]):
+                raise errors[0]  # błąd oryginalnego adresu, jak bez luster
+            delay = backoff * 2 ** retry
+            log("Pobieranie {}: {} - ponowienie za {:.1f} s".format(url, errors[0], delay), WARNING)
+            time.sleep(delay)
+    if isinstance(resp, HTTPError):
+        raise resp
+    return Prefetched(resp, first, winner)
+
+def fetch(url, headers=None, timeout=20, use_mirrors=True):
+    """Pobiera zasób; odpowiedź 304 (Not Modified) zwracana jest jako Response, nie jako wyjątek"""
+    try:
+        resp = open_url(url, headers, timeout, use_mirrors)
+        try:
+            return Response(resp.getcode(), dict(resp.info()), resp.read())
+        finally:
+            resp.close()
+    except HTTPError as e:
+        if e.code == 304:
+            return Response(304, dict(e.info()), b"")
+        raise
+
+def probe(url, timeout=5):
+    """Czy zasób odpowiada: HEAD, a gdy serwer go nie obsługuje - GET i pierwsze bajty treści.
+    Zwraca kod HTTP odpowiedzi (>= 400 także bez wyjątku); błędy połączenia jako wyjątek.
+    Bez ponowień i luster - to pomiar konkretnego adresu."""
+    headers = {"Accept-Encoding": "identity"}
+    try:
+        resp = _open(url, headers, timeout, "HEAD")
+        resp.read()
+        resp.close()
+        return resp.status
+    except HTTPError as e:
+        if e.code not in HEAD_UNSUPPORTED:
+            return e.code
+    try:
+        resp = _open(url, headers, timeout)
+    except HTTPError as e:
+        return e.code
+    try:
+        # Strumień na żywo nie ma końca - wystarczy, że zaczął płynąć
+        if not resp.read(PROBE_BYTES):
+            raise IOError("Pusta odpowiedź")
+        return resp.status
+    finally:
+        resp.close()
+
+def download(url, dest=None, callback=None, progress=None, headers=None, timeout=30):
+    """Pobiera zasób strumieniowo do pliku `dest` (przez dest.part) i/lub do callback(fragment);
+    progress(pobrane, całość lub None). Zwraca metryki zapytania."""
+    resp = open_url(url, headers, timeout)
+    f = open(dest + ".part", "wb") if dest else None
+    try:
+        total, done = content_length(resp), 0
+        for chunk in iter(lambda: resp.read(CHUNK), b""):
+            if f:
+                f.write(chunk)
+            if callback:
+                callback(chunk)
+            done += len(chunk)
+            if progress:
+                progress(done, total)
+        if f:
+            f.close()
+            os.rename(dest + ".part", dest)
+    finally:
+        resp.close()
+        if f and not f.closed:
+            f.close()
+            os.remove(dest + ".part")
+    return resp.metrics
+
+def content_length(resp):
+    try:
+        return int(resp.info().get("Content-Length"))
+    except (TypeError, ValueError):
+        return None
+
+def conditional_headers(meta):
+    """Nagłówki If-None-Match / If-Modified-Since na podstawie zapisanych ETag/Last-Modified"""
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
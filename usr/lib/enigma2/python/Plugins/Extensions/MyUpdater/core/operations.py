@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – historia operacji z czasami etapów
+#
+#  Operacja (instalacja listy, kolejka, pobranie źródeł) zbiera odcinki
+#  czasu (span) dla kolejnych etapów: pobieranie, parsowanie, rozpakowanie,
+#  zapis bukietów, przeładowanie eDVBDB. Po zakończeniu trafia do
+#  operations.json (ostatnie HISTORY_KEEP) i do logu jako jeden wiersz
+#  podsumowania - widok "Ostatnie operacje" pokazuje, gdzie poszedł czas.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, json, time
+from contextlib import contextmanager
+from threading import Lock
+
+from .common import log, flush_log, ensure_dir, DATA_PATH, DEBUG, INFO, ERROR
+
+HISTORY_FILE = os.path.join(DATA_PATH, "operations.json")
+HISTORY_KEEP = 30
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+STATUS_CANCELLED = "cancelled"
+
+STAGE_NAMES = {
+    "fetch": "Pobieranie źródła",
+    "parse": "Parsowanie",
+    "probe": "Sprawdzanie strumieni",
+    "backup": "Kopia zapasowa",
+    "download": "Pobieranie",
+    "verify": "Sprawdzanie rozmiaru i sumy kontrolnej",
+    "update_files": "Pobieranie zmienionych plików wtyczki",
+    "swap": "Podmiana plików wtyczki",
+    "extract": "Rozpakowanie",
+    "diff": "Porównanie z zainstalowanymi",
+    "install": "Instalacja plików",
+    "index": "Odczyt spisu archiwum",
+    "sync": "Zapis zmienionych plików",
+    "cleanup": "Usuwanie nieaktualnych plików",
+    "optimize": "Dopasowanie picon do skórki",
+    "check": "Sprawdzanie kanałów w lamedb",
+    "cache": "Rozpakowanie z pamięci podręcznej",
+    "bouquets": "Zapis bouquets.tv",
+    "reload_services": "Przeładowanie lamedb (eDVBDB)",
+    "reload_bouquets": "Przeładowanie bukietów (eDVBDB)",
+    "reload": "Przeładowanie list (OpenWebif)",
+}
+
+_history_lock = Lock()
+
+class Operation(object):
+    """Jedna operacja i jej etapy [(etap, sekundy, etykieta)]; etapy mogą być dodawane z wielu wątków"""
+
+    def __init__(self, kind, title):
+        self.kind = kind
+        self.title = title
+        self.started = time.time()
+        self.spans = []
+        self.finished = False
+        self.lock = Lock()
+
+    @contextmanager
+    def span(self, stage, label=""):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(stage, time.time() - start, label)
+
+    def add(self, stage, seconds, label=""):
+        with self.lock:
+            self.spans.append((stage, seconds, label))
+        log("{}: {}{} {:.2f} s".format(self.title, stage, " [{}]".format(label) if label else "", seconds), DEBUG)
+
+    def add_timings(self, timings, label=""):
+        """Dołącza czasy etapów z archive.Progress.finish()"""
+        for stage, seconds in timings:
+            self.add(stage, seconds, label)
+
+    def finish(self, error=None, status=None, detail=""):
+        """Zamyka operację i zapisuje ją w historii (kolejne wywołania są ignorowane)"""
+        with self.lock:
+            if self.finished:
+                return
+            self.finished = True
+            spans = list(self.spans)
+        status = status or (STATUS_ERROR if error is not None else STATUS_OK)
+        record = {"kind": self.kind, "title": self.title, "started": self.started,
+                  "duration": time.time() - self.started, "status": status,
+                  "detail": str(error) if error is not None else detail,
+                  "spans": [[s, round(t, 3), l] for s, t, l in spans]}
+        log("Operacja '{}' ({}): {} w {:.2f} s - {}".format(
+                self.title, self.kind, status, record["duration"],
+                ", ".join("{} {:.2f} s".format(s, t) for s, t, share in breakdown(record)) or "brak etapów"),
+            ERROR if status == STATUS_ERROR else INFO)
+        try:
+            _append(record)
+        except (IOError, OSError, ValueError) as e:
+            log("Nie można zapisać historii operacji: {}".format(e), ERROR)
+        flush_log()
+
+def format_spans(spans, sep="\n"):
+    return sep.join("{}{}: {:.1f} s".format(STAGE_NAMES.get(s, s), " ({})".format(l) if l else "", t)
+                    for s, t, l in spans)
+
+def recent(path=HISTORY_FILE):
+    """Zapisane operacje, od najnowszej"""
+    try:
+        with io.open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("operations", [])
+    except (IOError, OSError, ValueError):
+        return []
+
+def _append(record, path=HISTORY_FILE):
+    with _history_lock:
+        operations = ([record] + recent(path))[:HISTORY_KEEP]
+        ensure_dir(os.path.dirname(path))
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps({"operations": operations}, sort_keys=True).encode("utf-8"))
+        os.rename(tmp, path)
+
+def breakdown(record):
+    """Etapy operacji zsumowane po rodzaju, od najdłuższego: [(etap, sekundy, udział %)].
+    Etapy kolejki wykonywane równolegle mogą dawać łącznie więcej niż czas operacji."""
+    totals = {}
+    for stage, seconds, label in record.get("spans", []):
+        totals[stage] = totals.get(stage, 0) + seconds
+    whole = sum(totals.values()) or 1
+    return sorted(((s, t, 100.0 * t / whole) for s, t in totals.items()), key=lambda x: -x[1])
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – indeks pakietów opkg bez uruchamiania opkg
+#
+#  Czyta listy feedów (/var/lib/opkg/lists/*) i plik status bezpośrednio.
+#  Każdy plik parsowany jest tylko wtedy, gdy zmienił się jego mtime lub
+#  rozmiar; wyniki trzymane są w pamięci i w pliku w katalogu tymczasowym,
+#  więc kolejne wyszukiwania (także z CLI) trwają milisekundy zamiast
+#  sekund potrzebnych na `opkg list | grep`.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, re, gzip, json, time, bisect
+from threading import Lock
+
+from .common import log, ensure_dir, OPKG_DIR, PLUGIN_TMP_PATH, WARNING
+
+LISTS_DIR = os.path.join(OPKG_DIR, "lists")
+STATUS_FILE = os.path.join(OPKG_DIR, "status")
+CACHE_FILE = os.path.join(PLUGIN_TMP_PATH, "opkg_index.json")
+# Starsze listy feedów odświeżane są przed wyborem pakietu (opkg update)
+LISTS_MAX_AGE = 24 * 3600
+
+# --- porównywanie wersji (algorytm dpkg/opkg) ---
+
+def _order(c):
+    if c.isdigit():
+        return 0
+    if c.isalpha():
+        return ord(c)
+    if c == "~":
+        return -1
+    return ord(c) + 256
+
+def _compare_part(a, b):
+    i = j = 0
+    while i < len(a) or j < len(b):
+        while (i < len(a) and not a[i].isdigit()) or (j < len(b) and not b[j].isdigit()):
+            ac = _order(a[i]) if i < len(a) else 0
+            bc = _order(b[j]) if j < len(b) else 0
+            if ac != bc:
+                return ac - bc
+            i += 1
+            j += 1
+        while i < len(a) and a[i] == "0":
+            i += 1
+        while j < len(b) and b[j] == "0":
+            j += 1
+        first_diff = 0
+        while i < len(a) and a[i].isdigit() and j < len(b) and b[j].isdigit():
+            if not first_diff:
+                first_diff = ord(a[i]) - ord(b[j])
+            i += 1
+            j += 1
+        if i < len(a) and a[i].isdigit():
+            return 1
+        if j < len(b) and b[j].isdigit():
+            return -1
+        if first_diff:
+            return first_diff
+    return 0
+
+def parse_version(version):
+    """"[epoka:]wersja[-rewizja]" -> (epoka, wersja, rewizja)"""
+    epoch = 0
+    head, sep, rest = version.partition(":")
+    if sep and head.isdigit():
+        epoch, version = int(head), rest
+    upstream, sep, revision = version.rpartition("-")
+    if not sep:
+        upstream, revision = version, ""
+    return epoch, upstream, revision
+
+def compare_versions(a, b):
+    """Porównanie wersji jak w opkg: <0, 0, >0"""
+    ea, ua, ra = parse_version(a)
+    eb, ub, rb = parse_version(b)
+    if ea != eb:
+        return ea - eb
+    return _compare_part(ua, ub) or _compare_part(ra, rb)
+
+# --- parsowanie ---
+
+def parse_packages(text, status=False):
+    """Stanze pliku Packages/status -> [[nazwa, wersja, arch, opis]];
+    dla pliku status tylko pakiety zainstalowane"""
+    packages = []
+    name = version = arch = desc = state = None
+    for line in text.splitlines() + [""]:
+        if not line:
+            if name and (not status or (state and " installed" in state and "not-installed" not in state)):
+                packages.append([name, version or "", arch or "", desc or ""])
+            name = version = arch = desc = state = None
+        elif line.startswith("Package:"):
+            name = line[8:].strip()
+        elif line.startswith("Version:"):
+            version = line[8:].strip()
+        elif line.startswith("Architecture:"):
+            arch = line[13:].strip()
+        elif line.startswith("Description:"):
+            desc = line[12:].strip()[:80]
+        elif line.startswith("Status:"):
+            state = line[7:]
+    return packages
+
+def _read_text(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:2] == b"\x1f\x8b":  # listy zapisane jako .gz (opcja list_compressed)
+        data = gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+    return data.decode("utf-8", "ignore")
+
+class PackageIndex(object):
+    """Dostępne (najwyższa wersja z feedów) i zainstalowane pakiety, z wyszukiwaniem po prefiksie i regex"""
+
+    def __init__(self, available, installed):
+        self.available = available  # nazwa -> (wersja, arch, feed, opis)
+        self.installed = installed  # nazwa -> (wersja, arch)
+        self.names = sorted(set(available) | set(installed))
+
+    def prefix(self, prefix):
+        start = bisect.bisect_left(self.names, prefix)
+        end = bisect.bisect_left(self.names, prefix + u"\uffff")
+        return self.names[start:end]
+
+    def search(self, pattern):
+        rx = re.compile(pattern, re.I)
+        return [n for n in self.names if rx.search(n)]
+
+    def info(self, name):
+        """Słownik z wersją dostępną i zainstalowaną pakietu"""
+        version, arch, feed, desc = self.available.get(name, ("", "", "", ""))
+        installed = self.installed.get(name)
+        return {"name": name, "version": version, "arch": arch or (installed[1] if installed else ""),
+                "feed": feed, "description": desc, "installed": installed[0] if installed else None,
+                "upgradable": bool(installed and version and compare_versions(version, installed[0]) > 0)}
+
+_lock = Lock()
+_parsed = None  # ścieżka -> [mtime, rozmiar, pakiety]
+_index = None
+_signature = None
+
+def _load_cache(path):
+    try:
+        with io.open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+def _save_cache(path, parsed):
+    try:
+        ensure_dir(os.path.dirname(path))
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(parsed).encode("utf-8"))
+        os.rename(tmp, path)
+    except (IOError, OSError) as e:
+        log("Nie można zapisać indeksu opkg: {}".format(e), WARNING)
+
+def _files(lists_dir, status_file):
+    files = []
+    if os.path.isdir(lists_dir):
+        files = [os.path.join(lists_dir, n) for n in sorted(os.listdir(lists_dir))]
+    if os.path.exists(status_file):
+        files.append(status_file)
+    return files
+
+def lists_age(lists_dir=LISTS_DIR):
+    """Wiek (s) najnowszej listy feedu albo None, gdy list nie ma (nie było opkg update)"""
+    try:
+        mtimes = [os.path.getmtime(os.path.join(lists_dir, n)) for n in os.listdir(lists_dir)]
+    except OSError:
+        return None
+    return time.time() - max(mtimes) if mtimes else None
+
+def load_index(lists_dir=LISTS_DIR, status_file=STATUS_FILE, cache_path=CACHE_FILE):
+    """Indeks pakietów; przy niezmienionych plikach zwracany z pamięci bez czytania list"""
+    global _parsed, _index, _signature
+    with _lock:
+        stats = []
+        for path in _files(lists_dir, status_file):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if os.path.isfile(path):
+                stats.append((path, int(st.st_mtime), st.st_size))
+        signature = tuple(stats)
+        if _index is not None and signature == _signature:
+            return _index
+
+        start = time.time()
+        if _parsed is None:
+            _parsed = _load_cache(cache_path)
+        parsed, changed = {}, 0
+        for path, mtime, size in stats:
+            cached = _parsed.get(path)
+            if cached and cached[0] == mtime and cached[1] == size:
+                parsed[path] = cached
+                continue
+            try:
+                parsed[path] = [mtime, size, parse_packages(_read_text(path), path == status_file)]
+                changed += 1
+            except (IOError, OSError, ValueError) as e:
+                log("Nie można odczytać listy opkg {}: {}".format(path, e), WARNING)
+        if changed or len(parsed) != len(_parsed):
+            _save_cache(cache_path, parsed)
+        _parsed = parsed
+
+        available, installed = {}, {}
+        for path, (mtime, size, packages) in parsed.items():
+            if path == status_file:
+                for name, version, arch, desc in packages:
+                    installed[name] = (version, arch)
+                continue
+            feed = os.path.basename(path)
+            for name, version, arch, desc in packages:
+                best = available.get(name)
+                if best is None or compare_versions(version, best[0]) > 0:
+                    available[name] = (version, arch, feed, desc)
+        _index, _signature = PackageIndex(available, installed), signature
+        log("Indeks opkg: {} dostępnych, {} zainstalowanych, przeczytano {} z {} plików w {:.3f} s".format(
+            len(available), len(installed), changed, len(stats), time.time() - start))
+        return _index
+
+# --- softcamy ---
+
+SOFTCAM_SKIP_RE = re.compile(r'-(dbg|dev|doc|src|staticdev|webif|locale(-.*)?|config(-.*)?)$')
+# Preferowane warianty (jak dawne grep 'oscam.*ipv4only' | grep -E 'master|emu|stable')
+SOFTCAM_BONUS = (("ipv4only", 8), ("master", 4), ("emu", 2), ("stable", 1))
+
+def _softcam_re(cams):
+    return re.compile(r'(?:^|[-_.])(?:{})(?:[-_.]|$)'.format("|".join(re.escape(c) for c in cams)))
+
+def installed_softcams(index, cams=("oscam", "ncam")):
+    """Zainstalowane pakiety softcamów: [(nazwa, wersja)]"""
+    rx = _softcam_re(cams)
+    return sorted((name, v[0]) for name, v in index.installed.items()
+                  if rx.search(name) and not SOFTCAM_SKIP_RE.search(name))
+
+def softcam_candidates(index, cams=("oscam", "ncam"), limit=10):
+    """Pakiety softcamów z feedów, od najlepiej pasującego: [info + "score"]"""
+    rx = _softcam_re(cams)
+    found = []
+    for name in index.available:
+        if not rx.search(name) or SOFTCAM_SKIP_RE.search(name):
+            continue
+        score = sum(bonus for word, bonus in SOFTCAM_BONUS if word in name)
+        if name.startswith("enigma2-plugin-softcams-"):
+            score += 3
+        info = index.info(name)
+        info["score"] = score
+        found.append(info)
+    found.sort(key=lambda i: (-i["score"], len(i["name"]), i["name"]))
+    return found[:limit]
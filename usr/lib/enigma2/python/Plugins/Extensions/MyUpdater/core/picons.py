@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – przyrostowa synchronizacja picon
+#
+#  Indeks zainstalowanych picon (nazwa -> rozmiar, CRC z katalogu centralnego
+#  zip) pozwala zapisać na flash tylko nowe i zmienione pliki. Katalog
+#  centralny czytany jest zapytaniami HTTP Range, więc gdy nic się nie
+#  zmieniło, pobierane są tylko kilobajty końca archiwum. Gdy zmieniła się
+#  większość paczki, zmienione pliki rozpakowywane są w locie z jednego
+#  strumienia całego archiwum (bez zapisu archiwum w /tmp). Tylko serwer bez
+#  Range wymaga pobrania archiwum modułem download (wznawianie, segmenty,
+#  kontrola rozmiaru i SHA-256 z manifestu).
+#  Na końcu picony dopasowywane są do rozmiaru z aktywnej skórki (moduł
+#  piconsize); indeks pamięta, dla jakiego rozmiaru przetworzono picon o danym
+#  CRC, więc niezmienione picony nie są przetwarzane drugi raz.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, json, hashlib, zipfile
+
+from . import net, ledger, download, piconsize
+from .archive import CHUNK, Progress, ZipStreamUnsupported, write_member, extract_zip_stream
+from .common import log, ensure_dir, get_setting, DATA_PATH, PLUGIN_TMP_PATH
+
+PICON_DIR = "/usr/share/enigma2/picon"
+INDEX_FILE = os.path.join(DATA_PATH, "picon_index.json")
+# Powyżej tej części archiwum do pobrania taniej jest czytać je w całości strumieniowo
+STREAM_RATIO = 0.5
+
+class RangeUnsupported(Exception):
+    pass
+
+class HTTPRangeFile(object):
+    """Plik tylko do odczytu z dostępem swobodnym przez zapytania HTTP Range"""
+
+    def __init__(self, url, timeout=30, block=CHUNK, max_segments=4):
+        self.url = url
+        self.timeout = timeout
+        self.block = block
+        self.max_segments = max_segments
+        self.segments = []  # [(początek, dane)], ostatnio używane na końcu
+        self.pos = 0
+        self.requests = 0
+        self.fetched = 0
+        # Końcówka pliku od razu: zawiera katalog centralny i podaje rozmiar całości
+        start, data, self.size = self._get("bytes=-{}".format(block))
+        self._remember(start, data)
+
+    def _get(self, byte_range):
+        # Pierwsze zapytanie wybiera lustro, kolejne idą do niego - fragmenty z jednej kopii pliku
+        resp = net.open_url(self.url, {"Range": byte_range}, self.timeout, use_mirrors=not self.requests)
+        self.url = resp.url
+        try:
+            if resp.getcode() != 206:
+                raise RangeUnsupported(self.url)
+            content_range = resp.info().get("Content-Range", "")  # bytes a-b/rozmiar
+            span, size = content_range.split(" ", 1)[-1].split("/")
+            data = resp.read()
+        finally:
+            resp.close()
+        self.requests += 1
+        self.fetched += len(data)
+        return int(span.split("-")[0]), data, int(size)
+
+    def _remember(self, start, data):
+        self.segments.append((start, data))
+        if len(self.segments) > self.max_segments:
+            self.segments.pop(0)
+
+    def _segment(self, pos):
+        for i, (start, data) in enumerate(self.segments):
+            if start <= pos < start + len(data):
+                if i != len(self.segments) - 1:
+                    self.segments.append(self.segments.pop(i))
+                return start, data
+        end = min(pos + self.block, self.size) - 1
+        start, data, _ = self._get("bytes={}-{}".format(pos, end))
+        self._remember(start, data)
+        return start, data
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += self.size
+        self.pos = max(0, offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = self.size - self.pos
+        parts = []
+        while n > 0 and self.pos < self.size:
+            start, data = self._segment(self.pos)
+            piece = data[self.pos - start:self.pos - start + n]
+            parts.append(piece)
+            self.pos += len(piece)
+            n -= len(piece)
+        return b"".join(parts)
+
+    def close(self):
+        self.segments = []
+
+class PiconIndex(object):
+    """Spis zainstalowanych picon: nazwa -> [rozmiar, crc] z paczki, po dopasowaniu do skórki
+    dodatkowo rozmiar pliku na flashu i rozmiar obrazu ("220x132")"""
+
+    def __init__(self, path=INDEX_FILE):
+        self.path = path
+        self.files = {}
+        try:
+            with io.open(path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+        except (IOError, OSError, ValueError):
+            pass
+
+    def is_current(self, name, size, crc, picon_dir):
+        entry = self.files.get(name)
+        if not entry or entry[0] != size or entry[1] != crc:
+            return False
+        try:
+            return os.path.getsize(os.path.join(picon_dir, name)) == (entry[2] if len(entry) > 2 else size)
+        except OSError:
+            return False
+
+    def save(self):
+        ensure_dir(os.path.dirname(self.path))
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps({"files": self.files}, sort_keys=True).encode("utf-8"))
+        os.rename(tmp, self.path)
+
+def _picon_name(name):
+    base = os.path.basename(name)
+    if base.lower().endswith(".png"):
+        return base
+
+def _spool(url, progress, size=None, sha256=None):
+    """Pobiera całe archiwum do katalogu tymczasowego (z wznawianiem i kontrolą); zwraca ścieżkę"""
+    ensure_dir(PLUGIN_TMP_PATH)
+    spool = os.path.join(PLUGIN_TMP_PATH, "picons_" + hashlib.sha1(url.encode("utf-8")).hexdigest()[:12] + ".zip")
+    download.fetch(url, spool, size=size, sha256=sha256, progress=progress)
+    return spool
+
+def _open_archive(url, progress, size=None, sha256=None):
+    """Zwraca (plik z dostępem swobodnym, ścieżka bufora lub None)"""
+    try:
+        remote = HTTPRangeFile(url)
+        log("Picony: odczyt przez HTTP Range, archiwum {} B".format(remote.size))
+        if size is not None and remote.size != int(size):
+            raise download.IntegrityError("Archiwum picon ma {} B, manifest podaje {} B".format(remote.size, size))
+        return remote, None
+    except RangeUnsupported:
+        log("Picony: serwer nie obsługuje Range, pobieram całe archiwum")
+    spool = _spool(url, progress, size, sha256)
+    progress.stage("index")
+    return open(spool, "rb"), spool
+
+def _stream_changed(url, picon_dir, names):
+    def select(name):
+        name = _picon_name(name)
+        if name in names:
+            return os.path.join(picon_dir, name)
+    resp = net.open_url(url, timeout=30, use_mirrors=False)  # to samo lustro co katalog centralny
+    try:
+        extract_zip_stream(resp, select)
+    finally:
+        resp.close()
+
+def describe(stats):
+    txt = "zapisano {written}, bez zmian {unchanged}, usunięto {removed}".format(**stats)
+    if stats.get("optimized"):
+        txt += ", dopasowano do skórki {} ({:+.0f} KB, {:.1f} s)".format(
+            stats["optimized"], -stats["saved"] / 1024.0, stats["optimize_time"])
+    return txt
+
+def optimize_picons(index, picon_dir=PICON_DIR, progress=None, size=None):
+    """Dopasowuje do rozmiaru skórki picony z indeksu, które nie były jeszcze dla niego
+    przetworzone; zwraca statystykę (optimized, saved, optimize_time) i uzupełnia indeks"""
+    stats = {"optimized": 0, "saved": 0, "optimize_time": 0.0}
+    if not get_setting("picon_optimize"):
+        return stats
+    if not piconsize.available():
+        log("Picony: brak modułu Pillow (python-pillow) - dopasowanie do skórki pominięte")
+        return stats
+    size = size or piconsize.target_size()
+    if size is None:
+        log("Picony: nie wykryto rozmiaru picon w skórce (ustawienie picon_size) - dopasowanie pominięte")
+        return stats
+    target = piconsize.format_size(size)
+    todo = [(name, entry[1]) for name, entry in sorted(index.files.items())
+            if (len(entry) < 4 or entry[3] != target) and os.path.exists(os.path.join(picon_dir, name))]
+    if not todo:
+        return stats
+    if progress:
+        progress.stage("optimize")
+    results, fitted = piconsize.fit_all(todo, size, picon_dir, progress=progress.update if progress else None,
+                                        cancelled=progress.cancelled if progress else None)
+    for name, disk_size in results.items():
+        index.files[name] = index.files[name][:2] + [disk_size, target]
+    stats.update(optimized=len(results), saved=fitted["saved"], optimize_time=fitted["time"])
+    return stats
+
+def sync_picons(url, progress=None, picon_dir=PICON_DIR, remove_orphans=None, index_path=INDEX_FILE, version="", title="",
+                sha256=None, size=None):
+    """Zapisuje tylko nowe/zmienione picony i zapisuje paczkę w rejestrze; zwraca słownik ze statystyką.
+    sha256/size z manifestu sprawdzane są przy pobraniu całego archiwum (rozmiar także przy Range)."""
+    progress = progress or Progress()
+    if remove_orphans is None:
+        remove_orphans = get_setting("picon_remove_orphans")
+    ensure_dir(picon_dir)
+    index = PiconIndex(index_path)
+    stats = {"written": 0, "unchanged": 0, "removed": 0, "bytes": 0}
+
+    progress.stage("index")
+    fileobj, spool = _open_archive(url, progress, size, sha256)
+    try:
+        with zipfile.ZipFile(fileobj) as zf:
+            wanted, changed = {}, []
+            for info in zf.infolist():
+                name = _picon_name(info.filename)
+                if not name:
+                    continue
+                wanted[name] = [info.file_size, info.CRC]
+                if index.is_current(name, info.file_size, info.CRC, picon_dir):
+                    stats["unchanged"] += 1
+                else:
+                    changed.append((name, info))
+
+            progress.stage("sync")
+            to_fetch = sum(info.compress_size for name, info in changed)
+            remote = spool is None
+            streamed = False
+            if remote and to_fetch > fileobj.size * STREAM_RATIO:
+                log("Picony: zmieniono {} plików ({} B), pobieram archiwum strumieniowo".format(len(changed), to_fetch))
+                try:
+                    _stream_changed(fileobj.url, picon_dir, set(name for name, info in changed))
+                    streamed = True
+                except ZipStreamUnsupported as e:
+                    log("Picony: {}, pobieram zmienione pliki pojedynczo".format(e))
+            for i, (name, info) in enumerate(changed):
+                if not streamed:
+                    with zf.open(info) as src:
+                        write_member(iter(lambda: src.read(CHUNK), b""), os.path.join(picon_dir, name))
+                index.files[name] = wanted[name]
+                stats["bytes"] += info.file_size
+                progress.update(i + 1, len(changed))
+            stats["written"] = len(changed)
+            if remote:
+                log("Picony: {} zapytań Range, pobrano {} B".format(fileobj.requests, fileobj.fetched))
+    finally:
+        fileobj.close()
+        if spool:
+            os.remove(spool)
+
+    stats.update(optimize_picons(index, picon_dir, progress))
+
+    progress.stage("cleanup")
+    for name in list(index.files):
+        if name in wanted or not remove_orphans:
+            continue
+        try:
+            os.remove(os.path.join(picon_dir, name))
+            stats["removed"] += 1
+        except OSError:
+            pass
+        del index.files[name]
+    index.save()
+    # Skrót spisu paczki (nazwy, rozmiary, CRC) - bez pobierania całego archiwum
+    stats["hash"] = hashlib.sha1(json.dumps(wanted, sort_keys=True).encode("utf-8")).hexdigest()
+    ledger.record(url, version, stats["hash"], "picon", title)
+
+    log("Picony: {} ({} B)".format(describe(stats), stats["bytes"]))
+    return stats
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – dopasowanie picon do rozmiaru z aktywnej skórki
+#
+#  Paczki picon bywają w rozmiarze większym niż wyświetlany przez skórkę,
+#  a GUI skaluje każdą ikonę przy każdym odrysowaniu listy kanałów. Po
+#  synchronizacji picony zmniejszane są (z zachowaniem proporcji) do
+#  największego pola Picon aktywnej skórki i zapisywane ponownie z pełną
+#  kompresją PNG - równolegle, zadaniami wspólnej puli (Pillow zwalnia GIL
+#  przy skalowaniu i kompresji). Identyczne picony (ten sam CRC w paczce,
+#  np. kanał SD i HD) przetwarzane są raz. Pillow jest opcjonalny - bez
+#  niego etap jest pomijany.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, re, time, shutil
+from threading import Lock
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from . import tasks
+from .common import log, get_setting, E2_DIR, WARNING
+
+SKIN_DIR = "/usr/share/enigma2"
+DEFAULT_SKIN = "skin.xml"
+_PRIMARY_SKIN_RE = re.compile(r'^config\.skin\.primary_skin=(.+)$', re.M)
+# Pola picon w skórkach: render="Picon", "XPicon", "PiconUni"...
+_PICON_WIDGET_RE = re.compile(r'<widget\b[^>]*\brender="\w*Picon\w*"[^>]*>', re.I)
+_SIZE_RE = re.compile(r'\bsize="(\d+)\s*,\s*(\d+)"')
+_TARGET_RE = re.compile(r'^\s*(\d+)\s*[x,]\s*(\d+)\s*$')
+
+def available():
+    return Image is not None
+
+def format_size(size):
+    return "{}x{}".format(*size)
+
+def parse_size(text):
+    """"220x132" -> (220, 132); puste lub błędne -> None"""
+    m = _TARGET_RE.match(text or "")
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+def active_skin(e2_dir=E2_DIR, skin_dir=SKIN_DIR):
+    """Ścieżka skin.xml aktywnej skórki (config.skin.primary_skin z ustawień Enigma2) albo None"""
+    skin = DEFAULT_SKIN
+    try:
+        with io.open(os.path.join(e2_dir, "settings"), "r", encoding="utf-8", errors="ignore") as f:
+            m = _PRIMARY_SKIN_RE.search(f.read())
+        if m:
+            skin = m.group(1).strip()
+    except (IOError, OSError):
+        pass
+    path = os.path.join(skin_dir, skin)
+    return path if os.path.isfile(path) else None
+
+def skin_picon_size(skin_path):
+    """Największe pole Picon w plikach XML katalogu skórki (skin.xml i dołączane) albo None"""
+    best = None
+    skin_root = os.path.dirname(skin_path)
+    for name in sorted(os.listdir(skin_root)):
+        if not name.lower().endswith(".xml"):
+            continue
+        try:
+            with io.open(os.path.join(skin_root, name), "r", encoding="utf-8", errors="ignore") as f:
+                text = f.read()
+        except (IOError, OSError):
+            continue
+        for widget in _PICON_WIDGET_RE.findall(text):
+            m = _SIZE_RE.search(widget)
+            if m:
+                size = (int(m.group(1)), int(m.group(2)))
+                if best is None or size[0] * size[1] > best[0] * best[1]:
+                    best = size
+    return best
+
+def target_size(e2_dir=E2_DIR, skin_dir=SKIN_DIR):
+    """Rozmiar picon: picon_size z ustawień ("220x132") albo wykryty ze skórki; None - nieznany"""
+    size = parse_size(get_setting("picon_size"))
+    if size:
+        return size
+    skin = active_skin(e2_dir, skin_dir)
+    return skin_picon_size(skin) if skin else None
+
+def _resample():
+    for name in ("LANCZOS", "ANTIALIAS"):
+        if hasattr(Image, name):
+            return getattr(Image, name)
+    return Image.Resampling.LANCZOS
+
+def fit(path, size):
+    """Zmniejsza picon do `size` (z zachowaniem proporcji) i kompresuje ponownie; plik podmieniany
+    jest tylko, gdy jest mniejszy lub został przeskalowany. Zwraca (rozmiar pliku, czy podmieniony)."""
+    before = os.path.getsize(path)
+    img = Image.open(path)
+    img.load()
+    width, height = img.size
+    scale = min(float(size[0]) / width, float(size[1]) / height)
+    resized = scale < 1
+    if resized:
+        palette = img.mode == "P"
+        if img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA")  # paleta z przezroczystością - skalowanie w pełnym kolorze
+        img = img.resize((max(1, int(round(width * scale))), max(1, int(round(height * scale)))), _resample())
+        if palette:
+            # Z powrotem do palety jak w paczce - kilkakrotnie mniejszy plik niż RGBA
+            img = img.quantize(256, getattr(Image, "FASTOCTREE", 2))
+    tmp = path + ".fit"
+    try:
+        img.save(tmp, "PNG", optimize=True)
+        after = os.path.getsize(tmp)
+        if not resized and after >= before:
+            os.remove(tmp)
+            return before, False
+        os.rename(tmp, path)
+        return after, True
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def _cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return 1
+
+def fit_all(picons, size, picon_dir, workers=None, progress=None, cancelled=None):
+    """Dopasowuje picony [(nazwa, crc)] w picon_dir; picony o tym samym CRC przetwarzane są raz,
+    pozostałe kopiowane z wyniku. cancelled() == True kończy pracę - nieprzetworzone picony nie
+    trafiają do wyniku. Zwraca ({nazwa: rozmiar pliku}, statystyka)."""
+    start = time.time()
+    groups = {}
+    for name, crc in picons:
+        groups.setdefault(crc, []).append(name)
+    pending = list(groups.values())
+    results, stats = {}, {"fitted": 0, "copied": 0, "failed": 0, "before": 0, "after": 0}
+    lock = Lock()
+    total = len(picons)
+
+    def worker():
+        while not (cancelled and cancelled()):
+            with lock:
+                if not pending:
+                    return
+                names = pending.pop()
+            first = os.path.join(picon_dir, names[0])
+            before = None
+            try:
+                before = os.path.getsize(first)
+                after, rewritten = fit(first, size)
+                copies = names[1:] if rewritten else []
+                for name in copies:
+                    dest = os.path.join(picon_dir, name)
+                    shutil.copyfile(first, dest + ".fit")
+                    os.rename(dest + ".fit", dest)
+            except Exception as e:
+                # Plik bez zmian (np. nie PNG); wynik zapamiętany, żeby nie próbować przy każdej synchronizacji
+                log("Picon {}: {}".format(names[0], e), WARNING)
+                with lock:
+                    stats["failed"] += len(names)
+                    if before is not None:
+                        for name in names:
+                            results[name] = before
+                continue
+            with lock:
+                for name in names:
+                    results[name] = after
+                stats["fitted"] += 1
+                stats["copied"] += len(copies)
+                stats["before"] += before * len(names)
+                stats["after"] += after * len(names)
+                done = len(results)
+            if progress:
+                progress(done, total)
+
+    # Zadania wspólnej puli; nierozpoczęte przez zajętą pulę wait() wykonuje w bieżącym wątku
+    count = min(workers or get_setting("picon_workers") or _cpu_count(), len(pending))
+    jobs = [tasks.submit(worker) for i in range(count)]
+    for task in jobs:
+        task.wait()
+    stats["saved"] = stats["before"] - stats["after"]
+    stats["time"] = time.time() - start
+    log("Picony {}: przetworzono {fitted}, skopiowano {copied}, błędy {failed}, oszczędność {saved} B, {time:.1f} s".format(
+        format_size(size), **stats))
+    return results, stats
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – pobieranie w tle (czuwanie, bezczynność)
+#
+#  Harmonogram uruchamia co prefetch_interval s rundę pobierania w tle, ale
+#  tylko w oknie czasowym (np. 01:00-06:00) i gdy tuner jest w czuwaniu
+#  lub pilot nie był używany. Runda odświeża źródła list w pamięci
+#  podręcznej, sprawdza manifest aktualizacji wtyczki i pobiera nowe
+#  wersje zainstalowanych list do pamięci podręcznej archiwów (url#wersja)
+#  - z limitem przepustowości, przerywając pobieranie, gdy użytkownik
+#  wróci. Menu i instalacja znajdują potem wszystko lokalnie.
+#  Zegar, warunek bezczynności i sama runda są wstrzykiwane - harmonogram
+#  nie zależy od enigma2 i da się sprawdzić z symulowanym czasem.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, json, time
+from threading import Thread
+
+from . import net, sources, ledger, archive, selfupdate, catalog, download
+from .common import log, ensure_dir, get_setting, DATA_PATH, WARNING
+
+STATE_FILE = os.path.join(DATA_PATH, "prefetch.json")
+# Co tyle sekund harmonogram sprawdza warunki
+TICK = 60
+# Po nieudanej lub przerwanej rundzie kolejna próba po tylu sekundach (zamiast prefetch_interval)
+RETRY_DELAY = 1800
+
+def parse_window(window):
+    """"HH:MM-HH:MM" -> (minuta początku, minuta końca) doby; pusty -> None (cała doba)"""
+    if not window:
+        return None
+    try:
+        start, end = [p.strip().split(":") for p in window.split("-")]
+        return int(start[0]) * 60 + int(start[1]), int(end[0]) * 60 + int(end[1])
+    except (ValueError, IndexError):
+        log("Błędne okno pobierania w tle: {}".format(window), WARNING)
+        return None
+
+def in_window(window, now):
+    """Czy czas lokalny `now` mieści się w oknie (także przechodzącym przez północ, np. 23:00-05:00)"""
+    bounds = parse_window(window)
+    if bounds is None:
+        return True
+    t = time.localtime(now)
+    minute = t.tm_hour * 60 + t.tm_min
+    start, end = bounds
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+def load_state(path=STATE_FILE):
+    try:
+        with io.open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+def save_state(state, path=STATE_FILE):
+    ensure_dir(os.path.dirname(path))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(json.dumps(state, sort_keys=True).encode("utf-8"))
+    os.rename(tmp, path)
+
+def plugin_update(path=STATE_FILE):
+    """Aktualizacja wtyczki znaleziona przez ostatnią rundę: {version, files, bytes} albo None"""
+    update = load_state(path).get("report", {}).get("plugin")
+    return update if update and update.get("newer") else None
+
+def pending_archives(entries, installed):
+    """Info wpisów LIST zainstalowanych w innej wersji niż w źródle, których nowej wersji
+    nie ma jeszcze w pamięci podręcznej (paczki picon synchronizowane są zapytaniami Range)"""
+    cache = ledger.archive_cache()
+    pending = []
+    for entry in entries:
+        info = entry[2] if len(entry) > 2 else {}
+        if info.get("type") != "LIST" or catalog.entry_state(info, installed) != catalog.STATE_UPDATE:
+            continue
+        if installed.get(info["url"]).get("kind") != "list" or archive.archive_type_of(info["url"]) is None:
+            continue
+        if cache.get(ledger.archive_key(info["url"], info["version"])) is None:
+            pending.append(info)
+    return pending
+
+def run_round(stop=None, source_list=None, rate=None):
+    """Jedna runda pobierania w tle; stop() == True przerywa pobieranie archiwów.
+    Zwraca raport: sources, plugin, archives, errors, time."""
+    start = time.time()
+    if rate is None:
+        rate = get_setting("prefetch_rate_kb") * 1024
+    report = {"sources": {}, "plugin": None, "archives": [], "errors": []}
+    results = sources.load_all(source_list if source_list is not None else sources.configured_sources())
+    entries = []
+    for name, (status, lst) in sorted(results.items()):
+        report["sources"][name] = status
+        entries.extend(lst or [])
+    try:
+        update = selfupdate.check()
+        report["plugin"] = {"version": update.version, "newer": update.newer,
+                            "files": len(update.files), "bytes": update.bytes}
+    except net.HTTPError as e:
+        if e.code != 404:  # wydanie bez update.json to nie błąd
+            report["errors"].append("aktualizacja wtyczki: {}".format(e))
+    except Exception as e:
+        report["errors"].append("aktualizacja wtyczki: {}".format(e))
+    throttle = download.Throttle(rate, stop)
+    for info in pending_archives(entries, ledger.Ledger()):
+        try:
+            archive.prefetch_archive(info["url"], info["version"], info.get("sha256"), info.get("size"), throttle)
+            report["archives"].append(info["url"])
+        except download.Cancelled:
+            report["errors"].append("przerwano: {}".format(info.get("name", info["url"])))
+            break
+        except Exception as e:
+            report["errors"].append("{}: {}".format(info.get("name", info["url"]), e))
+    report["time"] = time.time() - start
+    log("Pobieranie w tle: źródła {}, wtyczka {}, archiwa {}{} ({:.1f} s)".format(
+        len(report["sources"]), (report["plugin"] or {}).get("version", "-"), len(report["archives"]),
+        ", błędy: " + "; ".join(report["errors"]) if report["errors"] else "", report["time"]))
+    return report
+
+def record(report, started, path=STATE_FILE):
+    """Zapisuje raport rundy rozpoczętej o `started`; runda bez błędów ustala termin następnej"""
+    state = load_state(path)
+    state["last_attempt"] = max(state.get("last_attempt") or 0, started)
+    state["report"] = report
+    if not report.get("errors"):
+        state["last_ok"] = state["last_attempt"]
+    save_state(state, path)
+
+def _start_thread(func, args):
+    # Osobny wątek zamiast puli zadań: runda z limitem przepustowości trwa minutami,
+    # a sources.load_all sam korzysta z puli
+    thread = Thread(target=func, args=args, name="prefetch")
+    thread.daemon = True
+    thread.start()
+    return thread
+
+class Scheduler(object):
+    """Decyduje, kiedy uruchomić rundę: nie częściej niż co prefetch_interval s (po błędzie co
+    RETRY_DELAY), w oknie prefetch_window i tylko gdy is_idle(). tick() wołane jest cyklicznie
+    (w GUI co TICK s, w teście z symulowanym zegarem)."""
+
+    def __init__(self, is_idle, clock=time.time, run=run_round, state_path=STATE_FILE, start=_start_thread):
+        self.is_idle = is_idle
+        self.clock = clock
+        self.run = run
+        self.state_path = state_path
+        self.start = start
+        self.thread = None
+
+    def due(self, now=None):
+        now = self.clock() if now is None else now
+        state = load_state(self.state_path)
+        last = state.get("last_attempt")
+        delay = get_setting("prefetch_interval") if state.get("last_ok") == last else RETRY_DELAY
+        return (last is None or now - last >= delay) and in_window(get_setting("prefetch_window"), now)
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def tick(self):
+        """Uruchamia rundę w osobnym wątku, jeśli pora; zwraca wątek albo None"""
+        if self.running() or not self.due() or not self.is_idle():
+            return None
+        now = self.clock()
+        state = load_state(self.state_path)
+        state["last_attempt"] = now
+        save_state(state, self.state_path)
+        self.thread = self.start(self._round, (now,))
+        return self.thread
+
+    def _round(self, started):
+        # Przerwanie, gdy użytkownik wróci albo minie okno
+        stop = lambda: not self.is_idle() or not in_window(get_setting("prefetch_window"), self.clock())
+        try:
+            report = self.run(stop=stop)
+        except Exception as e:
+            log("Pobieranie w tle przerwane: {}".format(e), WARNING)
+            report = {"errors": [str(e)]}
+        record(report, started, self.state_path)
+        return report
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – sprawdzanie strumieni M3U przed zapisem bukietu
+#
+#  Adresy strumieni (bez powtórzeń) sprawdzane są równolegle zadaniami
+#  wspólnej puli (tasks), najwyżej m3u_probe_workers naraz, zapytaniem HEAD
+#  albo krótkim GET z limitem czasu m3u_probe_timeout s. Zamknięcie ekranu
+#  (cancelled) przerywa sprawdzanie. Wynik każdego adresu trafia do pamięci
+#  (skrót znormalizowanego adresu -> [działa, czas sprawdzenia]) ważnej
+#  m3u_probe_ttl s, więc ponowny import tej samej playlisty sprawdza tylko
+#  adresy, których wynik się przedawnił. Strumień z błędem połączenia,
+#  przekroczonym czasem albo kodem >= 400 uznawany jest za niedziałający.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, json, time, binascii
+from threading import Lock
+
+from . import net, m3u, tasks
+from .common import log, ensure_dir, get_setting, DATA_PATH, WARNING
+
+PROBE_FILE = os.path.join(DATA_PATH, "stream_probes.json")
+# Najwięcej zapamiętanych wyników; przy przekroczeniu usuwane są najstarsze
+MAX_ENTRIES = 20000
+
+def _key(url):
+    return binascii.hexlify(m3u.url_key(url)[:8]).decode("ascii")
+
+class ProbeCache(object):
+    """Wyniki sprawdzeń: skrót adresu -> [działa, czas sprawdzenia]"""
+
+    def __init__(self, path=PROBE_FILE):
+        self.path = path
+        self.lock = Lock()
+        self.entries = {}
+        self.dirty = False
+        try:
+            with io.open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (IOError, OSError, ValueError):
+            pass
+
+    def get(self, url, ttl, now=None):
+        """True/False dla wyniku młodszego niż ttl s, None gdy trzeba sprawdzić"""
+        with self.lock:
+            entry = self.entries.get(_key(url))
+        if entry and (now or time.time()) - entry[1] < ttl:
+            return entry[0]
+        return None
+
+    def put(self, url, alive, now=None):
+        with self.lock:
+            self.entries[_key(url)] = [bool(alive), now or time.time()]
+            self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            if len(self.entries) > MAX_ENTRIES:
+                newest = sorted(self.entries.items(), key=lambda kv: kv[1][1])[-MAX_ENTRIES:]
+                self.entries = dict(newest)
+            data = json.dumps(self.entries, sort_keys=True).encode("utf-8")
+            self.dirty = False
+        try:
+            ensure_dir(os.path.dirname(self.path))
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.rename(tmp, self.path)
+        except (IOError, OSError) as e:
+            log("Nie można zapisać wyników sprawdzania strumieni: {}".format(e), WARNING)
+
+def check(url, timeout):
+    """Czy strumień odpowiada (kod < 400 w czasie `timeout`)"""
+    try:
+        return net.probe(url, timeout) < 400
+    except Exception:
+        return False
+
+def probe_urls(urls, cache=None, timeout=None, workers=None, ttl=None, progress=None, cancelled=None):
+    """Sprawdza adresy (bez powtórzeń) z pominięciem świeżych wyników z pamięci;
+    zwraca (znormalizowany adres -> działa, statystyka {checked, cached, dead, time}).
+    progress(sprawdzone, do sprawdzenia); cancelled() == True kończy sprawdzanie -
+    niesprawdzone adresy uznawane są za działające."""
+    start = time.time()
+    cache = cache if cache is not None else ProbeCache()
+    timeout = timeout or get_setting("m3u_probe_timeout")
+    ttl = get_setting("m3u_probe_ttl") if ttl is None else ttl
+    alive, pending, seen = {}, [], set()
+    now = time.time()
+    for url in urls:
+        norm = m3u.normalize_url(url)
+        if norm in seen:
+            continue
+        seen.add(norm)
+        cached = cache.get(norm, ttl, now)
+        if cached is None:
+            pending.append(norm)
+        else:
+            alive[norm] = cached
+    total = len(pending)
+    cached_count = len(alive)
+    lock = Lock()
+    done = [0]
+
+    def worker():
+        while not (cancelled and cancelled()):
+            with lock:
+                if not pending:
+                    return
+                url = pending.pop()
+            ok = check(url, timeout)
+            cache.put(url, ok)
+            with lock:
+                alive[url] = ok
+                done[0] += 1
+                count = done[0]
+            if progress:
+                progress(count, total)
+
+    # Zadanie nierozpoczęte przez zajętą pulę wait() wykonuje w bieżącym wątku
+    jobs = [tasks.submit(worker) for i in range(min(workers or get_setting("m3u_probe_workers"), total))]
+    for task in jobs:
+        task.wait()
+    cache.save()
+    stats = {"checked": done[0], "cached": cached_count, "dead": len([v for v in alive.values() if not v]),
+             "time": time.time() - start}
+    log("Strumienie M3U: sprawdzono {checked}, z pamięci {cached}, niedziałających {dead}, {time:.1f} s".format(**stats))
+    return alive, stats
+
+def stream_filter(m3u_paths, **kwargs):
+    """Sprawdza strumienie playlist; zwraca (keep(url) dla m3u.convert, statystyka)"""
+    urls = (entry.url for entry in m3u.iter_m3u(m3u.iter_files(m3u_paths)))
+    alive, stats = probe_urls(urls, **kwargs)
+    return (lambda url: alive.get(m3u.normalize_url(url), True)), stats
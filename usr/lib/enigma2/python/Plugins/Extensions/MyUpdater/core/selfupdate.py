@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – różnicowa aktualizacja wtyczki
+#
+#  Wydanie publikuje update.json: wersję i spis plików wtyczki z rozmiarem
+#  i SHA-256. Wersje porównywane są jak w opkg (V5.10 > V5.9), pobierane
+#  są tylko pliki, których skrót różni się od zainstalowanych - równolegle,
+#  do katalogu tymczasowego, z kontrolą rozmiaru i sumy (moduł download).
+#  Dopiero komplet sprawdzonych plików podmieniany jest w katalogu wtyczki:
+#  kopie .new obok docelowych, potem zamiana nazw (ten sam system plików);
+#  błąd w trakcie przywraca poprzednie pliki (.old). Poprawka to kilka KB
+#  zamiast ponownej instalacji wszystkich plików instalatorem.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, re, json, time, shutil, hashlib
+from threading import Lock
+
+from . import net, tasks, download, opkg
+from .common import log, ensure_dir, PLUGIN_TMP_PATH, WARNING
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_RAW_URL = "https://raw.githubusercontent.com/OliOli2013/MyUpdater-Plugin/main/"
+MANIFEST_URL = REPO_RAW_URL + "update.json"
+FILES_URL = REPO_RAW_URL + "usr/lib/enigma2/python/Plugins/Extensions/MyUpdater/"
+STAGING_DIR = os.path.join(PLUGIN_TMP_PATH, "selfupdate")
+PARALLEL = 4
+# Pliki robocze, kopie i skompilowane moduły nie trafiają do spisu wydania
+_SKIP_RE = re.compile(r'(\.pyc|\.pyo|\.part|\.new|\.old|\.tmp|~)$|(^|/)__pycache__/')
+_VER_RE = re.compile(r'^VER\s*=\s*["\']([^"\']+)["\']', re.M)
+_NUMBER_RE = re.compile(r'\d+(?:[.\-+~]\w+)*')
+
+class UpdateError(Exception):
+    pass
+
+def version_key(version):
+    """Część numeryczna wersji do porównania jak w opkg: "V5.1 Enhanced" -> "5.1" """
+    m = _NUMBER_RE.search(version or "")
+    return m.group(0) if m else (version or "").strip()
+
+def is_newer(online, current):
+    return opkg.compare_versions(version_key(online), version_key(current)) > 0
+
+def installed_version(plugin_dir=PLUGIN_DIR):
+    """VER z plugin.py (bez importu - moduł wymaga enigma2)"""
+    try:
+        with io.open(os.path.join(plugin_dir, "plugin.py"), "r", encoding="utf-8") as f:
+            m = _VER_RE.search(f.read())
+        return m.group(1) if m else ""
+    except (IOError, OSError):
+        return ""
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(download.CHUNK), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def build_manifest(plugin_dir=PLUGIN_DIR, version=None, base_url=FILES_URL):
+    """Spis wydania (update.json) z plików katalogu wtyczki"""
+    files = {}
+    for root, dirs, names in os.walk(plugin_dir):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, plugin_dir).replace(os.sep, "/")
+            if not _SKIP_RE.search(rel):
+                files[rel] = {"size": os.path.getsize(path), "sha256": file_sha256(path)}
+    return {"version": version or installed_version(plugin_dir), "base_url": base_url, "files": files}
+
+def _safe_path(rel):
+    """Ścieżka względna z manifestu; odrzuca wyjście poza katalog wtyczki"""
+    norm = os.path.normpath(rel)
+    if os.path.isabs(rel) or norm.startswith(os.pardir) or not norm or norm == ".":
+        raise UpdateError("Nieprawidłowa ścieżka w manifeście: {}".format(rel))
+    return norm
+
+def changed_files(manifest, plugin_dir=PLUGIN_DIR):
+    """[(ścieżka, {size, sha256})] plików z manifestu, których brakuje lub które się różnią"""
+    changed = []
+    for rel, meta in sorted(manifest.get("files", {}).items()):
+        path = os.path.join(plugin_dir, _safe_path(rel))
+        try:
+            if os.path.getsize(path) == meta.get("size") and file_sha256(path) == meta.get("sha256"):
+                continue
+        except (IOError, OSError):
+            pass
+        changed.append((rel, meta))
+    return changed
+
+class Update(object):
+    """Wynik sprawdzenia: wersja online, czy nowsza, pliki do pobrania i ich łączny rozmiar"""
+
+    def __init__(self, manifest, current, files):
+        self.manifest = manifest
+        self.version = manifest.get("version", "")
+        self.current = current
+        self.newer = is_newer(self.version, current)
+        self.files = files
+        self.bytes = sum(meta.get("size", 0) for rel, meta in files)
+
+    def describe(self):
+        return "{} plików, {:.1f} KB".format(len(self.files), self.bytes / 1024.0)
+
+def check(current=None, plugin_dir=PLUGIN_DIR, url=MANIFEST_URL):
+    """Pobiera manifest wydania i porównuje go z zainstalowanymi plikami; zwraca Update.
+    Brak manifestu (starsze wydania) -> net.HTTPError 404."""
+    # Bez luster: CDN może podać manifest sprzed kilku godzin
+    resp = net.fetch(url, timeout=10, use_mirrors=False)
+    try:
+        manifest = json.loads(resp.body.decode("utf-8"))
+    except ValueError as e:
+        raise UpdateError("Błędny manifest aktualizacji: {}".format(e))
+    if not isinstance(manifest.get("files"), dict):
+        raise UpdateError("Manifest aktualizacji bez spisu plików")
+    if current is None:
+        current = installed_version(plugin_dir)
+    return Update(manifest, current, changed_files(manifest, plugin_dir))
+
+def _fetch_file(base_url, rel, meta, staging):
+    url = base_url + rel
+    dest = os.path.join(staging, _safe_path(rel))
+    try:
+        download.fetch(url, dest, size=meta.get("size"), sha256=meta.get("sha256"), timeout=30)
+    except download.IntegrityError as e:
+        # Lustro (CDN) mogło podać plik sprzed wydania - jeszcze raz z adresu źródłowego
+        log("Aktualizacja {}: {} - pobieram bez luster".format(rel, e), WARNING)
+        download.fetch(url, dest, size=meta.get("size"), sha256=meta.get("sha256"), timeout=30, use_mirrors=False)
+    return dest
+
+def _download_all(update, staging, progress):
+    base_url = update.manifest.get("base_url") or FILES_URL
+    pending = list(update.files)
+    staged, errors = [], []
+    lock = Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not pending or errors:
+                    return
+                rel, meta = pending.pop(0)
+            try:
+                path = _fetch_file(base_url, rel, meta, staging)
+            except Exception as e:
+                with lock:
+                    errors.append((rel, e))
+                return
+            with lock:
+                staged.append((rel, path))
+                done = len(staged)
+            if progress:
+                progress.update(done, len(update.files))
+
+    workers = [tasks.submit(worker) for i in range(min(PARALLEL, len(pending)))]
+    for task in workers:
+        task.wait()
+    if errors:
+        rel, e = errors[0]
+        raise UpdateError("Nie udało się pobrać {}: {}".format(rel, e))
+    return staged
+
+def swap(staged, plugin_dir=PLUGIN_DIR):
+    """Podmienia pliki [(ścieżka względna, plik sprawdzony)] w katalogu wtyczki; przy błędzie
+    przywraca poprzedni stan i zgłasza wyjątek"""
+    targets = [os.path.join(plugin_dir, _safe_path(rel)) for rel, src in staged]
+    try:
+        for target, (rel, src) in zip(targets, staged):
+            ensure_dir(os.path.dirname(target))
+            shutil.copyfile(src, target + ".new")
+    except Exception:
+        for target in targets:
+            if os.path.exists(target + ".new"):
+                os.remove(target + ".new")
+        raise
+    swapped = []
+    try:
+        for target in targets:
+            if os.path.exists(target):
+                os.rename(target, target + ".old")
+            swapped.append(target)
+            os.rename(target + ".new", target)
+    except Exception:
+        log("Podmiana plików wtyczki przerwana - przywracam poprzednie", WARNING)
+        for target in reversed(swapped):
+            if os.path.exists(target + ".old"):
+                os.rename(target + ".old", target)
+            elif os.path.exists(target):
+                os.remove(target)
+        for target in targets:
+            if os.path.exists(target + ".new"):
+                os.remove(target + ".new")
+        raise
+    for target in swapped:
+        if os.path.exists(target + ".old"):
+            os.remove(target + ".old")
+
+def apply(update, progress=None, plugin_dir=PLUGIN_DIR):
+    """Pobiera zmienione pliki, sprawdza je i podmienia; zwraca słownik ze statystyką"""
+    start = time.time()
+    shutil.rmtree(STAGING_DIR, ignore_errors=True)
+    ensure_dir(STAGING_DIR)
+    try:
+        if progress:
+            progress.stage("update_files")
+        staged = _download_all(update, STAGING_DIR, progress)
+        if progress:
+            progress.stage("swap")
+        swap(staged, plugin_dir)
+    finally:
+        shutil.rmtree(STAGING_DIR, ignore_errors=True)
+    stats = {"version": update.version, "files": [rel for rel, path in staged], "bytes": update.bytes,
+             "time": time.time() - start}
+    log("Aktualizacja wtyczki do {}: {} ({:.1f} s)".format(update.version, update.describe(), stats["time"]))
+    return stats
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – migawki lamedb i bukietów z deduplikacją
+#
+#  Pliki zapisywane są raz, pod swoim skrótem SHA-1 (objects/<sha1>, zlib),
+#  a migawka to tylko spis nazwa -> skrót. Niezmienione pliki (ten sam rozmiar
+#  i mtime co w poprzedniej migawce) nie są nawet czytane, więc kolejna
+#  migawka przed instalacją zajmuje milisekundy.
+#
+from __future__ import print_function, absolute_import
+
+import io
+import os, re, json, time, zlib, hashlib, datetime
+
+from .common import log, ensure_dir, get_setting, DATA_PATH, E2_DIR, WARNING
+
+SNAPSHOT_PATH = os.path.join(DATA_PATH, "snapshots")
+SNAPSHOT_FILE_RE = re.compile(r'^(lamedb5?|.+\.tv|.+\.radio)$')
+
+class SnapshotError(Exception):
+    pass
+
+def _atomic_write(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.rename(tmp, path)
+
+class SnapshotStore(object):
+    def __init__(self, root=SNAPSHOT_PATH, e2_dir=E2_DIR):
+        self.root = root
+        self.e2_dir = e2_dir
+        self.objects = os.path.join(root, "objects")
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects, digest)
+
+    def _manifest_path(self, snap_id):
+        return os.path.join(self.root, snap_id + ".json")
+
+    def list(self):
+        """Migawki od najnowszej: [{"id", "created", "label", "files"}]"""
+        snaps = []
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return snaps
+        for n in names:
+            if not n.endswith(".json"):
+                continue
+            try:
+                with io.open(os.path.join(self.root, n), "r", encoding="utf-8") as f:
+                    snaps.append(json.load(f))
+            except (IOError, OSError, ValueError):
+                log("Uszkodzona migawka: " + n, WARNING)
+        snaps.sort(key=lambda s: s["created"], reverse=True)
+        return snaps
+
+    def get(self, snap_id):
+        try:
+            with io.open(self._manifest_path(snap_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            raise SnapshotError("Brak migawki: {}".format(snap_id))
+
+    def _current_files(self):
+        try:
+            names = os.listdir(self.e2_dir)
+        except OSError:
+            return []
+        return sorted(n for n in names if SNAPSHOT_FILE_RE.match(n) and os.path.isfile(os.path.join(self.e2_dir, n)))
+
+    def _store(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        obj = self._object_path(digest)
+        if not os.path.exists(obj):
+            _atomic_write(obj, zlib.compress(data))
+        return digest
+
+    def take(self, label="", protect=()):
+        """Tworzy migawkę bieżących list; zwraca id (lub id poprzedniej, gdy nic się nie zmieniło)"""
+        start = time.time()
+        ensure_dir(self.objects)
+        snaps = self.list()
+        previous = snaps[0]["files"] if snaps else {}
+        files, hashed = {}, 0
+        for name in self._current_files():
+            st = os.stat(os.path.join(self.e2_dir, name))
+            old = previous.get(name)
+            if old and old[1] == st.st_size and old[2] == round(st.st_mtime, 3) and os.path.exists(self._object_path(old[0])):
+                files[name] = old
+            else:
+                files[name] = [self._store(os.path.join(self.e2_dir, name)), st.st_size, round(st.st_mtime, 3)]
+                hashed += 1
+        if snaps and files == previous:
+            log("Migawka: bez zmian względem {} ({:.3f} s)".format(snaps[0]["id"], time.time() - start))
+            return snaps[0]["id"]
+
+        now = datetime.datetime.now()
+        snap_id = now.strftime("%Y%m%d_%H%M%S")
+        n = 1
+        while os.path.exists(self._manifest_path(snap_id)):
+            snap_id = "{}_{}".format(now.strftime("%Y%m%d_%H%M%S"), n)
+            n += 1
+        manifest = {"id": snap_id, "created": time.time(), "label": label, "files": files}
+        _atomic_write(self._manifest_path(snap_id), json.dumps(manifest, sort_keys=True).encode("utf-8"))
+        log("Migawka {}: {} plików, {} nowych/zmienionych ({:.3f} s)".format(snap_id, len(files), hashed, time.time() - start))
+        self.prune(protect=protect)
+        return snap_id
+
+    def restore(self, snap_id):
+        """Przywraca listy z migawki; bieżący stan zapisywany jest wcześniej jako migawka"""
+        manifest = self.get(snap_id)
+        for digest, size, mtime in manifest["files"].values():
+            if not os.path.exists(self._object_path(digest)):
+                raise SnapshotError("Brak danych migawki (obiekt {})".format(digest))
+        self.take("Przed przywróceniem {}".format(snap_id), protect=(snap_id,))
+
+        restored = 0
+        for name, (digest, size, mtime) in manifest["files"].items():
+            target = os.path.join(self.e2_dir, name)
+            try:
+                with open(target, "rb") as f:
+                    if os.path.getsize(target) == size and hashlib.sha1(f.read()).hexdigest() == digest:
+                        continue
+            except (IOError, OSError):
+                pass
+            with open(self._object_path(digest), "rb") as f:
+                _atomic_write(target, zlib.decompress(f.read()))
+            restored += 1
+        removed = 0
+        for name in self._current_files():
+            if name not in manifest["files"]:
+                os.remove(os.path.join(self.e2_dir, name))
+                removed += 1
+        log("Przywrócono migawkę {}: {} plików zapisanych, {} usuniętych".format(snap_id, restored, removed))
+        return restored, removed
+
+    def _objects_size(self):
+        total = 0
+        for n in os.listdir(self.objects):
+            total += os.path.getsize(os.path.join(self.objects, n))
+        return total
+
+    def _gc(self, snaps):
+        used = set()
+        for s in snaps:
+            used.update(f[0] for f in s["files"].values())
+        for n in os.listdir(self.objects):
+            if n not in used:
+                os.remove(os.path.join(self.objects, n))
+
+    def prune(self, keep=None, max_bytes=None, protect=()):
+        """Retencja: najwyżej `keep` migawek i `max_bytes` danych (zawsze zostaje najnowsza)"""
+        keep = keep or get_setting("snapshot_keep")
+        max_bytes = max_bytes or get_setting("snapshot_max_kb") * 1024
+        snaps = self.list()
+        kept = [s for s in snaps if s["id"] in protect]
+        snaps = [s for s in snaps if s["id"] not in protect]
+
+        def evict():
+            os.remove(self._manifest_path(snaps.pop()["id"]))
+
+        while len(snaps) > max(keep - len(kept), 1):
+            evict()
+        self._gc(snaps + kept)
+        while len(snaps) > 1 and self._objects_size() > max_bytes:
+            evict()
+            self._gc(snaps + kept)
+
+def describe(snap):
+    created = datetime.datetime.fromtimestamp(snap["created"]).strftime("%Y-%m-%d %H:%M:%S")
+    return "{} - {} ({} plików)".format(created, snap.get("label") or "migawka", len(snap["files"]))
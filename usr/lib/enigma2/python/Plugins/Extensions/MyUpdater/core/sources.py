@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – źródła list kanałów (manifest AIO, S4A, źródła dodatkowe)
+#
+#  Każde źródło pobierane jest jako osobne zadanie puli z własnym limitem
+#  czasu, a wynik przekazywany jest do wywołującego zaraz po zakończeniu
+#  danego źródła. Równoczesne pobrania tego samego adresu (np. dwa
+#  otwarcia menu) współdzielą jedno zapytanie.
+#  Jeśli istnieje kopia w pamięci podręcznej, jest zwracana od razu, a źródło
+#  rewalidowane jest w tle (ETag/Last-Modified).
+#
+from __future__ import print_function, absolute_import
+
+import json, time, hashlib
+from threading import Timer, Lock, Event
+
+from . import net, tasks
+from .cache import document_cache
+from .operations import Operation
+from .common import log, get_setting, WARNING, ERROR
+
+MANIFEST_URL = "https://raw.githubusercontent.com/OliOli2013/PanelAIO-Lists/main/manifest.json"
+S4A_URL = "http://s4aupdater.one.pl/s4aupdater_list.txt"
+S4A_BLACKLIST = ('bzyk', 'jakitaki')
+
+STATUS_PENDING = "pending"
+STATUS_OK = "ok"
+STATUS_EMPTY = "empty"
+STATUS_ERROR = "error"
+STATUS_TIMEOUT = "timeout"
+STATUS_CACHED = "cached"  # kopia z pamięci podręcznej, trwa rewalidacja
+STATUS_STALE = "stale"    # kopia z pamięci podręcznej, źródło niedostępne
+
+def entry_id(url):
+    """Krótki, stały identyfikator wpisu wyliczany z adresu URL"""
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]
+
+def parse_manifest(data, source_name=""):
+    """Zamienia manifest AIO na wpisy menu (tytuł, akcja, info) (Logika AIO)"""
+    lst = []
+    for item in data:
+        item_type = item.get("type", "LIST").upper()
+        name = item.get('name', 'Brak nazwy')
+        author = item.get('author', '')
+        url = item.get('url', '')
+
+        if not url: continue
+
+        info = {"id": entry_id(url), "name": name, "author": author, "url": url,
+                "source": source_name, "version": item.get('version', '')}
+        # Opcjonalna kontrola pobranego archiwum
+        for key in ("sha256", "size"):
+            if item.get(key):
+                info[key] = item[key]
+
+        if item_type == "M3U":
+            bouquet_id = item.get('bouquet_id', 'userbouquet.imported_m3u.tv')
+            bouquet_name = item.get('name', bouquet_id)
+            menu_title = "{} - {} (Dodaj jako Bukiet M3U)".format(name, author)
+            action = "m3u:{}:{}:{}".format(url, bouquet_id, bouquet_name)
+            info["type"] = "M3U"
+            for key in ("split_groups", "probe"):
+                if key in item:
+                    info[key] = bool(item[key])
+
+        elif item_type == "BOUQUET":
+            bouquet_id = item.get('bouquet_id', 'userbouquet.imported_ref.tv')
+            bouquet_name = item.get('name', bouquet_id)
+            menu_title = "{} - {} (Dodaj Bukiet REF)".format(name, author)
+            action = "bouquet:{}:{}:{}".format(url, bouquet_id, bouquet_name)
+            info["type"] = "BOUQUET"
+
+        else: # Domyślnie type == "LIST"
+            menu_title = "{} - {} ({})".format(name, author, info["version"])
+            action = "archive:{}".format(url)
+            info["type"] = "LIST"
+
+        lst.append((menu_title, action, info))
+    return lst
+
+def parse_s4a(lines, source_name=""):
+    """Zamienia listę s4aupdater (klucze *_url / *_version) na wpisy menu"""
+    urls, vers = {}, {}
+    for l in lines:
+        l = l.strip()
+        if "_url:" in l:
+            k, v = l.split(':', 1)
+            urls[k.strip()] = v.strip()
+        elif "_version:" in l:
+            k, v = l.split(':', 1)
+            vers[k.strip()] = v.strip()
+    lst = []
+    for k, u in urls.items():
+        name = k.replace('_url', '').replace('_', ' ').title()
+        ver = vers.get(k.replace('_url', '_version'), "brak daty")
+        if any(x in name.lower() for x in S4A_BLACKLIST):
+            continue
+        info = {"id": entry_id(u), "name": name, "author": "S4A", "url": u,
+                "source": source_name, "version": ver if ver != "brak daty" else "", "type": "S4A"}
+        lst.append(("{} - {}".format(name, ver), "archive:{}".format(u), info))
+    return lst
+
+class Source(object):
+    """Pojedyncze źródło list z własnym limitem czasu i kopią w pamięci podręcznej"""
+
+    def __init__(self, name, url, timeout=None):
+        self.name = name
+        self.url = url
+        self.timeout = timeout or get_setting("source_timeout")
+
+    def parse(self, body):
+        raise NotImplementedError
+
+    def cached(self):
+        """Zwraca (wpis cache, wpisy menu) lub (None, None) gdy brak kopii"""
+        entry = document_cache().get(self.url)
+        if entry is None:
+            return None, None
+        try:
+            return entry, self.parse(entry.read())
+        except Exception as e:
+            log("Uszkodzona kopia źródła {}: {}".format(self.name, e), WARNING)
+            document_cache().remove(self.url)
+            return None, None
+
+    def revalidate(self, entry=None, operation=None):
+        """Pobiera źródło warunkowo; zwraca None, gdy kopia w cache jest aktualna"""
+        operation = operation or Operation("source", self.name)
+        headers = net.conditional_headers(entry.meta) if entry else {}
+        with operation.span("fetch", self.name):
+            resp = net.fetch(self.url, headers, self.timeout)
+        if resp.status == 304 and entry:
+            document_cache().touch(self.url)
+            return None
+        with operation.span("parse", self.name):
+            entries = self.parse(resp.body)
+        document_cache().put(self.url, resp.body,
+                             etag=resp.headers.get("etag"),
+                             last_modified=resp.headers.get("last-modified"))
+        return entries
+
+class ManifestSource(Source):
+    def parse(self, body):
+        return parse_manifest(json.loads(body.decode('utf-8')), self.name)
+
+class S4ASource(Source):
+    def parse(self, body):
+        return parse_s4a(body.decode('utf-8', 'ignore').splitlines(), self.name)
+
+SOURCE_TYPES = {"manifest": ManifestSource, "s4a": S4ASource}
+
+def configured_sources():
+    """Źródła domyślne (AIO, S4A) oraz dodatkowe z ustawień (extra_sources)"""
+    sources = [ManifestSource("AIO", MANIFEST_URL), S4ASource("S4A", S4A_URL)]
+    for cfg in get_setting("extra_sources") or []:
+        cls = SOURCE_TYPES.get(cfg.get("type", "manifest"))
+        if cls is None or not cfg.get("url"):
+            log("Pominięto błędne źródło w ustawieniach: {}".format(cfg), WARNING)
+            continue
+        sources.append(cls(cfg.get("name", cfg["url"]), cfg["url"], cfg.get("timeout")))
+    return sources
+
+def fetch_all(sources, on_result, group=None):
+    """Pobiera wszystkie źródła równolegle (stale-while-revalidate); zwraca grupę zadań.
+
+    on_result(source, status, entries) dostarczane jest przez tasks.dispatch()
+    (w GUI - w wątku reaktora), również wielokrotnie dla jednego źródła:
+    najpierw z kopią z pamięci podręcznej (STATUS_CACHED), potem z wynikiem
+    rewalidacji. entries równe None oznacza, że wcześniej przekazane wpisy
+    pozostają aktualne. Po group.cancel() wyniki nie są już dostarczane.
+    Czasy pobierania i parsowania trafiają do historii operacji, o ile
+    któreś źródło było pobierane z sieci.
+    """
+    group = group or tasks.TaskGroup()
+    ttl = get_setting("cache_ttl")
+    operation = Operation("sources", "Pobieranie list ({} źródeł)".format(len(sources)))
+    results = {}
+    remaining = [len(sources)]
+    results_lock = Lock()
+
+    def finished(source, status):
+        with results_lock:
+            results[source.name] = status
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last and operation.spans:
+            operation.finish(detail=", ".join("{}: {}".format(n, st) for n, st in sorted(results.items())))
+
+    def worker(source):
+        lock = Lock()
+        state = {"done": False, "cached": False}
+
+        def report(status, entries, final=True):
+            with lock:
+                if state["done"]:
+                    return
+                state["done"] = final
+            group.call(on_result, source, status, entries)
+            if final:
+                finished(source, status)
+
+        def expired():
+            log("Źródło {}: przekroczono limit czasu ({} s)".format(source.name, source.timeout), WARNING)
+            report(STATUS_STALE if state["cached"] else STATUS_TIMEOUT, None)
+
+        start = time.time()
+        entry, entries = source.cached()
+        if entry is not None:
+            state["cached"] = True
+            if entry.age() < ttl:
+                report(STATUS_OK if entries else STATUS_EMPTY, entries)
+                return
+            report(STATUS_CACHED, entries, final=False)
+
+        timer = Timer(source.timeout, expired)
+        timer.daemon = True
+        timer.start()
+        try:
+            fetch = group.submit(source.revalidate, (entry, operation), key="source:" + source.url)
+            fetch.wait()
+            fresh = fetch.get()
+            if fresh is None:
+                report(STATUS_OK if entries else STATUS_EMPTY, None)
+            else:
+                report(STATUS_OK if fresh else STATUS_EMPTY, fresh)
+            log("Źródło {}: pobrano w {:.2f} s ({})".format(source.name, time.time() - start,
+                                                            "bez zmian" if fresh is None else "{} wpisów".format(len(fresh))))
+        except Exception as e:
+            log("Błąd pobierania źródła {}: {}".format(source.name, e), ERROR)
+            report(STATUS_STALE if state["cached"] else STATUS_ERROR, None)
+        finally:
+            timer.cancel()
+
+    for source in sources:
+        group.submit(worker, (source,))
+    return group
+
+def load_all(sources):
+    """Blokująca wersja fetch_all (CLI): {nazwa źródła: (status, wpisy)} po zakończeniu wszystkich źródeł"""
+    results = dict((s.name, (STATUS_PENDING, [])) for s in sources)
+    lock, done = Lock(), Event()
+
+    def on_result(source, status, entries):
+        with lock:
+            if entries is None:
+                entries = results[source.name][1]
+            results[source.name] = (status, entries)
+            if not [st for st, e in results.values() if st in (STATUS_PENDING, STATUS_CACHED)]:
+                done.set()
+
+    if sources:
+        fetch_all(sources, on_result)
+        done.wait()
+    return results
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – informacje o systemie i przeładowanie list poza GUI
+#
+from __future__ import print_function, absolute_import
+
+import os
+
+from . import net
+from .common import log, WARNING
+
+# OpenWebif: mode=0 - lamedb i bukiety, 1 - tylko lamedb, 2 - tylko bukiety
+WEBIF_RELOAD_URL = "http://127.0.0.1/web/servicelistreload?mode={}"
+
+def detect_distribution():
+    """Detekcja dystrybucji Enigma2"""
+    try:
+        if os.path.exists("/etc/openatv-release"):
+            with open("/etc/openatv-release", 'r') as f:
+                content = f.read().lower()
+                if "7." in content:
+                    return "openatv7"
+                elif "6." in content:
+                    return "openatv6"
+                return "openatv"
+        elif os.path.exists("/etc/openpli-release"):
+            return "openpli"
+        elif os.path.exists("/etc/vti-version-info"):
+            return "vix"
+        else:
+            return "unknown"
+    except:
+        return "unknown"
+
+def get_opkg_command():
+    """Zwraca poprawną komendę opkg dla danej dystrybucji"""
+    distro = detect_distribution()
+    if distro == "openpli":
+        return "opkg --force-overwrite --force-downgrade"
+    else:
+        return "opkg --force-overwrite"
+
+def reload_lists_webif(mode=0):
+    """Przeładowanie list przez OpenWebif - dla CLI, które działa poza procesem enigma2"""
+    try:
+        net.fetch(WEBIF_RELOAD_URL.format(mode), timeout=10)
+        return True
+    except Exception as e:
+        log("Przeładowanie list przez OpenWebif nie powiodło się: {}".format(e), WARNING)
+        return False
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – wspólna pula wątków dla pracy w tle
+#
+#  Cała praca w tle (źródła list, kolejka instalacji, operacje z paskiem
+#  postępu, sprawdzanie wersji) idzie przez jedną ograniczoną pulę.
+#  Zadania z kluczem są wykonywane raz (single-flight): drugie zgłoszenie
+#  tego samego klucza w trakcie wykonania dostaje to samo zadanie i wynik.
+#  Wyniki trafiają do wywołującego jedną drogą - przez dispatch(), które
+#  w GUI ustawione jest na reactor.callFromThread, a w CLI wywołuje
+#  funkcję od razu. Grupa zadań ekranu (TaskGroup) po zamknięciu ekranu
+#  przestaje dostarczać wyniki i zwalnia swoje zadania.
+#
+from __future__ import print_function, absolute_import
+
+import threading
+from collections import deque
+from threading import Lock, Condition, Event
+
+from .common import log, get_setting, DEBUG, ERROR
+
+# Bezczynny wątek puli kończy się po tym czasie (s), żeby nie trzymać wątków w enigma2
+IDLE_TIMEOUT = 30
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+
+class CancelledError(Exception):
+    pass
+
+_dispatcher = None
+
+def set_dispatcher(func):
+    """Ustawia sposób dostarczania wyników, np. reactor.callFromThread w GUI"""
+    global _dispatcher
+    _dispatcher = func
+
+def dispatch(func, *args):
+    if _dispatcher is None:
+        func(*args)
+    else:
+        _dispatcher(func, *args)
+
+class Task(object):
+    """Zadanie puli; wynik w `result` lub wyjątek w `error` po zakończeniu"""
+
+    def __init__(self, pool, func, args, key=None):
+        self.pool = pool
+        self.func = func
+        self.args = args
+        self.key = key
+        self.state = PENDING
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.refs = 1  # liczba zgłoszeń współdzielących zadanie (single-flight)
+        self.callbacks = []
+        self.finished = Event()
+
+    @property
+    def done(self):
+        return self.state == DONE
+
+    def add_done_callback(self, callback):
+        """callback(zadanie) wywoływane przez dispatch() po zakończeniu zadania"""
+        with self.pool.lock:
+            if self.state != DONE:
+                self.callbacks.append(callback)
+                return
+        dispatch(callback, self)
+
+    def wait(self, timeout=None):
+        """Czeka na wynik; jeszcze nierozpoczęte zadanie wykonuje od razu w bieżącym wątku,
+        dzięki czemu zadanie czekające na inne zadanie nie blokuje puli"""
+        if self.pool._take(self):
+            self.pool._run(self)
+        self.finished.wait(timeout)
+        return self.done
+
+    def get(self):
+        """Wynik zadania (po wait()); podnosi wyjątek zadania"""
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def _finish(self, result, error):
+        with self.pool.lock:
+            self.state = DONE
+            self.result, self.error = result, error
+            callbacks, self.callbacks = self.callbacks, []
+        self.finished.set()
+        for callback in callbacks:
+            dispatch(callback, self)
+
+class WorkerPool(object):
+    """Ograniczona pula wątków tworzonych na żądanie i kończonych po bezczynności"""
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max(1, max_workers)
+        self.lock = Lock()
+        self.wakeup = Condition(self.lock)
+        self.queue = deque()
+        self.inflight = {}
+        self.workers = 0
+        self.idle = 0
+
+    def submit(self, func, args=(), key=None):
+        """Zgłasza zadanie; dla klucza będącego w toku zwraca istniejące zadanie"""
+        with self.lock:
+            task = self.inflight.get(key) if key is not None else None
+            if task is not None:
+                task.refs += 1
+                log("Zadanie '{}' już w toku - współdzielony wynik".format(key), DEBUG)
+                return task
+            task = Task(self, func, args, key)
+            if key is not None:
+                self.inflight[key] = task
+            self.queue.append(task)
+            if len(self.queue) > self.idle and self.workers < self.max_workers:
+                self.workers += 1
+                t = threading.Thread(target=self._worker, name="MyUpdater-{}".format(self.workers))
+                t.daemon = True
+                t.start()
+            else:
+                self.wakeup.notify()
+        return task
+
+    def release(self, task):
+        """Zgłaszający rezygnuje z wyniku; gdy nikt już nie czeka, zadanie jest anulowane
+        (nierozpoczęte nie zostanie wykonane, trwające może sprawdzać task.cancelled)"""
+        with self.lock:
+            task.refs -= 1
+            if task.refs > 0 or task.state == DONE:
+                return
+            task.cancelled = True
+            if self.inflight.get(task.key) is task:
+                del self.inflight[task.key]
+            if task.state != PENDING or task not in self.queue:
+                return
+            self.queue.remove(task)
+        task._finish(None, CancelledError())
+
+    def _take(self, task):
+        with self.lock:
+            if task.state == PENDING and task in self.queue:
+                self.queue.remove(task)
+                task.state = RUNNING
+                return True
+        return False
+
+    def _worker(self):
+        while True:
+            with self.lock:
+                if not self.queue:
+                    self.idle += 1
+                    self.wakeup.wait(IDLE_TIMEOUT)
+                    self.idle -= 1
+                    if not self.queue:
+                        self.workers -= 1
+                        return
+                task = self.queue.popleft()
+                task.state = RUNNING
+            self._run(task)
+
+    def _run(self, task):
+        result = error = None
+        try:
+            if task.cancelled:
+                raise CancelledError()
+            result = task.func(*task.args)
+        except Exception as e:
+            error = e
+            if not isinstance(e, CancelledError):
+                log("Zadanie w tle {}: {}".format(task.key or getattr(task.func, "__name__", "?"), e), ERROR)
+        finally:
+            with self.lock:
+                if task.key is not None and self.inflight.get(task.key) is task:
+                    del self.inflight[task.key]
+        task._finish(result, error)
+
+_pool = None
+_pool_lock = Lock()
+
+def default_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(get_setting("worker_pool_size"))
+        return _pool
+
+def submit(func, args=(), key=None):
+    return default_pool().submit(func, args, key)
+
+class TaskGroup(object):
+    """Zadania należące do jednego ekranu (lub wywołania). Wyniki i postęp dostarczane są
+    przez dispatch(); po cancel() - zwykle w onClose ekranu - już nie, a zadania są zwalniane."""
+
+    def __init__(self, pool=None):
+        self.pool = pool or default_pool()
+        self.tasks = []
+        self.cancelled = False
+
+    def submit(self, func, args=(), on_done=None, key=None):
+        """on_done(zadanie) wywoływane przez dispatch(), o ile grupa nie została anulowana"""
+        task = self.pool.submit(func, args, key)
+        self.tasks.append(task)
+        if on_done is not None:
+            task.add_done_callback(lambda t: self.cancelled or on_done(t))
+        return task
+
+    def call(self, func, *args):
+        """Przekazuje wywołanie (np. postęp z wątku roboczego) przez dispatch(), o ile grupa jest aktywna"""
+        if not self.cancelled:
+            dispatch(lambda: self.cancelled or func(*args))
+
+    def cancel(self):
+        if self.cancelled:
+            return
+        self.cancelled = True
+        for task in self.tasks:
+            self.pool.release(task)
+        self.tasks = []
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+#  MyUpdater Enhanced – deskryptor wtyczki
+#
+#  Enigma2 importuje ten moduł przy każdym starcie GUI, więc poza
+#  PluginDescriptor nie importuje niczego. Ekrany, instalatory i parsery
+#  (plugin_enhanced, core) ładowane są dopiero przy pierwszym main();
+#  przy starcie sesji tylko wtedy, gdy włączono pobieranie w tle.
+#
+from __future__ import print_function, absolute_import
+from Plugins.Plugin import PluginDescriptor
+
+VER = "V5.1"  # <-- ZMIANA WERSJI
+
+def main(session, **kwargs):
+    from .plugin_enhanced import main as open_main
+    return open_main(session, **kwargs)
+
+def sessionstart(reason, session=None, **kwargs):
+    if reason != 0 or session is None:
+        return
+    from .core.common import get_setting
+    if get_setting("prefetch_enabled"):
+        from .plugin_enhanced import start_prefetch
+        start_prefetch(session)
+
+def Plugins(**kwargs):
+    return [PluginDescriptor(where=PluginDescriptor.WHERE_SESSIONSTART, fnc=sessionstart),
+            PluginDescriptor(name="MyUpdater Enhanced",
+                             description="MyUpdater {} (by Paweł Pawełek, na bazie Sancho) - kompatybilny z OpenATV/OpenPLI".format(VER),
+                             where=PluginDescriptor.WHERE_PLUGINMENU,
+                             icon="myupdater.png", fnc=main)]
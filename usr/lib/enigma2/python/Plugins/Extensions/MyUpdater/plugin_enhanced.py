@@ -2,63 +2,34 @@
 #  MyUpdater Enhanced V5.1 – Przebudowa by Paweł Pawełek (na bazie Sancho)
 #  Kompatybilny z logiką list AIO Panel 4.2+
 #
+#  Ekrany wtyczki. Moduł ładowany jest dopiero przy pierwszym otwarciu
+#  (plugin.main), deskryptor dla menu wtyczek jest w plugin.py.
+#
 from __future__ import print_function, absolute_import
 from enigma import eDVBDB
 from Screens.Screen import Screen
 from Screens.Console import Console
 from Screens.MessageBox import MessageBox
 from Screens.ChoiceBox import ChoiceBox
-from Components.ActionMap import ActionMap
+from Screens.Standby import TryQuitMainloop
+from Screens.VirtualKeyBoard import VirtualKeyBoard
+from Components.ActionMap import ActionMap, NumberActionMap
 from Components.MenuList import MenuList
 from Components.Label import Label
-from Plugins.Plugin import PluginDescriptor
-from Tools.Directories import fileExists
+from Components.ScrollLabel import ScrollLabel
 
-import io
-import os, subprocess, json, datetime, traceback, re
-import shutil
+import os, time, hashlib, datetime
 from twisted.internet import reactor
-from threading import Thread
+
+from .core.common import log, flush_log, ensure_dir, get_setting, PLUGIN_TMP_PATH, E2_DIR, ERROR
+from .core import sources, archive, picons, snapshots, lamedb, net, bouquets, jobs, ledger, operations, tasks, opkg, diagnostics, delta, catalog, selfupdate, prefetch
+from .core.system import detect_distribution, get_opkg_command
+from .plugin import VER
 
 PLUGIN_PATH = os.path.dirname(os.path.realpath(__file__))
-PLUGIN_TMP_PATH = "/tmp/MyUpdater/"
-VER = "V5.1"  # <-- ZMIANA WERSJI
-LOG_FILE = "/tmp/MyUpdater_install.log"
 
-def log(msg):
-    try:
-        with io.open(LOG_FILE, "a", encoding='utf-8') as f:
-            f.write(u"{} - {}\n".format(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), msg))
-    except:
-        pass
-
-def detect_distribution():
-    """Detekcja dystrybucji Enigma2"""
-    try:
-        if os.path.exists("/etc/openatv-release"):
-            with open("/etc/openatv-release", 'r') as f:
-                content = f.read().lower()
-                if "7." in content:
-                    return "openatv7"
-                elif "6." in content:
-                    return "openatv6"
-                return "openatv"
-        elif os.path.exists("/etc/openpli-release"):
-            return "openpli"
-        elif os.path.exists("/etc/vti-version-info"):
-            return "vix"
-        else:
-            return "unknown"
-    except:
-        return "unknown"
-
-def get_opkg_command():
-    """Zwraca poprawną komendę opkg dla danej dystrybucji"""
-    distro = detect_distribution()
-    if distro == "openpli":
-        return "opkg --force-overwrite --force-downgrade"
-    else:
-        return "opkg --force-overwrite"
+# Wyniki zadań w tle trafiają do ekranów wyłącznie w wątku reaktora
+tasks.set_dispatcher(reactor.callFromThread)
 
 def msg(session, txt, typ=MessageBox.TYPE_INFO, timeout=6, title="MyUpdater Info"):
     log("Msg: " + txt)
@@ -70,182 +41,529 @@ def console(session, title, cmdlist, onClose, autoClose=True):
         c = session.open(Console, title=title, cmdlist=cmdlist, closeOnSuccess=autoClose)
         c.onClose.append(onClose)
     except Exception as e:
-        log("Console exception: " + str(e))
+        log("Console exception: " + str(e), ERROR)
         onClose()
 
 def tmpdir():
-    if not os.path.exists(PLUGIN_TMP_PATH):
-        os.makedirs(PLUGIN_TMP_PATH)
+    ensure_dir(PLUGIN_TMP_PATH)
 
-def reload_settings_python(session, *args):
+def run_installer(session, title, url, onClose, after=()):
+    """Skrypt instalatora pobierany jest w procesie (core.net, bez wget) i uruchamiany w Console;
+    `after` - dodatkowe polecenia po instalatorze"""
+    path = os.path.join(PLUGIN_TMP_PATH, "installer_{}.sh".format(hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]))
+
+    def download():
+        tmpdir()
+        return net.download(url, path, timeout=30)
+
+    def on_done(task):
+        if task.error is not None:
+            log("Instalator {}: {}".format(url, task.error), ERROR)
+            msg(session, "Nie udało się pobrać instalatora:\n{}".format(task.error), MessageBox.TYPE_ERROR)
+            onClose()
+            return
+        console(session, title, ["/bin/sh {0}; rc=$?; rm -f {0}; exit $rc".format(path)] + list(after), onClose=onClose, autoClose=True)
+
+    tasks.submit(download, key="installer:" + url).add_done_callback(on_done)
+
+def reload_settings_python(session, operation=None, reload=delta.RELOAD_FULL):
+    """Przeładowuje lamedb i bukiety, same bukiety albo nic (`reload` z delta.ChangeSet.reload);
+    czasy kroków trafiają do `operation` (zamyka ją wywołujący)"""
+    if reload == delta.RELOAD_NONE:
+        msg(session, "Listy kanałów bez zmian - przeładowanie pominięte.", timeout=3)
+        return
+    operation = operation or operations.Operation("reload", "Przeładowanie list")
     try:
         db = eDVBDB.getInstance()
-        db.reloadServicelist()
-        db.reloadBouquets()
-        msg(session, "Listy kanałów przeładowane.", timeout=3)
+        if reload == delta.RELOAD_FULL:
+            with operation.span("reload_services"):
+                db.reloadServicelist()
+        with operation.span("reload_bouquets"):
+            db.reloadBouquets()
+        msg(session, "Listy kanałów przeładowane ({}).".format(delta.RELOAD_NAMES[reload]), timeout=3)
     except Exception as e:
-        log("[MyUpdater] Błąd podczas przeładowywania list: " + str(e))
+        log("[MyUpdater] Błąd podczas przeładowywania list: " + str(e), ERROR)
         msg(session, "Wystąpił błąd podczas przeładowywania list.", MessageBox.TYPE_ERROR)
 
-def install_archive_enhanced(session, title, url, finish=None):
-    """Poprawiona wersja instalacji archiwum (TYLKO DLA TYPU 'archive:')"""
+class MyUpdaterProgress(Screen):
+    """Postęp operacji wykonywanej w tle: bieżący etap, ilość danych i czasy etapów.
+    Zamyka się z (ok, wynik lub błąd, operacja); udaną operację zamyka wywołujący."""
+    skin = """<screen position="center,center" size="760,260" title="MyUpdater">
+        <widget name="stage" position="10,10" size="740,40" font="Regular;24" halign="center" valign="center" />
+        <widget name="progress" position="10,60" size="740,40" font="Regular;22" halign="center" valign="center" foregroundColor="yellow" />
+        <widget name="summary" position="10,110" size="740,140" font="Regular;20" halign="center" valign="top" foregroundColor="grey" />
+    </screen>"""
+
+    def __init__(self, session, title, job, kind="install"):
+        Screen.__init__(self, session)
+        self.session = session
+        self.setTitle(title)
+        self.done = False
+        self.operation = operations.Operation(kind, title)
+        self.result = (False, None, self.operation)
+        self.tasks = tasks.TaskGroup()
+        self.onClose.append(self.tasks.cancel)
+
+        self["stage"] = Label("Przygotowanie...")
+        self["progress"] = Label("")
+        self["summary"] = Label("")
+        self["actions"] = ActionMap(["WizardActions"], {"ok": self.exit, "back": self.exit}, -1)
+
+        progress = archive.Progress(lambda *args: self.tasks.call(self._onProgress, *args),
+                                    cancelled=lambda: self.tasks.cancelled)
+
+        def work():
+            try:
+                return job(progress)
+            finally:
+                progress.finish()
+
+        self.tasks.submit(work, on_done=lambda task: self._onDone(task.result, task.error, progress.timings))
+
+    def _onProgress(self, stage, done, total):
+        self["stage"].setText(archive.STAGE_NAMES.get(stage, stage or ""))
+        if stage == "download":
+            mb = done / 1048576.0
+            self["progress"].setText("{:.1f} / {:.1f} MB".format(mb, total / 1048576.0) if total else "{:.1f} MB".format(mb))
+        elif total:
+            self["progress"].setText("{} / {}".format(done, total))
+        else:
+            self["progress"].setText("")
+
+    def _onDone(self, result, error, timings):
+        self.done = True
+        self.result = (error is None, result if error is None else error, self.operation)
+        self.operation.add_timings(timings)
+        if error is not None:
+            self.operation.finish(error)
+        self["stage"].setText("Zakończono" if error is None else "Błąd: {}".format(error))
+        self["progress"].setText("")
+        self["summary"].setText(archive.format_timings(timings))
+        if error is None:
+            reactor.callLater(3, self.exit)
+
+    def exit(self):
+        if self.done and not getattr(self, "closing", False):
+            self.closing = True
+            self.close(*self.result)
+
+def install_archive_enhanced(session, title, url, finish=None, version="", sha256=None, size=None):
+    """Instalacja archiwum (TYLKO DLA TYPU 'archive:') silnikiem core.archive, bez wget/unzip"""
     log("install_archive_enhanced: " + url)
     
-    if url.endswith(".zip"):
-        archive_type = "zip"
-    elif url.endswith((".tar.gz", ".tgz")):
-        archive_type = "tar.gz"
-    else:
+    archive_type = archive.archive_type_of(url)
+    if archive_type is None:
         msg(session, "Nieobsługiwany format archiwum!", MessageBox.TYPE_ERROR)
         if finish: finish()
         return
 
-    tmpdir()
-    tmp_archive_path = os.path.join(PLUGIN_TMP_PATH, os.path.basename(url))
-    
-    cmd_chain = []
-    
-    if "picon" not in title.lower():
-        backup_cmd = "tar -czf /tmp/MyUpdater/backup_$(date +%Y%m%d_%H%M%S).tar.gz -C /etc/enigma2 lamedb *.tv *.radio 2>/dev/null || true"
-        cmd_chain.append(backup_cmd)
-
-    download_cmd = 'wget --no-check-certificate --timeout=30 -t 2 -O "{}" "{}"'.format(tmp_archive_path, url)
-    cmd_chain.append(download_cmd)
-    
-    callback = finish
-    
-    if "picon" in title.lower() and archive_type == "zip":
-        picon_path = "/usr/share/enigma2/picon"
-        tmp_extract_path = "/tmp/MyUpdater_picon_extract"
-        
-        cmd_chain.append("rm -rf " + tmp_extract_path)
-        cmd_chain.append("mkdir -p " + tmp_extract_path)
-        cmd_chain.append("unzip -o -q \"" + tmp_archive_path + "\" -d \"" + tmp_extract_path + "\"")
-        cmd_chain.append("mkdir -p " + picon_path)
-        
-        mv_logic = (
-            "if [ -d \"" + tmp_extract_path + "/picon\" ]; then "
-            "mv -f \"" + tmp_extract_path + "/picon\"/* \"" + picon_path + "/\" 2>/dev/null || true; "
-            "else "
-            "mv -f \"" + tmp_extract_path + "\"/* \"" + picon_path + "/\" 2>/dev/null || true; "
-            "fi"
-        )
-        cmd_chain.append(mv_logic)
-        
-        cmd_chain.append("rm -rf " + tmp_extract_path)
-        cmd_chain.append("rm -f \"" + tmp_archive_path + "\"")
-        cmd_chain.append("echo '>>> Picony zostały pomyślnie zainstalowane.' && sleep 2")
+    is_picon = "picon" in title.lower() and archive_type == "zip"
     
+    if is_picon:
+        job = lambda progress: picons.sync_picons(url, progress, version=version, title=title, sha256=sha256, size=size)
     else:
-        install_script_path = os.path.join(PLUGIN_PATH, "install_archive_script.sh")
-        
-        if not os.path.exists(install_script_path):
-             msg(session, "BŁĄD: Brak pliku install_archive_script.sh!", MessageBox.TYPE_ERROR)
-             if finish: finish()
-             return
-        
-        cmd_chain.append("chmod +x \"{}\"".format(install_script_path))
-        cmd_chain.append("bash {} \"{}\" \"{}\"".format(install_script_path, tmp_archive_path, archive_type))
-        
-        def combined_callback():
-            reload_settings_python(session) 
-            if finish:
-                finish()
-        
-        callback = combined_callback
-    
-    full_command = " && ".join(cmd_chain)
-    
-    console(session, title, [full_command], onClose=callback, autoClose=True)
+        job = lambda progress: archive.install_list_archive(url, archive_type, progress, version=version, title=title,
+                                                            sha256=sha256, size=size)
 
+    def on_done(ok=False, result=None, operation=None):
+        if not ok:
+            msg(session, "Instalacja nie powiodła się:\n{}".format(result), MessageBox.TYPE_ERROR)
+            return
+        if is_picon:
+            operation.finish(detail=picons.describe(result))
+            msg(session, "Picony: {}.".format(picons.describe(result)), timeout=5)
+        else:
+            reload_settings_python(session, operation, result.reload)
+            operation.finish(detail=result.describe())
+        if finish:
+            finish()
+
+    session.openWithCallback(on_done, MyUpdaterProgress, title, job, "picon" if is_picon else "list")
+
+
+LEVI45_INSTALLER = "https://raw.githubusercontent.com/levi-45/Levi45Emulator/main/installer.sh"
+NCAM_INSTALLER = "https://raw.githubusercontent.com/biko-73/Ncam_EMU/main/installer.sh"
 
 def install_oscam_enhanced(session, finish=None):
-    """Inteligentna instalacja oscam z wieloma fallback"""
-    distro = detect_distribution()
-    
+    """Instalacja oscam: pakiety z feedu wyszukiwane w indeksie opkg (bez `opkg list | grep`)
+    i pokazywane do wyboru przed wywołaniem opkg; alternatywnie instalator Levi45"""
+
     def install_callback():
         if finish:
             finish()
-    
-    commands = []
-    commands.append("echo '>>> Aktualizacja feed...' && opkg update")
-    
-    if distro == "openpli":
-        commands.append("echo '>>> Szukanie oscam w feed (OpenPLI)...' && {} install enigma2-plugin-softcams-oscam 2>/dev/null || echo 'Nie znaleziono w feed'".format(get_opkg_command()))
-        commands.append("echo '>>> Próba instalacji alternatywnego źródła...' && wget -q --no-check-certificate https://raw.githubusercontent.com/levi-45/Levi45Emulator/main/installer.sh -O /tmp/oscam_installer.sh && chmod +x /tmp/oscam_installer.sh && /bin/sh /tmp/oscam_installer.sh")
+
+    def update_feeds():
+        console(session, "Aktualizacja feed", ["echo '>>> Aktualizacja feed...' && opkg update"], onClose=find_packages)
+
+    def find_packages():
+        start = time.time()
+        tasks.submit(opkg.load_index).add_done_callback(lambda task: choose(task, time.time() - start))
+
+    def choose(task, elapsed):
+        opts = []
+        if task.error is None:
+            for c in opkg.softcam_candidates(task.result, ("oscam",), limit=8):
+                state = " [zainstalowany {}]".format(c["installed"]) if c["installed"] else ""
+                opts.append(("{} {}{}".format(c["name"], c["version"], state), c["name"]))
+        log("Oscam: {} pakietów w feed ({:.3f} s): {}".format(len(opts), elapsed, ", ".join(o[1] for o in opts)))
+        opts.append(("Alternatywne źródło (instalator Levi45)", "levi45"))
+        opts.append(("Odśwież listę pakietów (opkg update)", "update"))
+        title = "Oscam - pakiety w feed: {}".format(len(opts) - 2) if len(opts) > 2 else "Oscam - brak pakietów w feed"
+        session.openWithCallback(install, ChoiceBox, title=title, list=opts)
+
+    def install(choice):
+        if not choice:
+            return install_callback()
+        if choice[1] == "update":
+            return update_feeds()
+        verify = "echo '>>> Weryfikacja instalacji...' && if [ -f /usr/bin/oscam ] || [ -f /usr/bin/oscam-emu ]; then echo 'Oscam został pomyślnie zainstalowany!'; else echo 'Uwaga: Plik oscam nie został znaleziony, sprawdź logi'; fi"
+        if choice[1] == "levi45":
+            return run_installer(session, "Instalacja Oscam (Levi45)", LEVI45_INSTALLER, install_callback, [verify])
+        commands = ["echo '>>> Instalacja pakietu {0}...' && {1} install {0}".format(choice[1], get_opkg_command()), verify]
+        console(session, "Instalacja Oscam", commands, onClose=install_callback, autoClose=True)
+
+    age = opkg.lists_age()
+    if age is None or age > opkg.LISTS_MAX_AGE:
+        update_feeds()
     else:
-        commands.append("echo '>>> Szukanie oscam w feed...' && PKG=$(opkg list | grep 'oscam.*ipv4only' | grep -E -m1 'master|emu|stable' | cut -d' ' -f1) && if [ -n \"$PKG\" ]; then echo 'Znaleziono pakiet: $PKG' && {} install $PKG; else echo 'Nie znaleziono w feed, używam alternatywnego źródła...' && wget -q --no-check-certificate https://raw.githubusercontent.com/levi-45/Levi45Emulator/main/installer.sh -O /tmp/oscam_installer.sh && chmod +x /tmp/oscam_installer.sh && /bin/sh /tmp/oscam_installer.sh; fi".format(get_opkg_command()))
-    
-    commands.append("echo '>>> Weryfikacja instalacji...' && if [ -f /usr/bin/oscam ] || [ -f /usr/bin/oscam-emu ]; then echo 'Oscam został pomyślnie zainstalowany!'; else echo 'Uwaga: Plik oscam nie został znaleziony, sprawdź logi'; fi")
-    
-    console(session, "Instalacja Oscam", commands, onClose=install_callback, autoClose=True)
+        find_packages()
+
+SOURCE_STATUS_TEXT = {
+    sources.STATUS_PENDING: "pobieranie...",
+    sources.STATUS_OK: "OK",
+    sources.STATUS_EMPTY: "brak wpisów",
+    sources.STATUS_ERROR: "błąd",
+    sources.STATUS_TIMEOUT: "przekroczony czas",
+    sources.STATUS_CACHED: "z pamięci, sprawdzanie...",
+    sources.STATUS_STALE: "z pamięci (offline)",
+}
+
+LIST_PAGE_SIZE = 10
+# Filtr typu wpisów (czerwony): (etykieta, typ w info["type"] lub None)
+LIST_TYPE_FILTERS = [("wszystkie", None)] + [(t, t) for t in catalog.TYPES]
+
+class MyUpdaterLists(Screen):
+    """Przeglądarka list: wyszukiwanie (cyfry pilota jak T9 albo klawiatura - MENU), filtr typu
+    (czerwony) i dostępnych aktualizacji (niebieski), strony po LIST_PAGE_SIZE pozycji.
+    Wpisy dochodzą w miarę jak kolejne źródła kończą pobieranie.
+    OK - instalacja jednej pozycji, żółty - zaznaczenie, zielony - instalacja zaznaczonych"""
+    skin = """<screen position="center,center" size="860,550" title="Wybierz listę do instalacji">
+        <widget name="menu" position="10,10" size="840,400" scrollbarMode="showNever" itemHeight="40" font="Regular;22" />
+        <widget name="filter" position="10,415" size="840,35" font="Regular;20" halign="center" valign="center" foregroundColor="green" />
+        <widget name="status" position="10,455" size="840,85" font="Regular;18" halign="center" valign="center" foregroundColor="yellow" />
+    </screen>"""
 
-def get_repo_lists():
-    """Pobiera listy z manifestu (Logika AIO)"""
-    url = "https://raw.githubusercontent.com/OliOli2013/PanelAIO-Lists/main/manifest.json"
-    tmp = os.path.join(PLUGIN_TMP_PATH, "manifest.json")
-    lst = []
-    try:
-        subprocess.check_call("wget --no-check-certificate -q -T 20 -O {} {}".format(tmp, url), shell=True)
-        with io.open(tmp, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        for item in data:
-            item_type = item.get("type", "LIST").upper()
-            name = item.get('name', 'Brak nazwy')
-            author = item.get('author', '')
-            url = item.get('url', '')
-            
-            if not url: continue
-
-            if item_type == "M3U":
-                bouquet_id = item.get('bouquet_id', 'userbouquet.imported_m3u.tv')
-                bouquet_name = item.get('name', bouquet_id)
-                menu_title = "{} - {} (Dodaj jako Bukiet M3U)".format(name, author)
-                action = "m3u:{}:{}:{}".format(url, bouquet_id, bouquet_name)
-                lst.append((menu_title, action))
-            
-            elif item_type == "BOUQUET":
-                bouquet_id = item.get('bouquet_id', 'userbouquet.imported_ref.tv')
-                bouquet_name = item.get('name', bouquet_id)
-                menu_title = "{} - {} (Dodaj Bukiet REF)".format(name, author)
-                action = "bouquet:{}:{}:{}".format(url, bouquet_id, bouquet_name)
-                lst.append((menu_title, action))
-
-            else: # Domyślnie type == "LIST"
-                version = item.get('version', '')
-                menu_title = "{} - {} ({})".format(name, author, version)
-                action = "archive:{}".format(url)
-                lst.append((menu_title, action))
-            
-    except Exception as e:
-        log("Błąd pobierania repo lists: " + str(e))
-        
-    return lst
+    def __init__(self, session, source_list):
+        Screen.__init__(self, session)
+        self.session = session
+        self.setTitle("Wybierz listę do instalacji (żółty - zaznacz kilka)")
+        self.source_list = source_list
+        self.status = dict((s.name, sources.STATUS_PENDING) for s in source_list)
+        self.marked = []
+        self.catalog = catalog.Catalog(ledger.Ledger())
+        self.query = ""
+        self.digits = True
+        self.type_filter = 0  # indeks w LIST_TYPE_FILTERS
+        self.updates_only = False
+        self.results = []
+        self.page = 0
+        self.tasks = tasks.TaskGroup()
+
+        self["menu"] = MenuList([])
+        self["filter"] = Label("")
+        self["status"] = Label("")
+        self["actions"] = NumberActionMap(["WizardActions", "DirectionActions", "ColorActions", "MenuActions", "NumberActions"],
+                                          {"ok": self.ok, "back": self.back, "menu": self.textSearch,
+                                           "up": self.up, "down": self.down, "left": self.pageUp, "right": self.pageDown,
+                                           "red": self.nextType, "blue": self.toggleUpdates,
+                                           "yellow": self.toggleMark, "green": self.installMarked,
+                                           "1": self.keyNumber, "2": self.keyNumber, "3": self.keyNumber,
+                                           "4": self.keyNumber, "5": self.keyNumber, "6": self.keyNumber,
+                                           "7": self.keyNumber, "8": self.keyNumber, "9": self.keyNumber,
+                                           "0": self.keyNumber}, -1)
+        self.onClose.append(self.tasks.cancel)
+
+        self._search()
+        sources.fetch_all(source_list, self._onSource, self.tasks)
+
+    def _onSource(self, source, status, entries):
+        self.status[source.name] = status
+        if entries is not None:
+            self.catalog.update(source.name, entries)
+        self._search(keep=True)
+
+    @staticmethod
+    def _key(entry):
+        return entry[2]["id"] if len(entry) > 2 else entry[1]
+
+    def _label(self, i):
+        entry, info = self.catalog.entries[i], self.catalog.info(i)
+        state = self.catalog.states[i]
+        if state == catalog.STATE_CURRENT:
+            return entry[0] + " [aktualna]"
+        if state == catalog.STATE_UPDATE:
+            return entry[0] + " [aktualizacja: {} -> {}]".format(self.catalog.ledger.get(info["url"]).get("version") or "?", info["version"])
+        return entry[0]
+
+    def _search(self, keep=False):
+        """Wyniki dla bieżącego zapytania i filtrów; keep - zostaw zaznaczony wpis, jeśli nadal jest w wynikach"""
+        current = self["menu"].getCurrent() if keep else None
+        self.results = self.catalog.search(self.query, self.digits, LIST_TYPE_FILTERS[self.type_filter][1], self.updates_only)
+        self.page, index = 0, 0
+        if current:
+            keys = [self._key(self.catalog.entries[i]) for i in self.results]
+            if self._key(current[1]) in keys:
+                pos = keys.index(self._key(current[1]))
+                self.page, index = divmod(pos, LIST_PAGE_SIZE)
+        self._render(index)
+
+    def _pages(self):
+        return max(1, (len(self.results) + LIST_PAGE_SIZE - 1) // LIST_PAGE_SIZE)
+
+    def _render(self, index=0):
+        """Etykiety tylko dla wpisów bieżącej strony"""
+        marked = set(self._key(e) for e in self.marked)
+        rows = []
+        for i in self.results[self.page * LIST_PAGE_SIZE:(self.page + 1) * LIST_PAGE_SIZE]:
+            entry = self.catalog.entries[i]
+            label = self._label(i)
+            rows.append(("[x] " + label if self._key(entry) in marked else label, entry))
+        self["menu"].setList(rows)
+        if rows:
+            self["menu"].moveToIndex(max(0, min(index, len(rows) - 1)))
+
+        counts, updates = self.catalog.counts()
+        flt = "Typ: {} ({}), aktualizacje: {} ({})".format(
+            LIST_TYPE_FILTERS[self.type_filter][0],
+            counts.get(LIST_TYPE_FILTERS[self.type_filter][1], len(self.catalog.entries)) if self.type_filter else len(self.catalog.entries),
+            "tylko" if self.updates_only else "wszystkie", updates)
+        if self.query:
+            flt = "Szukaj: {}{} | ".format(self.query, " (T9)" if self.digits else "") + flt
+        self["filter"].setText(flt)
+
+        status = " | ".join("{}: {}".format(s.name, SOURCE_STATUS_TEXT[self.status[s.name]]) for s in self.source_list)
+        status += "\nStrona {}/{}, wyników: {} | czerwony - typ, niebieski - aktualizacje, MENU - klawiatura".format(
+            self.page + 1, self._pages(), len(self.results))
+        if self.marked:
+            status += "\nZaznaczono: {} (zielony - instaluj zaznaczone)".format(len(self.marked))
+        if not self.catalog.entries and not set(self.status.values()) & set([sources.STATUS_PENDING, sources.STATUS_CACHED]):
+            status = "Błąd pobierania list. Sprawdź połączenie internetowe."
+        self["status"].setText(status)
+
+    # --- nawigacja po stronach ---
+
+    def up(self):
+        index = self["menu"].getSelectionIndex()
+        if index > 0:
+            self["menu"].moveToIndex(index - 1)
+        elif self.page > 0:
+            self.page -= 1
+            self._render(LIST_PAGE_SIZE - 1)
+
+    def down(self):
+        index = self["menu"].getSelectionIndex()
+        if index < len(self["menu"].list) - 1:
+            self["menu"].moveToIndex(index + 1)
+        elif self.page < self._pages() - 1:
+            self.page += 1
+            self._render(0)
+
+    def pageUp(self):
+        if self.page > 0:
+            self.page -= 1
+            self._render(0)
+        else:
+            self["menu"].moveToIndex(0)
+
+    def pageDown(self):
+        if self.page < self._pages() - 1:
+            self.page += 1
+            self._render(0)
+        elif self["menu"].list:
+            self["menu"].moveToIndex(len(self["menu"].list) - 1)
+
+    # --- wyszukiwanie i filtry ---
+
+    def keyNumber(self, number):
+        if not self.digits:
+            self.query, self.digits = "", True
+        self.query += str(number)
+        self._search()
+
+    def textSearch(self):
+        self.session.openWithCallback(self._onText, VirtualKeyBoard, title="Szukaj (nazwa, autor, typ)",
+                                      text="" if self.digits else self.query)
+
+    def _onText(self, text):
+        if text is not None:
+            self.query, self.digits = text.strip(), False
+            self._search()
+
+    def nextType(self):
+        self.type_filter = (self.type_filter + 1) % len(LIST_TYPE_FILTERS)
+        self._search(keep=True)
+
+    def toggleUpdates(self):
+        self.updates_only = not self.updates_only
+        self._search(keep=True)
+
+    def back(self):
+        """Najpierw cofa wpisane cyfry / czyści zapytanie, potem zamyka"""
+        if self.query:
+            self.query = self.query[:-1] if self.digits else ""
+            self._search(keep=True)
+        else:
+            self.close(None)
 
-def get_s4a_lists():
-    url = "http://s4aupdater.one.pl/s4aupdater_list.txt"
-    tmp = os.path.join(PLUGIN_TMP_PATH, "s4aupdater_list.txt")
-    lst = []
-    try:
-        subprocess.check_call("wget --no-check-certificate -q -T 20 -O {} {}".format(tmp, url), shell=True)
-        urls, vers = {}, {}
-        with io.open(tmp, 'r', encoding='utf-8', errors='ignore') as f:
-            for l in f:
-                l = l.strip()
-                if "_url:" in l:
-                    k, v = l.split(':', 1)
-                    urls[k.strip()] = v.strip()
-                elif "_version:" in l:
-                    k, v = l.split(':', 1)
-                    vers[k.strip()] = v.strip()
-        for k, u in urls.items():
-            name = k.replace('_url', '').replace('_', ' ').title()
-            ver = vers.get(k.replace('_url', '_version'), "brak daty")
-            lst.append(("{} - {}".format(name, ver), "archive:{}".format(u)))
-    except Exception as e:
-        log("Błąd pobierania s4a lists: " + str(e))
-    return [i for i in lst if not any(x in i[0].lower() for x in ['bzyk', 'jakitaki'])]
+    # --- wybór ---
+
+    def toggleMark(self):
+        sel = self["menu"].getCurrent()
+        if not sel:
+            return
+        entry = sel[1]
+        keys = [self._key(e) for e in self.marked]
+        if self._key(entry) in keys:
+            del self.marked[keys.index(self._key(entry))]
+        else:
+            self.marked.append(entry)
+        self._render(self["menu"].getSelectionIndex())
+
+    def installMarked(self):
+        if self.marked:
+            self.close(list(self.marked))
+
+    def ok(self):
+        sel = self["menu"].getCurrent()
+        if sel:
+            self.close(sel[1])
+
+QUEUE_STATUS_TEXT = {
+    jobs.STATUS_WAITING: "oczekuje",
+    jobs.STATUS_DOWNLOADING: "pobieranie",
+    jobs.STATUS_PROBING: "sprawdzanie strumieni",
+    jobs.STATUS_READY: "pobrano, czeka na instalację",
+    jobs.STATUS_INSTALLING: "instalacja...",
+    jobs.STATUS_DONE: "gotowe",
+    jobs.STATUS_ERROR: "błąd",
+    jobs.STATUS_CANCELLED: "anulowano",
+    jobs.STATUS_SKIPPED: "aktualna, pominięto",
+}
+
+class MyUpdaterQueue(Screen):
+    """Kolejka instalacji: stan i czasy każdej pozycji, jedno przeładowanie list na końcu"""
+    skin = """<screen position="center,center" size="860,550" title="Kolejka instalacji">
+        <widget name="menu" position="10,10" size="840,420" scrollbarMode="showOnDemand" itemHeight="40" font="Regular;20" />
+        <widget name="status" position="10,440" size="840,100" font="Regular;18" halign="center" valign="center" foregroundColor="yellow" />
+    </screen>"""
+
+    def __init__(self, session, entries, force=False):
+        Screen.__init__(self, session)
+        self.session = session
+        self.setTitle("Kolejka instalacji ({} poz.)".format(len(entries)))
+        self.finished = False
+        self.tasks = tasks.TaskGroup()
+        self.onClose.append(self.tasks.cancel)
+        self.queue = jobs.InstallQueue([jobs.Job(*e[:3]) for e in entries],
+                                       on_update=lambda job: self.tasks.call(self._refresh), force=force)
+
+        self["menu"] = MenuList([])
+        self["status"] = Label("Pobieranie (równolegle: {})...".format(self.queue.max_downloads))
+        self["actions"] = ActionMap(["WizardActions", "DirectionActions"],
+                                    {"ok": self.exit, "back": self.cancel}, -1)
+        self._refresh()
+        self.queue.start(lambda queue: self._onDone(), self.tasks)
+
+    @staticmethod
+    def _describe(job):
+        txt = QUEUE_STATUS_TEXT[job.status]
+        if job.status == jobs.STATUS_DOWNLOADING and job.done:
+            txt += " {:.1f} MB".format(job.done / 1048576.0)
+        elif job.status == jobs.STATUS_PROBING and job.total:
+            txt += " {}/{}".format(job.done, job.total)
+        elif job.status == jobs.STATUS_ERROR:
+            txt += ": {}".format(job.error)
+        elif job.status == jobs.STATUS_DONE and job.result:
+            txt += ", {}".format(job.result)
+        if job.timings:
+            txt += " ({})".format(" + ".join("{:.1f} s".format(job.timings[k]) for k in ("download", "probe", "install") if k in job.timings))
+        return "{} - {}".format(job.title, txt)
+
+    def _refresh(self):
+        self["menu"].setList([(self._describe(j), j) for j in self.queue.jobs])
+
+    def _onDone(self):
+        self.finished = True
+        self._refresh()
+        ok = len([j for j in self.queue.jobs if j.status == jobs.STATUS_DONE])
+        summary = "Zainstalowano {} z {}. ".format(ok, len(self.queue.jobs))
+        summary += ", ".join("{}: {:.1f} s".format(archive.STAGE_NAMES.get(k, k), t) for k, t in self.queue.timings)
+        reload = self.queue.changes.reload
+        if reload != delta.RELOAD_NONE:
+            reload_settings_python(self.session, self.queue.operation, reload)
+            summary += "\nListy kanałów przeładowane jednokrotnie ({}).".format(delta.RELOAD_NAMES[reload])
+        elif [j for j in self.queue.jobs if j.status == jobs.STATUS_DONE and j.kind != jobs.KIND_PICON]:
+            summary += "\nListy bez zmian - przeładowanie pominięte."
+        failed = len([j for j in self.queue.jobs if j.status == jobs.STATUS_ERROR])
+        self.queue.operation.finish(status=operations.STATUS_ERROR if failed else None,
+                                    detail="{} z {} poz.".format(ok, len(self.queue.jobs)))
+        self["status"].setText(summary + "\nOK - zamknij")
+
+    def cancel(self):
+        if self.finished:
+            self.close()
+        elif not self.queue.cancelled:
+            self.queue.cancel()
+            self["status"].setText("Anulowanie - trwające pobrania zostaną dokończone...")
+
+    def exit(self):
+        if self.finished:
+            self.close()
+
+class MyUpdaterDiagnostic(Screen):
+    """Raport diagnostyki (core.diagnostics): sprawdzenia równoległe, wynik z ostatnich
+    diagnostic_ttl sekund pokazywany od razu. Zielony - sprawdź ponownie"""
+    skin = """<screen position="center,center" size="860,550" title="Diagnostyka Systemu">
+        <widget name="text" position="10,10" size="840,470" font="Regular;20" />
+        <widget name="status" position="10,490" size="840,50" font="Regular;18" halign="center" valign="center" foregroundColor="yellow" />
+    </screen>"""
+
+    def __init__(self, session):
+        Screen.__init__(self, session)
+        self.session = session
+        self.setTitle("Diagnostyka Systemu")
+        self.tasks = tasks.TaskGroup()
+        self.onClose.append(self.tasks.cancel)
+
+        self["text"] = ScrollLabel("")
+        self["status"] = Label("")
+        self["actions"] = ActionMap(["WizardActions", "DirectionActions", "ColorActions"],
+                                    {"ok": self.close, "back": self.close, "green": lambda: self.refresh(True),
+                                     "up": self["text"].pageUp, "down": self["text"].pageDown,
+                                     "left": self["text"].pageUp, "right": self["text"].pageDown}, -1)
+        self.refresh()
+
+    def refresh(self, force=False):
+        self["status"].setText("Trwa diagnostyka...")
+        self.tasks.submit(diagnostics.collect, (force,), key="diagnostics",
+                          on_done=lambda task: self._onReport(task.result, task.error))
+
+    def _onReport(self, report, error):
+        if error is not None:
+            self["text"].setText("Błąd diagnostyki: {}".format(error))
+            self["status"].setText("Zielony - sprawdź ponownie")
+            return
+        self["text"].setText(diagnostics.format_report(report))
+        self["status"].setText("Raport JSON: {}\nZielony - sprawdź ponownie, OK - zamknij".format(diagnostics.REPORT_FILE))
+
+VERSION_URL = "https://raw.githubusercontent.com/OliOli2013/MyUpdater-Plugin/main/version.txt"
+INSTALLER_URL = "https://raw.githubusercontent.com/OliOli2013/MyUpdater-Plugin/main/installer.sh"
+
+OPERATION_STATUS_TEXT = {
+    operations.STATUS_OK: "OK",
+    operations.STATUS_ERROR: "błąd",
+    operations.STATUS_CANCELLED: "anulowano",
+}
 
 class MyUpdaterEnhanced(Screen):
     # <-- ZMIENIONO ROZMIAR OKNA I ELEMENTÓW WEWNĘTRZNYCH -->
@@ -263,15 +581,15 @@ class MyUpdaterEnhanced(Screen):
         
         self.distro = detect_distribution()
         
-        self.wait_message_box = None 
-        
         self["menu"] = MenuList([
             ("1. Listy kanałów", "menu_lists"),
             ("2. Instaluj Softcam (Oscam/nCam)", "menu_softcam"),
             ("3. Pobierz Picony Transparent", "picons_github"),
             ("4. Aktualizacja Wtyczki", "plugin_update"),
             ("5. Informacja o Wtyczce", "plugin_info"),
-            ("6. Diagnostyka Systemu", "system_diagnostic")
+            ("6. Diagnostyka Systemu", "system_diagnostic"),
+            ("7. Przywróć kopię list kanałów", "snapshot_restore"),
+            ("8. Ostatnie operacje", "operations")
         ])
         
         self["info"] = Label("Wybierz opcję i naciśnij OK")
@@ -280,9 +598,9 @@ class MyUpdaterEnhanced(Screen):
                                     {"ok": self.runMenuOption, "back": self.close}, -1)
         
         tmpdir()
-        if fileExists(LOG_FILE):
-            try: os.remove(LOG_FILE)
-            except: pass
+        self.tasks = tasks.TaskGroup()
+        self.onClose.append(self.tasks.cancel)
+        self.onClose.append(flush_log)
         
         log(u"MyUpdater Enhanced {} started on {}".format(VER, self.distro))
         
@@ -290,6 +608,10 @@ class MyUpdaterEnhanced(Screen):
             self["info"].setText("Wykryto system: {}".format(self.distro))
         else:
             self["info"].setText("Nieznany system - używam trybu uniwersalnego")
+        # Aktualizację znalezioną w tle widać od razu, bez sprawdzania online
+        update = prefetch.plugin_update()
+        if update and selfupdate.is_newer(update["version"], VER):
+            self["info"].setText("Dostępna aktualizacja wtyczki {} - opcja 4".format(update["version"]))
 
     def runMenuOption(self):
         sel = self["menu"].getCurrent()
@@ -309,214 +631,147 @@ class MyUpdaterEnhanced(Screen):
             self.runInfo()
         elif key == "system_diagnostic":
             self.runDiagnostic()
+        elif key == "snapshot_restore":
+            self.runSnapshotMenu()
+        elif key == "operations":
+            self.runOperationsMenu()
 
     def runChannelListMenu(self):
-        self["info"].setText("Pobieram listy...")
-        Thread(target=self._bgLists).start()
-
-    def _bgLists(self):
-        repo = get_repo_lists()
-        s4a = get_s4a_lists()
-        all_lists = repo + s4a
-        reactor.callFromThread(self._onLists, all_lists)
-
-    def _onLists(self, lst):
-        self["info"].setText("Wybierz opcję i naciśnij OK")
-        if not lst:
-            msg(self.session, "Błąd pobierania list. Sprawdź połączenie internetowe.", MessageBox.TYPE_ERROR)
-            return
         self.session.openWithCallback(self.runChannelListSelected,
-                                      ChoiceBox, title="Wybierz listę do instalacji", list=lst)
+                                      MyUpdaterLists, sources.configured_sources())
 
-    def runChannelListSelected(self, choice):
+    def runChannelListSelected(self, choice, force=False):
         """Dyspozytor akcji dla list (Logika AIO)"""
         if not choice: return
+        if isinstance(choice, list):
+            log("Kolejka: " + ", ".join(e[0] for e in choice))
+            self.session.open(MyUpdaterQueue, choice)
+            return
         
         title = choice[0]
         action = choice[1]
+        info = choice[2] if len(choice) > 2 else {}
+        version = info.get("version", "")
         log("Selected: {} | {}".format(title, action))
 
+        installed = ledger.Ledger()
+        if not force and installed.is_current(info.get("url"), version):
+            when = datetime.datetime.fromtimestamp(installed.get(info["url"])["installed"]).strftime("%Y-%m-%d %H:%M")
+            self.session.openWithCallback(
+                lambda ans: ans and self.runChannelListSelected(choice, force=True),
+                MessageBox, "'{}' w wersji {} jest już zainstalowana ({}).\n\nZainstalować ponownie?".format(title, version, when),
+                type=MessageBox.TYPE_YESNO, default=False)
+            return
+
         if action.startswith("archive:"):
             try:
                 url = action.split(':', 1)[1]
                 msg(self.session, "Rozpoczynam instalację (archiwum):\n'{}'...".format(title), timeout=5)
                 install_archive_enhanced(self.session, title, url,
-                                         finish=lambda: msg(self.session, "Instalacja '{}' zakończona.".format(title), timeout=3))
+                                         finish=lambda: msg(self.session, "Instalacja '{}' zakończona.".format(title), timeout=3),
+                                         version=version, sha256=info.get("sha256"), size=info.get("size"))
             except IndexError:
-                msg(self.session, "Błąd: Nieprawidłowy format akcji archive.", message_type=MessageBox.TYPE_ERROR)
+                msg(self.session, "Błąd: Nieprawidłowy format akcji archive.", MessageBox.TYPE_ERROR)
                 log("Błąd parsowania archive: " + action)
 
         elif action.startswith("m3u:"):
-            try:
-                parts = action.split(':', 3)
-                url = parts[1] + ":" + parts[2]
-                bouquet_info = parts[3].split(':', 1)
-                bouquet_id = bouquet_info[0]
-                bouquet_name = bouquet_info[1] if len(bouquet_info) > 1 else bouquet_id
-                msg(self.session, "Rozpoczynam dodawanie bukietu M3U:\n'{}'...".format(title), timeout=3)
-                self.install_m3u_as_bouquet(title, url, bouquet_id, bouquet_name)
-            except Exception as e:
-                msg(self.session, "Błąd parsowania akcji M3U: {}".format(e), message_type=MessageBox.TYPE_ERROR)
-                log("Błąd parsowania M3U: {} | {}".format(action, e))
+            # Pobranie, konwersja i rejestracja bukietu(ów) - kolejka z jedną pozycją
+            self.session.open(MyUpdaterQueue, [choice], force=True)
         
         elif action.startswith("bouquet:"):
             try:
-                parts = action.split(':', 3)
-                url = parts[1] + ":" + parts[2]
-                bouquet_info = parts[3].split(':', 1)
-                bouquet_id = bouquet_info[0]
-                bouquet_name = bouquet_info[1] if len(bouquet_info) > 1 else bouquet_id
+                kind, url, bouquet_id, bouquet_name = jobs.parse_action(title, action)
                 msg(self.session, "Rozpoczynam dodawanie bukietu REF:\n'{}'...".format(title), timeout=3)
-                self.install_bouquet_reference(title, url, bouquet_id, bouquet_name)
+                self.install_bouquet_reference(title, url, bouquet_id, bouquet_name, version)
             except Exception as e:
-                msg(self.session, "Błąd parsowania akcji BOUQUET: {}".format(e), message_type=MessageBox.TYPE_ERROR)
-                log("Błąd parsowania BOUQUET: {} | {}".format(action, e))
+                msg(self.session, "Błąd parsowania akcji BOUQUET: {}".format(e), MessageBox.TYPE_ERROR)
+                log("Błąd parsowania BOUQUET: {} | {}".format(action, e), ERROR)
                 
         else:
             log("Nieznana akcja: " + action)
-            msg(self.session, "Nieznany typ akcji: {}".format(action), message_type=MessageBox.TYPE_ERROR)
+            msg(self.session, "Nieznany typ akcji: {}".format(action), MessageBox.TYPE_ERROR)
 
     
-    def install_bouquet_reference(self, title, url, bouquet_id, bouquet_name):
-        """Instaluje plik bukietu .tv (tylko referencje, bez lamedb). (Logika AIO)"""
+    def install_bouquet_reference(self, title, url, bouquet_id, bouquet_name, version=""):
+        """Pobiera bukiet referencyjny i przed instalacją sprawdza, ile kanałów ma pokrycie w lamedb. (Logika AIO)"""
         log("install_bouquet_reference: {} | {} | {}".format(title, url, bouquet_id))
-        
-        e2_dir = "/etc/enigma2"
-        bouquets_tv_path = os.path.join(e2_dir, "bouquets.tv")
-        target_bouquet_path = os.path.join(e2_dir, bouquet_id)
         tmp_bouquet_path = os.path.join(PLUGIN_TMP_PATH, bouquet_id)
 
-        cmd = """
-        echo "Pobieranie pliku bukietu referencyjnego..."
-        wget -T 30 --no-check-certificate -O "{tmp_path}" "{url}"
-        if [ $? -eq 0 ] && [ -s "{tmp_path}" ]; then
-            echo "Instalowanie bukietu..."
-            mv "{tmp_path}" "{target_path}"
-            BOUQUET_ENTRY='#SERVICE 1:7:1:0:0:0:0:0:0:0:FROM BOUQUET "{b_id}" ORDER BY bouquet'
-            if ! grep -q -F "{b_id}" "{bq_tv_path}"; then
-                echo "Dodawanie wpisu do bouquets.tv..."
-                echo "$BOUQUET_ENTRY" >> "{bq_tv_path}"
-            else
-                echo "Wpis dla {b_id} już istnieje w bouquets.tv."
-            fi
-            echo "Instalacja bukietu zakończona."
-            echo " "
-            echo "!!! UWAGA !!!"
-            echo "To jest bukiet referencyjny. Kanały będą działać (nie będą 'N/A')"
-            echo "TYLKO jeśli Twoja główna lista (np. bzyk83) zawiera pasujący plik lamedb!"
-            echo " "
-            sleep 8
-        else
-            echo "BŁĄD: Nie udało się pobrać pliku bukietu."
-            sleep 5
-        fi
-        """.format(
-            url=url,
-            tmp_path=tmp_bouquet_path,
-            target_path=target_bouquet_path,
-            b_id=bouquet_id,
-            bq_tv_path=bouquets_tv_path
-        )
-        
-        console(self.session, title, [cmd], 
-                onClose=lambda: reload_settings_python(self.session), 
-                autoClose=True)
-
-    def install_m3u_as_bouquet(self, title, url, bouquet_id, bouquet_name):
-        """Pobiera M3U, konwertuje je w locie na bukiet E2 i dodaje do listy. (Logika AIO)"""
-        log("install_m3u_as_bouquet: {} | {} | {}".format(title, url, bouquet_id))
-        tmp_m3u_path = os.path.join(PLUGIN_TMP_PATH, "temp.m3u")
-        download_cmd = "wget -T 30 --no-check-certificate -O \"{}\" \"{}\"".format(tmp_m3u_path, url)
-        
-        self.wait_message_box = None
-        
-        def on_download_finished(*args):
-            if not (fileExists(tmp_m3u_path) and os.path.getsize(tmp_m3u_path) > 0):
-                msg(self.session, "Błąd: Nie udało się pobrać pliku M3U.", message_type=MessageBox.TYPE_ERROR)
+        def job(progress):
+            progress.stage("download")
+            resp = net.fetch(url, timeout=30)
+            if not resp.body.strip():
+                raise Exception("Pobrany plik bukietu jest pusty")
+            tmpdir()
+            with open(tmp_bouquet_path, "wb") as f:
+                f.write(resp.body)
+            progress.stage("check")
+            index = lamedb.load_index()
+            if index is None:
+                return None
+            return lamedb.check_bouquet(resp.body.decode("utf-8", "ignore").splitlines(), index)
+
+        def on_checked(ok=False, check=None, operation=None):
+            if not ok:
+                msg(self.session, "BŁĄD: Nie udało się pobrać pliku bukietu.\n{}".format(check), MessageBox.TYPE_ERROR)
                 return
-            
-            self.wait_message_box = self.session.open(MessageBox, "Pobrano plik M3U.\nTrwa konwersja na bukiet E2...\nProszę czekać.", MessageBox.TYPE_INFO, enable_input=False)
-            
-            Thread(target=self._parse_m3u_thread, args=(tmp_m3u_path, bouquet_id, bouquet_name)).start()
-
-        console(self.session, "Pobieranie M3U: " + title, [download_cmd], 
-                onClose=on_download_finished, 
-                autoClose=True)
-
-    def _parse_m3u_thread(self, tmp_m3u_path, bouquet_id, bouquet_name):
-        """Wątek roboczy do parsowania M3U i tworzenia pliku bukietu. (Logika AIO)"""
-        try:
-            e2_bouquet_path = os.path.join(PLUGIN_TMP_PATH, bouquet_id)
-            e2_lines = [u"#NAME {}\n".format(bouquet_name)]
-            channel_name = u"N/A"
-            
-            with io.open(tmp_m3u_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    line = line.strip()
-                    if line.startswith('#EXTINF:'):
-                        try:
-                            channel_name = line.split(',')[-1].strip()
-                        except:
-                            channel_name = u"Brak Nazwy"
-                    elif line.startswith('http://') or line.startswith('https://'):
-                        formatted_url = line.replace(':', '%3a')
-                        e2_lines.append(u"#SERVICE 4097:0:1:0:0:0:0:0:0:0:{}:{}\n".format(formatted_url, channel_name))
-                        channel_name = u"N/A"
-            
-            if len(e2_lines) <= 1:
-                raise Exception("Nie znaleziono kanałów w pliku M3U")
-
-            with io.open(e2_bouquet_path, 'w', encoding='utf-8') as f:
-                f.writelines(e2_lines)
-
-            reactor.callFromThread(self._install_parsed_bouquet, e2_bouquet_path, bouquet_id)
-
-        except Exception as e:
-            log("[MyUpdater] Błąd parsowania M3U: " + str(e))
-            if self.wait_message_box: 
-                reactor.callFromThread(self.wait_message_box.close)
-            reactor.callFromThread(msg, self.session, "Błąd parsowania pliku M3U:\n{}".format(e), message_type=MessageBox.TYPE_ERROR)
-
-    def _install_parsed_bouquet(self, tmp_bouquet_path, bouquet_id):
-        """Wywoływane w głównym wątku: Kopiuje plik bukietu i aktualizuje bouquets.tv. (Logika AIO)"""
-        if self.wait_message_box:
-            try:
-                reactor.callFromThread(self.wait_message_box.close)
-            except:
-                pass
-            
-        e2_dir = "/etc/enigma2"
-        bouquets_tv_path = os.path.join(e2_dir, "bouquets.tv")
-        target_bouquet_path = os.path.join(e2_dir, bouquet_id)
+            if check is None:
+                txt = "Nie znaleziono pliku lamedb - nie można sprawdzić kanałów."
+            else:
+                log("Bukiet {}: {}".format(bouquet_id, check))
+                txt = lamedb.describe_check(check)
+
+            def on_answer(ans):
+                if ans:
+                    self._install_parsed_bouquet([(bouquet_id, tmp_bouquet_path)],
+                                                 (url, version, ledger.file_hash(tmp_bouquet_path), "bouquet", title), operation)
+                else:
+                    os.remove(tmp_bouquet_path)
+                    operation.finish(status=operations.STATUS_CANCELLED)
+
+            self.session.openWithCallback(
+                on_answer, MessageBox, "Bukiet referencyjny '{}'\n\n{}\n\nZainstalować bukiet?".format(bouquet_name, txt),
+                type=MessageBox.TYPE_YESNO, title=title)
+
+        self.session.openWithCallback(on_checked, MyUpdaterProgress, title, job, "bouquet")
+
+    def _install_parsed_bouquet(self, bouquet_files, record=None, operation=None):
+        """Wywoływane w głównym wątku: Kopiuje pliki bukietów [(bouquet_id, ścieżka)] i rejestruje je w bouquets.tv jednym zapisem.
+        `record` to argumenty ledger.record() zapisywane po udanej instalacji. (Logika AIO)"""
+        e2_dir = E2_DIR
+        operation = operation or operations.Operation("bouquet", ", ".join(b[0] for b in bouquet_files))
         
         try:
-            shutil.move(tmp_bouquet_path, target_bouquet_path)
+            with operation.span("install"):
+                changes = delta.diff(bouquet_files, e2_dir).apply(e2_dir)
         except Exception as e:
-            msg(self.session, "Błąd kopiowania bukietu: {}".format(e), message_type=MessageBox.TYPE_ERROR)
+            operation.finish(e)
+            msg(self.session, "Błąd kopiowania bukietu: {}".format(e), MessageBox.TYPE_ERROR)
             return
 
         try:
-            entry_to_add = u'#SERVICE 1:7:1:0:0:0:0:0:0:0:FROM BOUQUET "{}" ORDER BY bouquet\n'.format(bouquet_id)
-            entry_exists = False
-            
-            if fileExists(bouquets_tv_path):
-                with io.open(bouquets_tv_path, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        if bouquet_id in line:
-                            entry_exists = True
-                            break
-            
-            if not entry_exists:
-                with io.open(bouquets_tv_path, 'a', encoding='utf-8') as f:
-                    f.write(entry_to_add)
-            
+            with operation.span("bouquets"):
+                with bouquets.transaction(e2_dir) as registry:
+                    added = [b_id for b_id, path in bouquet_files if registry.add(b_id)]
         except Exception as e:
-            msg(self.session, "Błąd edycji bouquets.tv: {}".format(e), message_type=MessageBox.TYPE_ERROR)
+            operation.finish(e)
+            msg(self.session, "Błąd edycji bouquets.tv: {}".format(e), MessageBox.TYPE_ERROR)
             return
-
-        m = "Bukiet '{}' został pomyślnie dodany.\nPrzeładowuję listy...".format(bouquet_id) if not entry_exists else "Bukiet '{}' został zaktualizowany.\nPrzeładowuję listy...".format(bouquet_id)
-        msg(self.session, m, message_type=MessageBox.TYPE_INFO, timeout=5)
-        reload_settings_python(self.session)
+        for b_id in added:
+            changes.add(bouquets.KINDS[os.path.splitext(b_id)[1]][0])
+        if record:
+            ledger.record(*record)
+
+        names = ", ".join(b[0] for b in bouquet_files)
+        if added:
+            m = "Bukiet '{}' został pomyślnie dodany.".format(names)
+        elif changes.written:
+            m = "Bukiet '{}' został zaktualizowany ({}).".format(names, changes.describe())
+        else:
+            m = "Bukiet '{}' jest aktualny - bez zmian.".format(names)
+        msg(self.session, m, MessageBox.TYPE_INFO, timeout=5)
+        reload_settings_python(self.session, operation, changes.reload)
+        operation.finish(detail="dodano" if added else changes.describe())
 
 
     def runSoftcamMenu(self):
@@ -538,14 +793,12 @@ class MyUpdaterEnhanced(Screen):
             install_oscam_enhanced(self.session, finish=lambda: msg(self.session, "Instalacja oscam zakończona.", timeout=3))
         
         elif key == "oscam_levi45":
-            cmd = "wget -q --no-check-certificate https://raw.githubusercontent.com/levi-45/Levi45Emulator/main/installer.sh -O- | sh"
             msg(self.session, "Instaluję {}...".format(title), timeout=2)
-            console(self.session, title, [cmd], onClose=lambda: None, autoClose=True)
+            run_installer(self.session, title, LEVI45_INSTALLER, onClose=lambda: None)
         
         elif key == "ncam_biko":
-            cmd = "wget -q https://raw.githubusercontent.com/biko-73/Ncam_EMU/main/installer.sh -O- | sh"
             msg(self.session, "Instaluję {}...".format(title), timeout=2)
-            console(self.session, title, [cmd], onClose=lambda: None, autoClose=True)
+            run_installer(self.session, title, NCAM_INSTALLER, onClose=lambda: None)
         
         elif key == "remove_softcam":
             commands = [
@@ -556,53 +809,119 @@ class MyUpdaterEnhanced(Screen):
             ]
             console(self.session, "Usuwanie softcamów", commands, onClose=lambda: msg(self.session, "Softcamy usunięte.", timeout=3), autoClose=True)
 
+    def runSnapshotMenu(self):
+        snaps = snapshots.SnapshotStore().list()
+        if not snaps:
+            msg(self.session, "Brak zapisanych kopii list kanałów.", MessageBox.TYPE_INFO)
+            return
+        opts = [(snapshots.describe(s), s["id"]) for s in snaps]
+        self.session.openWithCallback(self.runSnapshotSelected,
+                                      ChoiceBox, title="Przywróć listy z kopii", list=opts)
+
+    def runSnapshotSelected(self, choice):
+        if not choice: return
+        title, snap_id = choice[0], choice[1]
+        self.session.openWithCallback(lambda ans: self._doSnapshotRestore(snap_id) if ans else None,
+                                      MessageBox, "Przywrócić listy kanałów z kopii:\n{}?".format(title),
+                                      type=MessageBox.TYPE_YESNO, title="Przywracanie kopii")
+
+    def _doSnapshotRestore(self, snap_id):
+        operation = operations.Operation("restore", "Przywrócenie kopii {}".format(snap_id))
+        try:
+            with operation.span("install"):
+                restored, removed = snapshots.SnapshotStore().restore(snap_id)
+        except Exception as e:
+            operation.finish(e)
+            msg(self.session, "Błąd przywracania kopii:\n{}".format(e), MessageBox.TYPE_ERROR)
+            return
+        reload_settings_python(self.session, operation, delta.RELOAD_FULL if restored or removed else delta.RELOAD_NONE)
+        operation.finish(detail="{} zapisanych, {} usuniętych".format(restored, removed))
+
+    def runOperationsMenu(self):
+        records = operations.recent()
+        if not records:
+            msg(self.session, "Brak zapisanych operacji.", MessageBox.TYPE_INFO)
+            return
+        opts = []
+        for r in records:
+            when = datetime.datetime.fromtimestamp(r["started"]).strftime("%Y-%m-%d %H:%M")
+            state = "" if r["status"] == operations.STATUS_OK else " [{}]".format(OPERATION_STATUS_TEXT.get(r["status"], r["status"]))
+            opts.append(("{} {} - {:.1f} s{}".format(when, r["title"], r["duration"], state), r))
+        self.session.openWithCallback(self.runOperationSelected,
+                                      ChoiceBox, title="Ostatnie operacje", list=opts)
+
+    def runOperationSelected(self, choice):
+        if not choice: return
+        r = choice[1]
+        lines = ["{:.1f} s  {}  ({:.0f}%)".format(t, operations.STAGE_NAMES.get(s, s), share)
+                 for s, t, share in operations.breakdown(r)]
+        txt = "{}\nCzas całkowity: {:.1f} s, stan: {}\n{}\n\n{}".format(
+            r["title"], r["duration"], OPERATION_STATUS_TEXT.get(r["status"], r["status"]), r.get("detail", ""),
+            "\n".join(lines) or "Brak zarejestrowanych etapów")
+        if len(r.get("spans", [])) > len(lines):
+            txt += "\n\nSzczegóły:\n" + operations.format_spans(r["spans"][:15])
+        self.session.open(MessageBox, txt, MessageBox.TYPE_INFO, title="Czasy etapów")
+
     def runPiconGitHub(self):
         url = "https://github.com/OliOli2013/PanelAIO-Plugin/raw/main/Picony.zip"
         title = "Pobieranie Picon (Transparent)" 
         log("Picons: " + url)
         msg(self.session, "Rozpoczynam pobieranie picon...", timeout=2)
-        install_archive_enhanced(self.session, title, url,
-                                 finish=lambda: msg(self.session, "Picony gotowe.", timeout=3))
+        install_archive_enhanced(self.session, title, url)
 
     def runPluginUpdate(self):
         msg(self.session, "Sprawdzam aktualizację...", timeout=3)
         self["info"].setText("Sprawdzam wersję online...")
-        Thread(target=self._bgUpdate).start()
+        # Ponowne OK w trakcie sprawdzania dołącza do tego samego zadania
+        self.tasks.submit(self._bgUpdate, key="plugin_version", on_done=lambda task: self._onUpdate(task.result))
 
     def _bgUpdate(self):
-        ver_url = "https://raw.githubusercontent.com/OliOli2013/MyUpdater-Plugin/main/version.txt"
-        inst_url = "https://raw.githubusercontent.com/OliOli2013/MyUpdater-Plugin/main/installer.sh"
-        tmp_ver = os.path.join(PLUGIN_TMP_PATH, "version.txt")
-        online = None
+        """selfupdate.Update z manifestu wydania; dla wydań bez update.json - wersja z version.txt"""
         try:
-            subprocess.check_call("wget --no-check-certificate -q -T 10 -O {} {}".format(tmp_ver, ver_url), shell=True)
-            with io.open(tmp_ver, 'r', encoding='utf-8') as f: 
-                online = f.read().strip()
-        except:
-            pass
-        if fileExists(tmp_ver):
-            os.remove(tmp_ver)
-        reactor.callFromThread(self._onUpdate, online, inst_url)
-
-    def _onUpdate(self, online, inst_url):
+            try:
+                return selfupdate.check(VER, PLUGIN_PATH)
+            except net.HTTPError as e:
+                if e.code != 404:
+                    raise
+                log("Brak manifestu aktualizacji, sprawdzam version.txt")
+            return net.fetch(VERSION_URL, timeout=10).body.decode("utf-8", "ignore").strip()
+        except Exception as e:
+            log("Sprawdzanie wersji: {}".format(e), ERROR)
+            return None
+
+    def _onUpdate(self, online):
         self["info"].setText("Wybierz opcję i naciśnij OK")
         if not online:
             msg(self.session, "Nie udało się sprawdzić wersji. Sprawdź połączenie.", MessageBox.TYPE_ERROR)
             return
-        
-        # Porównuje tylko główną wersję (np. V5.1 vs V5.2), ignoruje tekst w nawiasach
-        current_ver_base = VER.split(" ")[0]
-        
-        if online and online != current_ver_base:
-            txt = "Dostępna nowa wersja: {}\nTwoja: {}\nZaktualizować?".format(online, VER)
-            self.session.openWithCallback(lambda ans: self._doUpdate(inst_url) if ans else None,
-                                          MessageBox, txt, type=MessageBox.TYPE_YESNO, title="Aktualizacja")
-        else:
+        update = online if isinstance(online, selfupdate.Update) else None
+        version = update.version if update else online
+        # Kolejność wersji jak w opkg: V5.10 jest nowsza niż V5.9, "V5.1 Enhanced" to V5.1
+        if not selfupdate.is_newer(version, VER):
             msg(self.session, "Używasz najnowszej wersji ({}).".format(VER), MessageBox.TYPE_INFO)
+            return
+        txt = "Dostępna nowa wersja: {}\nTwoja: {}\n".format(version, VER)
+        if update:
+            txt += "Do pobrania: {}\n".format(update.describe())
+        self.session.openWithCallback(lambda ans: self._doUpdate(update) if ans else None,
+                                      MessageBox, txt + "Zaktualizować?", type=MessageBox.TYPE_YESNO, title="Aktualizacja")
+
+    def _doUpdate(self, update):
+        if update is None:
+            run_installer(self.session, "Aktualizacja MyUpdater", INSTALLER_URL, onClose=lambda: None)
+            return
+        self.session.openWithCallback(self._onUpdateDone, MyUpdaterProgress, "Aktualizacja MyUpdater",
+                                      lambda progress: selfupdate.apply(update, progress, PLUGIN_PATH), "selfupdate")
 
-    def _doUpdate(self, url):
-        cmd = "wget -q -O - {} | /bin/sh".format(url)
-        console(self.session, "Aktualizacja MyUpdater", [cmd], onClose=lambda: None, autoClose=True)
+    def _onUpdateDone(self, ok=False, result=None, operation=None):
+        if not ok:
+            msg(self.session, "Aktualizacja nie powiodła się, pliki wtyczki bez zmian:\n{}".format(result), MessageBox.TYPE_ERROR)
+            return
+        operation.finish(detail="{} plików, {} B".format(len(result["files"]), result["bytes"]))
+        self.session.openWithCallback(lambda ans: self.session.open(TryQuitMainloop, 3) if ans else None, MessageBox,
+                                      "Zaktualizowano do {} ({} plików).\nNowa wersja zadziała po restarcie GUI. Zrestartować teraz?".format(
+                                          result["version"], len(result["files"])),
+                                      type=MessageBox.TYPE_YESNO, title="Aktualizacja")
 
     def runInfo(self):
         # <-- ZAKTUALIZOWANE INFORMACJE O AUTORZE I LICENCJI -->
@@ -623,33 +942,48 @@ class MyUpdaterEnhanced(Screen):
         self.session.open(MessageBox, txt, MessageBox.TYPE_INFO, title="Informacje o wtyczce")
 
     def runDiagnostic(self):
-        """Diagnostyka systemu"""
-        commands = [
-            "echo '=== Diagnostyka Systemu ==='",
-            "echo \"Data: $(date)\"",
-            "echo \"System: {}\"".format(self.distro),
-            "echo \"Wersja Enigma2: $(opkg list-installed | grep enigma2 | head -1 2>/dev/null || echo 'Nieznana')\"",
-            "echo \"\"",
-            "echo \"Dostępne softcamy (max 3):\"",
-            "opkg list | grep -i 'oscam\|ncam' | head -3 2>/dev/null || echo \" - Brak softcamów w feed\"",
-            "echo \"\"",
-            "echo \"Przestrzeń dyskowa (/):\"",
-            "df -h / | tail -1",
-            "echo \"\"",
-            "ping -c 1 8.8.8.8 >/dev/null && echo \"Połączenie internetowe: OK\" || echo \"Połączenie internetowe: BRAK\"",
-            "echo \"\"",
-            "echo '=== Koniec diagnostyki ==='",
-            "echo 'Naciśnij EXIT aby zamknąć...' "
-        ]
-        console(self.session, "Diagnostyka Systemu", commands, onClose=lambda: None, autoClose=False)
+        self.session.open(MyUpdaterDiagnostic)
+
+class IdleMonitor(object):
+    """Tuner w czuwaniu albo pilot nieużywany od prefetch_idle_minutes"""
+
+    def __init__(self):
+        self.last_key = time.time()
+        try:
+            from enigma import eActionMap
+            # Najniższy priorytet: widzi każdy klawisz i niczego nie przechwytuje
+            eActionMap.getInstance().bindAction("", -0x7FFFFFFF, self.keyPressed)
+        except Exception as e:
+            log("Brak eActionMap ({}), bezczynność tylko w czuwaniu".format(e))
+
+    def keyPressed(self, key, flag):
+        self.last_key = time.time()
+        return 0
 
+    def __call__(self):
+        import Screens.Standby
+        if Screens.Standby.inStandby:
+            return True
+        return time.time() - self.last_key >= get_setting("prefetch_idle_minutes") * 60
+
+_prefetch = []
+
+def start_prefetch(session):
+    """Harmonogram pobierania w tle (sessionstart, gdy prefetch_enabled)"""
+    if _prefetch:
+        return
+    scheduler = prefetch.Scheduler(IdleMonitor())
+    _prefetch.append(scheduler)
+
+    def tick():
+        try:
+            scheduler.tick()
+        except Exception as e:
+            log("Pobieranie w tle: {}".format(e), ERROR)
+        reactor.callLater(prefetch.TICK, tick)
+
+    log("Pobieranie w tle włączone: co {} s w oknie {}".format(get_setting("prefetch_interval"), get_setting("prefetch_window") or "całodobowym"))
+    reactor.callLater(prefetch.TICK, tick)
 
 def main(session, **kwargs):
     session.open(MyUpdaterEnhanced)
-
-def Plugins(**kwargs):
-    return [PluginDescriptor(name="MyUpdater Enhanced",
-                             # <-- ZAKTUALIZOWANY OPIS -->
-                             description="MyUpdater {} (by Paweł Pawełek, na bazie Sancho) - kompatybilny z OpenATV/OpenPLI".format(VER),
-                             where=PluginDescriptor.WHERE_PLUGINMENU,
-                             icon="myupdater.png", fnc=main)]